@@ -0,0 +1,124 @@
+// Long-lived Checkstyle worker for DebuggerAI (see linter_backends.py). The JVM and the Checkstyle
+// configuration load once; each stdin line is a JSON request answered by one JSON line on stdout:
+//   {"id": 1, "op": "ping"}                   -> {"id": 1, "ok": true}
+//   {"id": 2, "op": "lint", "path": "A.java"} -> {"id": 2, "findings": [{"line", "type", "message"}]}
+// Run with Java 11+ straight from source: java -cp checkstyle-all.jar CheckstyleWorker.java /sun_checks.xml
+import com.puppycrawl.tools.checkstyle.Checker;
+import com.puppycrawl.tools.checkstyle.ConfigurationLoader;
+import com.puppycrawl.tools.checkstyle.PropertiesExpander;
+import com.puppycrawl.tools.checkstyle.api.AuditEvent;
+import com.puppycrawl.tools.checkstyle.api.AuditListener;
+import java.io.BufferedReader;
+import java.io.File;
+import java.io.FileDescriptor;
+import java.io.FileOutputStream;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.nio.charset.StandardCharsets;
+import java.util.ArrayList;
+import java.util.Collections;
+import java.util.List;
+import java.util.regex.Matcher;
+import java.util.regex.Pattern;
+
+public class CheckstyleWorker {
+    // Requests come from linter_backends with a fixed shape, so a few patterns are enough to read them
+    private static final Pattern ID = Pattern.compile("\"id\"\\s*:\\s*(\\d+)");
+    private static final Pattern OP = Pattern.compile("\"op\"\\s*:\\s*\"(\\w+)\"");
+    private static final Pattern PATH = Pattern.compile("\"path\"\\s*:\\s*\"((?:[^\"\\\\]|\\\\.)*)\"");
+
+    public static void main(String[] args) throws Exception {
+        // Only protocol replies go to stdout; anything else Checkstyle prints ends up on stderr
+        PrintStream out = new PrintStream(new FileOutputStream(FileDescriptor.out), true, "UTF-8");
+        System.setOut(System.err);
+
+        Checker checker = new Checker();
+        checker.setModuleClassLoader(Checker.class.getClassLoader());
+        checker.configure(ConfigurationLoader.loadConfiguration(args.length > 0 ? args[0] : "/sun_checks.xml",
+                new PropertiesExpander(System.getProperties())));
+        List<String> findings = new ArrayList<>();
+        checker.addListener(new AuditListener() {
+            public void auditStarted(AuditEvent event) { }
+            public void auditFinished(AuditEvent event) { }
+            public void fileStarted(AuditEvent event) { }
+            public void fileFinished(AuditEvent event) { }
+            public void addError(AuditEvent event) {
+                findings.add(finding(event.getLine(), event.getMessage()));
+            }
+            public void addException(AuditEvent event, Throwable error) {
+                findings.add(finding(0, String.valueOf(error.getMessage())));
+            }
+        });
+
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        String line;
+        while ((line = in.readLine()) != null) {
+            Matcher id = ID.matcher(line);
+            if (!id.find()) {
+                continue;
+            }
+            String prefix = "{\"id\":" + id.group(1) + ",";
+            Matcher op = OP.matcher(line);
+            if (op.find() && op.group(1).equals("ping")) {
+                out.println(prefix + "\"ok\":true}");
+                continue;
+            }
+            Matcher path = PATH.matcher(line);
+            if (!path.find()) {
+                out.println(prefix + "\"error\":\"no path\"}");
+                continue;
+            }
+            findings.clear();
+            try {
+                checker.process(Collections.singletonList(new File(unquote(path.group(1)))));
+                out.println(prefix + "\"findings\":[" + String.join(",", findings) + "]}");
+            } catch (Exception e) {
+                out.println(prefix + "\"error\":" + quote(String.valueOf(e.getMessage())) + "}");
+            }
+        }
+        checker.destroy();
+    }
+
+    private static String finding(int line, String message) {
+        return "{\"line\":" + line + ",\"type\":\"checkstyle\",\"message\":" + quote(message) + "}";
+    }
+
+    private static String quote(String value) {
+        StringBuilder sb = new StringBuilder("\"");
+        for (char c : value.toCharArray()) {
+            if (c == '"' || c == '\\') {
+                sb.append('\\').append(c);
+            } else if (c < 0x20) {
+                sb.append(String.format("\\u%04x", (int) c));
+            } else {
+                sb.append(c);
+            }
+        }
+        return sb.append('"').toString();
+    }
+
+    private static String unquote(String value) {
+        StringBuilder sb = new StringBuilder();
+        for (int i = 0; i < value.length(); i++) {
+            char c = value.charAt(i);
+            if (c != '\\' || i + 1 >= value.length()) {
+                sb.append(c);
+                continue;
+            }
+            char next = value.charAt(++i);
+            switch (next) {
+                case 'n': sb.append('\n'); break;
+                case 't': sb.append('\t'); break;
+                case 'r': sb.append('\r'); break;
+                case 'b': sb.append('\b'); break;
+                case 'f': sb.append('\f'); break;
+                case 'u':
+                    sb.append((char) Integer.parseInt(value.substring(i + 1, i + 5), 16));
+                    i += 4;
+                    break;
+                default: sb.append(next);
+            }
+        }
+        return sb.toString();
+    }
+}
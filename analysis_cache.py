@@ -0,0 +1,127 @@
+import hashlib
+import json
+import threading
+import time
+from typing import List, Dict, Optional, Tuple
+from static_analysis import StaticAnalyzer
+from storage import get_connection, ensure_schema, transaction
+from telemetry import get_metrics
+
+# Cache hits whose last_used is updated together in one write, rather than a write per hit
+TOUCH_BATCH_SIZE = 100
+
+class FindingsCache:
+    """
+    Persistent static analysis results keyed by content hash, language and analyzer signature.
+    Least recently used entries are evicted once max_entries is exceeded. Hits refresh last_used in
+    batches, so a warm rerun reads the cache without a write per file.
+    """
+    def __init__(self, db_path='analysis_cache.db', max_entries: int = 50000):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._touched: List[str] = []
+        self._create_table()
+
+    @property
+    def conn(self):
+        return get_connection(self.db_path)
+
+    def _create_table(self):
+        ensure_schema(self.db_path, ['''CREATE TABLE IF NOT EXISTS findings_cache (
+            key TEXT PRIMARY KEY,
+            findings TEXT,
+            last_used REAL
+        )''', 'CREATE INDEX IF NOT EXISTS idx_findings_cache_last_used ON findings_cache (last_used)'])
+
+    def make_key(self, code: str, language: str) -> str:
+        content_hash = hashlib.sha256(code.encode('utf-8', errors='ignore')).hexdigest()
+        signature = StaticAnalyzer.tool_signature(language)
+        return hashlib.sha256(f'{content_hash}\0{language}\0{signature}'.encode()).hexdigest()
+
+    def get(self, code: str, language: str) -> Optional[List[Dict]]:
+        key = self.make_key(code, language)
+        row = self.conn.execute('SELECT findings FROM findings_cache WHERE key=?', (key,)).fetchone()
+        get_metrics().inc('cache_requests_total', cache='findings', result='miss' if row is None else 'hit')
+        with self.lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touched.append(key)
+            flush = len(self._touched) >= TOUCH_BATCH_SIZE
+        if flush:
+            with transaction(self.db_path) as conn:
+                self._touch(conn)
+        return json.loads(row[0])
+
+    def flush(self):
+        """
+        Write the last_used of hits not yet recorded.
+        """
+        with transaction(self.db_path) as conn:
+            self._touch(conn)
+
+    def _touch(self, conn):
+        with self.lock:
+            touched, self._touched = self._touched, []
+        if touched:
+            now = time.time()
+            conn.executemany('UPDATE findings_cache SET last_used=? WHERE key=?', [(now, key) for key in touched])
+
+    def put(self, code: str, language: str, findings: List[Dict]):
+        self.put_many([(code, language, findings)])
+
+    def put_many(self, entries: List[Tuple[str, str, List[Dict]]]):
+        """
+        Store (code, language, findings) entries in one transaction.
+        """
+        now = time.time()
+        rows = [(self.make_key(code, language), json.dumps(findings), now) for code, language, findings in entries]
+        with transaction(self.db_path) as conn:
+            conn.executemany('INSERT OR REPLACE INTO findings_cache (key, findings, last_used) VALUES (?, ?, ?)', rows)
+            # Hits so far ride along, so they aren't evicted as if unused
+            self._touch(conn)
+            self._evict(conn)
+
+    def _evict(self, conn):
+        count = conn.execute('SELECT COUNT(*) FROM findings_cache').fetchone()[0]
+        if count > self.max_entries:
+            conn.execute('''DELETE FROM findings_cache WHERE key IN (
+                SELECT key FROM findings_cache ORDER BY last_used LIMIT ?)''', (count - self.max_entries,))
+
+    def analyze_code(self, code: str, language: str, filename: str = "temp") -> List[Dict]:
+        # A failed, timed out or cancelled linter raises, so only real results are ever stored
+        findings = self.get(code, language)
+        if findings is None:
+            findings = StaticAnalyzer.analyze_code(code, language, filename)
+            self.put(code, language, findings)
+        return findings
+
+    def analyze_batch(self, code_files: List[Dict], language: str = 'Python') -> Dict[str, List[Dict]]:
+        """
+        Serve cached files directly and batch only the misses through the language's linter.
+        """
+        results = {}
+        misses = []
+        for file in code_files:
+            findings = self.get(file['code'], language)
+            if findings is None:
+                misses.append(file)
+            else:
+                results[file['relpath']] = findings
+        if misses:
+            fresh = StaticAnalyzer.analyze_batch(misses, language)
+            for file in misses:
+                results[file['relpath']] = fresh.get(file['relpath'], [])
+            self.put_many([(file['code'], language, results[file['relpath']]) for file in misses])
+        else:
+            self.flush()
+        return results
+
+    def stats(self) -> Dict:
+        self.flush()
+        entries = self.conn.execute('SELECT COUNT(*) FROM findings_cache').fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries}
@@ -1,21 +1,56 @@
 import streamlit as st
 import os
-import asyncio
+import json
 import logging
-from input_pipeline import scan_files, SUPPORTED_EXTENSIONS
-from static_analysis import StaticAnalyzer
+import tempfile
+import time
+from contextlib import ExitStack
+from input_pipeline import iter_files, detect_language, SUPPORTED_EXTENSIONS, AUTO_DETECT
+from analysis_cache import FindingsCache
 from llm_explainer import LLMExplainer, EXPLANATION_DEPTHS
-from report import generate_markdown_report
+from explanation_cache import ExplanationCache
+from report import generate_markdown_report, open_report, MarkdownReportWriter
 from style_learning import StyleLearner
-from bug_pattern_dashboard import BugPatternSummarizer
+from bug_pattern_dashboard import BugPatternSummarizer, BugPatternStore
 from feedback import FeedbackDB
-from html_report import generate_html_report
+from explain_scheduler import ExplanationScheduler, ExplanationBudget
+from rules import rule_id
+from explanation_templates import TemplateLibrary
+from html_report import HTMLReportWriter
+from fix_diff import combine_patch
 from auth import AuthDB
 from session_history import SessionHistoryDB
-from async_utils import run_in_executor
+from async_utils import get_engine
+from incremental import AnalysisManifest, IncrementalRun
+from telemetry import RunTrace, start_metrics_server
+from pipeline import AnalysisPipeline
+from jobs import JobStore, get_job_queue, RESUMABLE_STATES
 
 logging.basicConfig(filename='debuggerai.log', level=logging.INFO)
 
+SESSION_PAGE_SIZE = 20
+# Files rendered on the page (with feedback controls); the downloadable reports always have everything
+INLINE_REPORT_LIMIT = 100
+TREND_DAYS = 30
+JOB_PAGE_SIZE = 10
+# Files shown per background job; the full results stay in the job store
+JOB_RESULTS_LIMIT = 50
+# Set to serve Prometheus metrics on http://127.0.0.1:<port>/metrics (and /metrics.json)
+METRICS_PORT = os.environ.get('DEBUGGERAI_METRICS_PORT')
+
+def record_finished_job(job):
+    """
+    Session history and trend analytics for a background job, like an interactive run records them.
+    """
+    if not job['user']:
+        return
+    results = JobStore().results(job['run_id'])
+    summarizer = BugPatternSummarizer()
+    summarizer.summarize([explanations for _, explanations in results])
+    SessionHistoryDB().add_session(job['user'], [os.path.basename(path) for path, _ in results],
+                                   json.dumps(summarizer.summary()['top_patterns']))
+    BugPatternStore().record_run(job['user'], job['folder'], [(os.path.basename(path), ex) for path, ex in results])
+
 def main():
     st.set_page_config(page_title="DebuggerAI: LLM-Powered Debugger", page_icon="🐞🤖")
     st.title("🐞🤖 DebuggerAI: LLM-Powered Code Debugger & Tutor")
@@ -23,6 +58,10 @@ def main():
     Welcome! Paste code, upload files, or analyze an entire folder. DebuggerAI will find bugs, explain them, and suggest fixes — in plain English!
     """)
 
+    if METRICS_PORT:
+        start_metrics_server(int(METRICS_PORT))
+    session_db = SessionHistoryDB()
+
     # --- User Authentication ---
     auth_db = AuthDB()
     session_token = st.session_state.get('session_token')
@@ -34,13 +73,18 @@ def main():
         password = st.text_input("Password", type="password")
         if auth_mode == "Sign Up":
             if st.button("Sign Up"):
-                if auth_db.signup(username, email, password):
+                with st.spinner("Creating account..."):
+                    created = auth_db.signup(username, email, password)
+                if created:
                     st.success("Sign up successful! Please log in.")
                 else:
                     st.error("Username or email already exists.")
         else:
             if st.button("Login"):
-                token = auth_db.login(username or email, password)
+                # The password KDF is deliberately slow. It runs here rather than on the analysis engine,
+                # so a cancelled analysis can't block logins
+                with st.spinner("Checking credentials..."):
+                    token = auth_db.login(username or email, password)
                 if token:
                     st.session_state['session_token'] = token
                     st.rerun()
@@ -54,103 +98,315 @@ def main():
             st.rerun()
         st.success(f"Logged in as {user['username']} ({user['email']})")
         if st.button("Logout"):
+            auth_db.logout(session_token)
+            st.session_state.pop('session_token', None)
+            st.rerun()
+        if st.button("Log out all sessions"):
+            auth_db.logout_everywhere(user['username'])
             st.session_state.pop('session_token', None)
             st.rerun()
 
     # --- Main App ---
-    lang = st.selectbox("Select language", list(SUPPORTED_EXTENSIONS.keys()))
+    lang = st.selectbox("Select language", list(SUPPORTED_EXTENSIONS.keys()) + [AUTO_DETECT],
+                        help=f"{AUTO_DETECT} scans every supported language in one pass, by extension or shebang")
     api_key = st.text_input("Enter your OpenAI API key", type="password")
     depth = st.selectbox("Explanation depth", EXPLANATION_DEPTHS, index=1)
+    batch_nearby = st.checkbox("Explain nearby findings together (fewer API calls)", value=True)
+    compress_reports = st.checkbox("Gzip report downloads", value=False)
+    with st.expander("LLM budget"):
+        st.caption("With any limit set, the most important findings are explained first until the budget runs out and "
+                   "the rest get cached or templated explanations. Reports then appear once the scan is done.")
+        limits = {'max_calls': st.number_input("Max API calls (0 = unlimited)", min_value=0, value=0, step=10),
+                  'max_tokens': st.number_input("Max tokens (0 = unlimited)", min_value=0, value=0, step=1000),
+                  'max_seconds': st.number_input("Max seconds explaining (0 = unlimited)", min_value=0, value=0, step=10)}
+    budget = {name: int(value) for name, value in limits.items() if value}
     input_mode = st.radio("Input mode", ["Paste code", "Upload file(s)", "Select folder"])
 
     code_files = []
+    file_source = None
+    incremental_run = None
+    background_job = False
+    # Repo key for trend analytics: the folder for server-side runs, otherwise 'uploads'. Trends are
+    # always filtered to the logged-in user, so nobody sees another user's pasted or uploaded code trends.
+    repo_name = 'uploads'
     if input_mode == "Paste code":
         code_input = st.text_area("Paste your code here", height=200)
         if code_input.strip():
-            code_files.append({'filename': '<input>', 'relpath': '<input>', 'code': code_input})
+            # Pasted code has no extension, so only a shebang can tell its language
+            code_lang = detect_language('<input>', code_input) if lang == AUTO_DETECT else lang
+            if code_lang is None:
+                st.warning("Couldn't detect the language of the pasted code; please select it above.")
+            else:
+                code_files.append({'filename': '<input>', 'relpath': '<input>', 'code': code_input, 'language': code_lang})
     elif input_mode == "Upload file(s)":
         uploads = st.file_uploader("Upload code file(s)", type=[ext[1:] for ext in sum(SUPPORTED_EXTENSIONS.values(), [])], accept_multiple_files=True)
         if uploads:
             for file in uploads:
                 code = file.read().decode("utf-8")
-                code_files.append({'filename': file.name, 'relpath': file.name, 'code': code})
+                code_lang = detect_language(file.name, code) if lang == AUTO_DETECT else lang
+                if code_lang is None:
+                    st.warning(f"Skipping {file.name}: not a supported language.")
+                else:
+                    code_files.append({'filename': file.name, 'relpath': file.name, 'code': code, 'language': code_lang})
     elif input_mode == "Select folder":
         folder_path = st.text_input("Enter absolute path to folder (server-side)")
+        incremental = st.checkbox("Incremental: only re-analyse files changed since the last run", value=True)
+        git_ref = st.text_input("Only files changed relative to git ref (optional, e.g. main)")
+        background_job = st.checkbox("Run as a resumable background job (keeps going if this page is closed; "
+                                     "resumes where it stopped instead of using the options above)")
         if folder_path and os.path.isdir(folder_path):
-            code_files = scan_files(folder_path, lang)
-            st.success(f"Found {len(code_files)} {lang} files in {folder_path}")
+            repo_name = os.path.abspath(folder_path)
+            # Scanned lazily so analysis starts on the first file while the walk continues
+            file_source = iter_files(folder_path, lang)
+            scanned = "Files in every supported language" if lang == AUTO_DETECT else f"{lang} files"
+            st.success(f"{scanned} in {folder_path} will be scanned during analysis")
+    if code_files:
+        file_source = code_files
 
     # --- Async Analysis ---
     if st.button("Analyze Codebase"):
-        if not code_files:
+        if file_source is None:
             st.warning("Please provide code input.")
         elif not api_key:
             st.warning("Please enter your OpenAI API key.")
+        elif background_job:
+            settings = {'language': lang, 'static_only': False, 'depth': depth, 'model': 'gpt-4o',
+                        'batch_size': 6 if batch_nearby else 1}
+            if budget:
+                settings['budget'] = budget
+            run_id = JobStore().create_job(user['username'], folder_path, settings)
+            get_job_queue(on_done=record_finished_job).submit(run_id, api_key)
+            st.success(f"Background job {run_id} queued; follow it under Background Jobs below.")
         else:
-            all_reports = []
+            if input_mode == "Select folder" and (incremental or git_ref.strip()):
+                # Built on click rather than on every rerun: it loads the manifest and runs git
+                settings = f"{lang}|{depth}|{'batched' if batch_nearby else 'single'}"
+                if budget:
+                    # Templated explanations shouldn't be reused by a run with a bigger budget
+                    settings += f"|{sorted(budget.items())}"
+                incremental_run = IncrementalRun(AnalysisManifest(), folder_path, settings, git_ref.strip() or None)
+                if git_ref.strip() and incremental_run.git_changed is None:
+                    st.warning(f"Could not diff against git ref '{git_ref.strip()}'; analysing all changed files instead.")
+                file_source = iter_files(folder_path, lang, skip=incremental_run.should_skip)
+            code_files = []
             all_explanations = []
+            report_files = []
+            # Language of each reported file, so feedback can teach the template library
+            report_languages = []
             feedback_db = FeedbackDB()
-            session_db = SessionHistoryDB()
+            # The report directory and open report files, released however the run ends
+            resources = ExitStack()
             try:
-                async def analyze_file(file):
-                    findings = await run_in_executor(StaticAnalyzer.analyze_code, file['code'], lang, file['filename'])
-                    if not findings:
-                        return None, None, None
-                    explainer = LLMExplainer(api_key, depth=depth)
-                    explanations = await run_in_executor(explainer.explain_findings, file['code'], findings)
-                    report_md = generate_markdown_report(file['filename'], explanations)
-                    return explanations, report_md, file['filename']
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-                results = loop.run_until_complete(asyncio.gather(*[analyze_file(file) for file in code_files]))
-                for explanations, report_md, fname in results:
-                    if explanations is not None and report_md is not None and fname is not None:
-                        all_explanations.append(explanations)
-                        all_reports.append(report_md)
-                        # Feedback UI for each explanation
-                        for ex in explanations:
-                            st.markdown(f"#### Feedback for {fname} line {ex['line']}")
-                            rating = st.slider(f"Rate the explanation/fix (line {ex['line']})", 1, 5, 3, key=f"rate_{fname}_{ex['line']}")
-                            comment = st.text_input(f"Comment (optional) for line {ex['line']}", key=f"comment_{fname}_{ex['line']}")
-                            if st.button(f"Submit Feedback for {fname} line {ex['line']}", key=f"submit_{fname}_{ex['line']}"):
-                                feedback_db.add_feedback(str(fname), ex['line'], ex['explanation'], ex['fix'], rating, comment)
-                                st.success("Feedback submitted!")
-                if all_reports:
-                    st.markdown("\n---\n".join(all_reports))
-                    # HTML report export
-                    if st.button("Export HTML Report"):
-                        html_report = ''
-                        for i, file in enumerate(code_files):
-                            html_report += generate_html_report(file['filename'], all_explanations[i])
-                        st.download_button("Download HTML Report", html_report, file_name="debuggerai_report.html", mime="text/html")
+                trace = RunTrace()
+                logging.info("Run %s started for %s", trace.run_id, repo_name)
+                findings_cache = FindingsCache()
+                explanation_cache = ExplanationCache()
+                templates = TemplateLibrary()
+                explainer = LLMExplainer(api_key, depth=depth, cache=explanation_cache, language=lang,
+                                         batch_size=6 if batch_nearby else 1, trace=trace, templates=templates)
+                bug_summarizer = BugPatternSummarizer()
+                progress = st.progress(0.0, text="Analyzing files...")
+                st.markdown("## 🐛 Bug Pattern Dashboard")
+                dashboard = st.empty()
+                results_area = st.container()
+                started = time.monotonic()
+                first_result_at = None
+                # Reports are streamed to disk as files finish rather than built up in memory
+                suffix = '.gz' if compress_reports else ''
+                report_dir = resources.enter_context(tempfile.TemporaryDirectory(prefix='debuggerai-report-'))
+                report_paths = {fmt: os.path.join(report_dir, f'debuggerai_report.{fmt}{suffix}') for fmt in ('html', 'md')}
+                html_writer = HTMLReportWriter(resources.enter_context(open_report(report_paths['html'], compress_reports)))
+                md_writer = MarkdownReportWriter(resources.enter_context(open_report(report_paths['md'], compress_reports)))
+                # Every suggested fix of the files analysed now, as one patch for `patch -p1` in the folder
+                patch_path = os.path.join(report_dir, 'debuggerai_fixes.patch')
+                patch_out = resources.enter_context(open(patch_path, 'w', encoding='utf-8'))
+                patch_root = folder_path if input_mode == "Select folder" else None
+
+                def add_report(fname, explanations, report_md, file_lang):
+                    all_explanations.append(explanations)
+                    report_files.append(fname)
+                    report_languages.append(file_lang)
+                    with trace.span('report', format='html+md'):
+                        html_writer.add(fname, explanations)
+                        md_writer.add(fname, explanations, report_md)
+                    if len(report_files) <= INLINE_REPORT_LIMIT:
+                        results_area.markdown(report_md + "\n\n---")
+                    elif len(report_files) == INLINE_REPORT_LIMIT + 1:
+                        results_area.caption(f"Only the first {INLINE_REPORT_LIMIT} files are shown here; download the report for the rest.")
+                    bug_summarizer.add(explanations)
+
+                def show_progress(done, seen, scanning):
+                    suffix = " (still scanning)" if scanning else ""
+                    progress.progress(done / seen, text=f"Analyzed {done}/{seen} files{suffix}")
+
+                def show_result(file, explanations, report_md):
+                    nonlocal first_result_at
+                    if not explanations:
+                        return
+                    if first_result_at is None:
+                        first_result_at = time.monotonic() - started
+                    add_report(file['filename'], explanations, report_md, file.get('language', lang))
+                    patch = combine_patch(os.path.relpath(file['relpath'], patch_root) if patch_root else file['filename'],
+                                          file['code'], explanations)
+                    if patch:
+                        patch_out.write(patch + '\n')
+                    dashboard.json(bug_summarizer.summary())
+
+                def collect_files(source):
+                    for file in source:
+                        code_files.append(file)
+                        yield file
+
+                scheduler = ExplanationScheduler(explainer, ExplanationBudget.from_dict(budget), feedback_db) if budget else None
+                pipeline = AnalysisPipeline(lang, findings_cache, explainer, trace=trace, incremental_run=incremental_run,
+                                            scheduler=scheduler)
+                pipeline.run(collect_files(file_source), on_result=show_result, on_progress=show_progress)
+                engine = get_engine()
+                if incremental_run is not None:
+                    # Merge in stored results for files that didn't need re-analysis
+                    for path, explanations in incremental_run.stored_results():
+                        if explanations:
+                            fname = os.path.basename(path)
+                            add_report(fname, explanations, generate_markdown_report(fname, explanations),
+                                       detect_language(path) if lang == AUTO_DETECT else lang)
+                    dashboard.json(bug_summarizer.summary())
+                    incremental_run.commit()
+                    st.caption(f"Incremental run: {len(code_files)} files analysed, {len(incremental_run.unchanged)} reused from the last run")
+                total_time = time.monotonic() - started
+                if first_result_at is not None:
+                    logging.info("Time to first result: %.2fs (total %.2fs, %d files)", first_result_at, total_time, len(code_files))
+                    st.caption(f"Time to first result: {first_result_at:.1f}s of {total_time:.1f}s total")
+                if len(pipeline.languages) > 1:
+                    st.caption("Files per language: " + ", ".join(f"{name} {count}" for name, count in sorted(pipeline.languages.items())))
+                cache_stats = findings_cache.stats()
+                st.caption(f"Static analysis cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+                llm_stats = explanation_cache.stats()
+                st.caption(f"Explanation cache: {llm_stats['hits']} hits, {llm_stats['misses']} misses, {llm_stats['merged']} merged duplicates")
+                st.caption(f"Prompt tokens saved by code excerpts: ~{explainer.prompt_tokens_saved}")
+                template_stats = templates.stats()
+                if template_stats['templates']:
+                    st.caption(f"Explanation templates: {template_stats['hits']} hits, {template_stats['misses']} misses "
+                               f"({template_stats['hit_rate']:.0%} hit rate, {template_stats['templates']} templates)")
+                if scheduler is not None:
+                    st.markdown("## 💸 LLM Budget")
+                    st.table([scheduler.report()])
+                analysis_pool = engine.stats(pipeline.token)['pools']['analysis']
+                st.caption(f"Analysis pool: {analysis_pool['workers']} workers, {analysis_pool['utilization']:.0%} utilized, "
+                           f"peak queue depth {analysis_pool['peak_queue_depth']}")
+                # Where the time went, per stage, for this run
+                profile = trace.profile()
+                logging.info("Run %s profile: %s", trace.run_id, json.dumps(profile['stages']))
+                st.markdown("## ⏱️ Run Profile")
+                st.caption(f"Run {trace.run_id}: {profile['wall_seconds']:.1f}s wall clock. "
+                           "Stage totals overlap because files are processed concurrently.")
+                if profile['stages']:
+                    st.table(profile['stages'])
+                    with st.expander("Slowest spans"):
+                        st.table(profile['slowest'])
+                st.download_button("Download run trace (JSON)", trace.to_json(), file_name=f"debuggerai_run_{trace.run_id}.json",
+                                   mime="application/json")
+                for explanations, fname, file_lang in zip(all_explanations[:INLINE_REPORT_LIMIT], report_files, report_languages):
+                    # Feedback UI for each explanation shown on the page
+                    for n, ex in enumerate(explanations):
+                        st.markdown(f"#### Feedback for {fname} line {ex['line']}")
+                        rating = st.slider(f"Rate the explanation/fix (line {ex['line']})", 1, 5, 3, key=f"rate_{fname}_{ex['line']}_{n}")
+                        comment = st.text_input(f"Comment (optional) for line {ex['line']}", key=f"comment_{fname}_{ex['line']}_{n}")
+                        if st.button(f"Submit Feedback for {fname} line {ex['line']}", key=f"submit_{fname}_{ex['line']}_{n}"):
+                            feedback_db.add_feedback(str(fname), ex['line'], ex['explanation'], ex['fix'], rating, comment,
+                                                     rule_id(ex), file_lang, depth, ex['message'])
+                            st.success("Feedback submitted!")
+                html_writer.close()
+                md_writer.close()
+                html_writer.out.close()
+                md_writer.out.close()
+                patch_out.close()
+                if report_files:
+                    for fmt, label, mime in (('html', "Download HTML Report", "text/html"), ('md', "Download Markdown Report", "text/markdown")):
+                        with open(report_paths[fmt], 'rb') as f:
+                            st.download_button(label, f.read(), file_name=os.path.basename(report_paths[fmt]),
+                                               mime="application/gzip" if compress_reports else mime)
+                    if os.path.getsize(patch_path):
+                        with open(patch_path, 'rb') as f:
+                            st.download_button("Download suggested fixes (.patch)", f.read(), file_name='debuggerai_fixes.patch',
+                                               mime="text/x-diff")
                 else:
                     st.success("No issues found in the provided codebase!")
+                resources.close()
                 # Style learning and suggestions
                 style_learner = StyleLearner()
-                style_info = style_learner.analyze_codebase(code_files)
+                # Reused files count too, or an incremental run would only describe what changed
+                unchanged_files = list(incremental_run.unchanged_files(lang)) if incremental_run is not None else []
+                style_info = style_learner.analyze_codebase(code_files + unchanged_files)
                 st.markdown("## 🧑‍🎨 Codebase Style Analysis")
                 st.json(style_info['metrics'])
                 if style_info['suggestions']:
                     st.markdown("### Style Suggestions:")
                     for s in style_info['suggestions']:
                         st.markdown(f"- {s}")
-                # Bug pattern dashboard
-                bug_summarizer = BugPatternSummarizer()
-                bug_summary = bug_summarizer.summarize(all_explanations)
-                st.markdown("## 🐛 Bug Pattern Dashboard")
-                st.json(bug_summary)
-                # Save session history
+                # Bug pattern dashboard (filled in while streaming)
+                bug_summary = bug_summarizer.summary()
+                # Save session history and per-finding analytics
                 if user and 'username' in user:
-                    session_db.add_session(user['username'], [f['filename'] for f in code_files], bug_summary['top_patterns'].__str__())
+                    session_db.add_session(user['username'], [f['filename'] for f in code_files + unchanged_files], json.dumps(bug_summary['top_patterns']))
+                    BugPatternStore().record_run(user['username'], repo_name, list(zip(report_files, all_explanations)))
             except Exception as e:
                 logging.exception("Error during analysis")
                 st.error(f"An error occurred: {e}")
+            finally:
+                resources.close()
+
+    # --- Bug Trends ---
+    if user and 'username' in user:
+        pattern_store = BugPatternStore()
+        top_rules = pattern_store.top_rules(repo=repo_name, user=user['username'], days=TREND_DAYS)
+        if top_rules:
+            st.markdown(f"## 📈 Bug Trends (last {TREND_DAYS} days, {repo_name})")
+            st.table(top_rules)
+            daily = pattern_store.daily_totals(repo=repo_name, user=user['username'], days=TREND_DAYS)
+            st.bar_chart({row['date']: row['count'] for row in daily})
+
+    # --- Background Jobs ---
+    if user and 'username' in user:
+        job_store = JobStore()
+        jobs = job_store.list_jobs(user['username'], limit=JOB_PAGE_SIZE)
+        if jobs:
+            job_queue = get_job_queue(on_done=record_finished_job)
+            st.markdown("## 🗂️ Background Jobs")
+            st.button("Refresh jobs")
+            for job in jobs:
+                run_id = job['run_id']
+                total = sum(job['progress'].values())
+                done = job['progress'].get('done', 0)
+                failed = job['progress'].get('failed', 0)
+                held = job['progress'].get('held', 0)
+                st.markdown(f"**{job['folder']}** — {job['status']}, {done}/{total} files"
+                            f"{f', {held} awaiting explanation' if held else ''}"
+                            f"{f', {failed} failed' if failed else ''} (job `{run_id}`)")
+                if job['error']:
+                    st.caption(job['error'])
+                if total and job['status'] != 'done':
+                    st.progress(done / total)
+                if job['status'] in ('queued', 'running'):
+                    if st.button("Pause", key=f"pause_{run_id}"):
+                        job_queue.pause(run_id)
+                        st.rerun()
+                elif job['status'] in RESUMABLE_STATES:
+                    if st.button("Resume", key=f"resume_{run_id}"):
+                        if not api_key and not job['settings'].get('static_only'):
+                            st.warning("Enter your OpenAI API key to resume this job.")
+                        else:
+                            job_queue.submit(run_id, api_key)
+                            st.rerun()
+                if done and st.checkbox("Show results", key=f"show_{run_id}"):
+                    for path, explanations in job_store.results(run_id, limit=JOB_RESULTS_LIMIT):
+                        st.markdown(generate_markdown_report(os.path.basename(path), explanations) + "\n\n---")
 
     # --- Project/Session History ---
     st.markdown("## 📜 Project/Session History")
-    session_db = SessionHistoryDB()
     if user and 'username' in user:
-        sessions = session_db.get_sessions(user['username'])
+        pages = max(1, -(-session_db.count_sessions(user['username']) // SESSION_PAGE_SIZE))
+        page = st.number_input("History page", min_value=1, max_value=pages, value=1) if pages > 1 else 1
+        sessions = session_db.get_sessions(user['username'], limit=SESSION_PAGE_SIZE, offset=(page - 1) * SESSION_PAGE_SIZE)
         for s in sessions:
             st.markdown(f"- **{s[3]}** (Files: {s[2]}) at {s[1]}")
 
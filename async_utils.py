@@ -1,13 +1,307 @@
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
-from typing import Callable, List, Any
+import logging
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Any, Optional
+from telemetry import get_metrics, MetricsRegistry
 
-_executor = ThreadPoolExecutor(max_workers=8)
+CPU_COUNT = os.cpu_count() or 2
 
-def run_in_executor(func: Callable, *args, **kwargs):
+# 'analysis' threads mostly wait on linter subprocesses, which do the CPU-bound work, so one per core
+# keeps the machine busy without oversubscribing it; 'io' covers file reads, sqlite caches and the like.
+DEFAULT_POOL_SIZES = {
+    'analysis': CPU_COUNT,
+    'io': min(32, CPU_COUNT * 4)
+}
+# Upper bound on concurrently running processes per analyzer (JVM/Node tools are memory hungry)
+DEFAULT_TOOL_LIMITS = {
+    'pylint': CPU_COUNT,
+    'clang-tidy': CPU_COUNT,
+    'eslint': max(1, CPU_COUNT // 2),
+    'checkstyle': max(1, CPU_COUNT // 2)
+}
+DEFAULT_TOOL_TIMEOUT = 300
+
+class ToolError(RuntimeError):
+    """
+    A linter run that failed or timed out, so its output says nothing about the code.
+    """
+
+class _PoolStats:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.queued = 0
+        self.peak_queued = 0
+        self.active = 0
+        self.completed = 0
+        self.busy_seconds = 0.0
+
+class RunToken:
+    """
+    Cancellation of one run. Work queued and linters started on its behalf are tracked here, so cancelling
+    a run drops only its own work and kills only its own processes, not those of other runs on the engine.
+    The run's share of the pools is counted here too, for ExecutionEngine.stats(token).
+    """
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self.lock = threading.Lock()
+        self.futures = set()
+        self.processes = set()
+        self.started = time.monotonic()
+        self.pool_stats: Dict[str, _PoolStats] = {}
+        self.timeouts = 0
+
+    def cancel(self):
+        self.cancelled.set()
+        with self.lock:
+            futures = list(self.futures)
+            processes = list(self.processes)
+        for future in futures:
+            future.cancel()
+        for proc in processes:
+            proc.kill()
+
+_current_run: ContextVar[Optional[RunToken]] = ContextVar('debuggerai_run', default=None)
+
+def current_run() -> Optional[RunToken]:
+    return _current_run.get()
+
+@contextmanager
+def run_scope(token: RunToken):
+    """
+    Make token the current run; asyncio tasks started inside inherit it, and engine work they submit carries it.
+    """
+    reset = _current_run.set(token)
+    try:
+        yield token
+    finally:
+        _current_run.reset(reset)
+
+class ExecutionEngine:
+    """
+    Thread pools per workload class, per-analyzer concurrency limits and subprocess timeouts, with queue
+    depth and utilization metrics. Shared by concurrent runs, which cancel their own work through a RunToken.
+    """
+    def __init__(self, pool_sizes: Optional[Dict[str, int]] = None, tool_limits: Optional[Dict[str, int]] = None,
+                 tool_timeouts: Optional[Dict[str, float]] = None, default_timeout: float = DEFAULT_TOOL_TIMEOUT):
+        pool_sizes = {**DEFAULT_POOL_SIZES, **(pool_sizes or {})}
+        self.pools = {name: ThreadPoolExecutor(max_workers=size, thread_name_prefix=f'debuggerai-{name}')
+                      for name, size in pool_sizes.items()}
+        self.pool_stats = {name: _PoolStats(size) for name, size in pool_sizes.items()}
+        self.tool_limits = {**DEFAULT_TOOL_LIMITS, **(tool_limits or {})}
+        self.tool_semaphores = {tool: threading.BoundedSemaphore(limit) for tool, limit in self.tool_limits.items()}
+        self.tool_timeouts = tool_timeouts or {}
+        self.default_timeout = default_timeout
+        self.lock = threading.Lock()
+        self.cancelled = threading.Event()
+        self.futures = set()
+        self.processes = set()
+        self.timeouts = 0
+        self.started = time.monotonic()
+
+    def is_cancelled(self) -> bool:
+        """
+        Whether the current run (or the whole engine) has been cancelled.
+        """
+        token = current_run()
+        return self.cancelled.is_set() or (token is not None and token.cancelled.is_set())
+
+    def submit(self, workload: str, func: Callable, *args, **kwargs) -> Future:
+        submitted = time.monotonic()
+        token = current_run()
+        # The engine's totals, and the submitting run's own share
+        counters = [self.pool_stats[workload]]
+        if token is not None:
+            with self.lock:
+                counters.append(token.pool_stats.setdefault(workload, _PoolStats(counters[0].workers)))
+
+        def run():
+            # Pool threads are shared, so the submitting run is carried over explicitly
+            reset = _current_run.set(token)
+            try:
+                with self.lock:
+                    for stats in counters:
+                        stats.queued -= 1
+                    if self.is_cancelled():
+                        raise asyncio.CancelledError()
+                    for stats in counters:
+                        stats.active += 1
+                start = time.monotonic()
+                get_metrics().observe('queue_wait_seconds', start - submitted, workload=workload)
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    with self.lock:
+                        for stats in counters:
+                            stats.active -= 1
+                            stats.completed += 1
+                            stats.busy_seconds += time.monotonic() - start
+            finally:
+                _current_run.reset(reset)
+
+        with self.lock:
+            for stats in counters:
+                stats.queued += 1
+                stats.peak_queued = max(stats.peak_queued, stats.queued)
+        future = self.pools[workload].submit(run)
+        with self.lock:
+            self.futures.add(future)
+        if token is not None:
+            with token.lock:
+                token.futures.add(future)
+        future.add_done_callback(lambda f: self._forget(f, counters, token))
+        return future
+
+    def _forget(self, future: Future, counters: List[_PoolStats], token: Optional[RunToken]):
+        with self.lock:
+            self.futures.discard(future)
+            if future.cancelled():
+                # Never started, so it's still counted as queued
+                for stats in counters:
+                    stats.queued -= 1
+        if token is not None:
+            with token.lock:
+                token.futures.discard(future)
+
+    def run_subprocess(self, cmd: List[str], tool: Optional[str] = None, timeout: Optional[float] = None,
+                       **kwargs) -> subprocess.CompletedProcess:
+        """
+        subprocess.run replacement honoring the tool's concurrency limit and timeout.
+        A timed out process is killed and raises ToolError; in a cancelled run this raises CancelledError.
+        """
+        tool = tool or cmd[0]
+        timeout = timeout or self.tool_timeouts.get(tool, self.default_timeout)
+        token = current_run()
+        semaphore = self.tool_semaphores.get(tool)
+        if semaphore:
+            semaphore.acquire()
+        try:
+            if self.is_cancelled():
+                raise asyncio.CancelledError()
+            started = time.monotonic()
+            proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, **kwargs)
+            with self.lock:
+                self.processes.add(proc)
+            if token is not None:
+                with token.lock:
+                    token.processes.add(proc)
+            try:
+                stdout, stderr = proc.communicate(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+                proc.communicate()
+                with self.lock:
+                    self.timeouts += 1
+                    if token is not None:
+                        token.timeouts += 1
+                get_metrics().inc('subprocess_timeouts_total', tool=tool)
+                logging.warning("%s timed out after %ss", tool, timeout)
+                raise ToolError(f'{tool} timed out after {timeout}s')
+            finally:
+                with self.lock:
+                    self.processes.discard(proc)
+                if token is not None:
+                    with token.lock:
+                        token.processes.discard(proc)
+                get_metrics().observe('subprocess_seconds', time.monotonic() - started, tool=tool)
+            if self.is_cancelled():
+                # Killed by cancel(), so its output is cut short
+                raise asyncio.CancelledError()
+            return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+        finally:
+            if semaphore:
+                semaphore.release()
+
+    def cancel(self):
+        """
+        Abort everything on the engine, e.g. at shutdown: drop queued work and kill every analyzer process.
+        A single run is cancelled through its RunToken instead.
+        """
+        self.cancelled.set()
+        with self.lock:
+            futures = list(self.futures)
+            processes = list(self.processes)
+        for future in futures:
+            future.cancel()
+        for proc in processes:
+            proc.kill()
+
+    def stats(self, token: Optional[RunToken] = None) -> Dict:
+        """
+        Pool usage since the engine started, or just one run's work since it started when given its token.
+        Runs share the engine, so a run's utilization is the share of the pool it kept busy.
+        """
+        with self.lock:
+            if token is None:
+                started, pool_stats, processes, timeouts = self.started, self.pool_stats, self.processes, self.timeouts
+            else:
+                pool_stats = {name: token.pool_stats.get(name) or _PoolStats(s.workers) for name, s in self.pool_stats.items()}
+                started, processes, timeouts = token.started, token.processes, token.timeouts
+            elapsed = max(time.monotonic() - started, 1e-9)
+            return {
+                'pools': {
+                    name: {
+                        'workers': s.workers,
+                        'queue_depth': s.queued,
+                        'peak_queue_depth': s.peak_queued,
+                        'active': s.active,
+                        'completed': s.completed,
+                        'utilization': round(s.busy_seconds / (s.workers * elapsed), 3)
+                    } for name, s in pool_stats.items()
+                },
+                'running_processes': len(processes),
+                'timeouts': timeouts
+            }
+
+    def shutdown(self):
+        self.cancel()
+        for pool in self.pools.values():
+            pool.shutdown(wait=False)
+
+_engine = ExecutionEngine()
+
+def get_engine() -> ExecutionEngine:
+    return _engine
+
+def _collect_engine_metrics(metrics: MetricsRegistry):
+    stats = _engine.stats()
+    for name, pool in stats['pools'].items():
+        metrics.set_gauge('queue_depth', pool['queue_depth'], workload=name)
+        metrics.set_gauge('active_workers', pool['active'], workload=name)
+    metrics.set_gauge('running_processes', stats['running_processes'])
+
+get_metrics().add_collector(_collect_engine_metrics)
+
+def configure_engine(**kwargs) -> ExecutionEngine:
+    """
+    Replace the shared engine, e.g. to size pools for the machine or tighten tool limits.
+    """
+    global _engine
+    _engine.shutdown()
+    _engine = ExecutionEngine(**kwargs)
+    return _engine
+
+def run_in_executor(func: Callable, *args, workload: str = 'io', **kwargs):
     loop = asyncio.get_event_loop()
-    return loop.run_in_executor(_executor, lambda: func(*args, **kwargs))
+    return asyncio.wrap_future(_engine.submit(workload, func, *args, **kwargs), loop=loop)
 
 async def gather_async(funcs: List[Callable[[], Any]]) -> List[Any]:
     tasks = [run_in_executor(f) for f in funcs]
-    return await asyncio.gather(*tasks) 
\ No newline at end of file
+    return await asyncio.gather(*tasks)
+
+async def iterate_in_executor(iterable: Iterable) -> AsyncIterator:
+    """
+    Advance a blocking iterator on the executor so the event loop keeps running between items.
+    """
+    iterator = iter(iterable)
+    done = object()
+    while True:
+        item = await run_in_executor(next, iterator, done)
+        if item is done:
+            return
+        yield item
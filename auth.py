@@ -1,49 +1,171 @@
 import sqlite3
 import hashlib
-import uuid
-from typing import Optional
+import hmac
+import os
+import secrets
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from storage import get_connection, ensure_schema, transaction
+from telemetry import get_metrics
+
+# PBKDF2-SHA256 rounds for new password hashes; stored hashes record their own, and are upgraded on login
+KDF_ITERATIONS = int(os.environ.get('DEBUGGERAI_KDF_ITERATIONS', 600000))
+SALT_BYTES = 16
+SESSION_TTL_SECONDS = 7 * 24 * 3600
+# Token lookups are cached in-process, so Streamlit reruns don't hit the database. Logout clears this
+# process's entry; other processes may honour a revoked token for up to this long.
+TOKEN_CACHE_SECONDS = 60
+TOKEN_CACHE_SIZE = 10000
+
+class _TokenCache:
+    """
+    Token hash -> user, expiring after ttl seconds or when the session does, whichever is sooner.
+    """
+    def __init__(self, ttl: float = TOKEN_CACHE_SECONDS, max_entries: int = TOKEN_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries: Dict[Tuple[str, str], Tuple[Dict, float]] = {}
+
+    def get(self, key: Tuple[str, str]) -> Optional[Dict]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self.entries[key]
+                return None
+            return entry[0]
+
+    def put(self, key: Tuple[str, str], user: Dict, session_expires: float):
+        with self.lock:
+            if len(self.entries) >= self.max_entries:
+                # Dicts keep insertion order, so this drops the oldest entry
+                del self.entries[next(iter(self.entries))]
+            self.entries[key] = (user, min(time.time() + self.ttl, session_expires))
+
+    def discard(self, key: Tuple[str, str]):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def discard_user(self, db_path: str, username: str):
+        with self.lock:
+            for key in [k for k, (user, _) in self.entries.items() if k[0] == db_path and user['username'] == username]:
+                del self.entries[key]
+
+_token_cache = _TokenCache()
 
 class AuthDB:
-    def __init__(self, db_path='auth.db'):
-        self.conn = sqlite3.connect(db_path)
+    def __init__(self, db_path='auth.db', kdf_iterations: int = KDF_ITERATIONS, session_ttl: float = SESSION_TTL_SECONDS):
+        self.db_path = db_path
+        self.kdf_iterations = kdf_iterations
+        self.session_ttl = session_ttl
         self._create_table()
 
+    @property
+    def conn(self):
+        return get_connection(self.db_path)
+
     def _create_table(self):
-        self.conn.execute('''CREATE TABLE IF NOT EXISTS users (
+        ensure_schema(self.db_path, ['''CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             username TEXT UNIQUE,
             email TEXT UNIQUE,
-            password_hash TEXT,
-            session_token TEXT
-        )''')
-        self.conn.commit()
+            password_hash TEXT
+        )''', '''CREATE TABLE IF NOT EXISTS sessions (
+            token_hash TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            created REAL,
+            expires REAL
+        )''', 'CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions (user_id)',
+            'CREATE INDEX IF NOT EXISTS idx_sessions_expires ON sessions (expires)'])
 
-    def hash_password(self, password: str) -> str:
-        return hashlib.sha256(password.encode()).hexdigest()
+    def hash_password(self, password: str, salt: Optional[bytes] = None, iterations: Optional[int] = None) -> str:
+        """
+        Salted PBKDF2-SHA256, stored as 'pbkdf2_sha256$iterations$salt$hash'.
+        """
+        salt = salt if salt is not None else secrets.token_bytes(SALT_BYTES)
+        iterations = iterations or self.kdf_iterations
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+        return f'pbkdf2_sha256${iterations}${salt.hex()}${digest.hex()}'
+
+    def verify_password(self, password: str, stored: str) -> bool:
+        if '$' not in stored:
+            # Unsalted sha256 from before the KDF
+            return hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), stored)
+        _, iterations, salt, _ = stored.split('$')
+        return hmac.compare_digest(self.hash_password(password, bytes.fromhex(salt), int(iterations)), stored)
+
+    def _needs_rehash(self, stored: str) -> bool:
+        return '$' not in stored or int(stored.split('$')[1]) != self.kdf_iterations
+
+    @staticmethod
+    def _token_hash(token: str) -> str:
+        # Tokens are random, so a fast hash is enough to keep them out of the database
+        return hashlib.sha256(token.encode()).hexdigest()
 
     def signup(self, username: str, email: str, password: str) -> bool:
+        password_hash = self.hash_password(password)
         try:
-            self.conn.execute('''INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)''',
-                (username, email, self.hash_password(password)))
-            self.conn.commit()
+            with transaction(self.db_path) as conn:
+                conn.execute('''INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)''',
+                    (username, email, password_hash))
             return True
         except sqlite3.IntegrityError:
             return False
 
     def login(self, username_or_email: str, password: str) -> Optional[str]:
-        cur = self.conn.execute('''SELECT id FROM users WHERE (username=? OR email=?) AND password_hash=?''',
-            (username_or_email, username_or_email, self.hash_password(password)))
+        """
+        A new session token, or None for bad credentials. Other sessions of the user stay valid.
+        """
+        cur = self.conn.execute('SELECT id, password_hash FROM users WHERE username=? OR email=?',
+            (username_or_email, username_or_email))
         row = cur.fetchone()
-        if row:
-            token = str(uuid.uuid4())
-            self.conn.execute('UPDATE users SET session_token=? WHERE id=?', (token, row[0]))
-            self.conn.commit()
-            return token
-        return None
+        if row is None:
+            # Same work as a wrong password, so response times don't reveal which accounts exist
+            self.hash_password(password)
+            return None
+        if not self.verify_password(password, row[1]):
+            return None
+        user_id, stored = row
+        token = secrets.token_urlsafe(32)
+        now = time.time()
+        with transaction(self.db_path) as conn:
+            if self._needs_rehash(stored):
+                conn.execute('UPDATE users SET password_hash=? WHERE id=?', (self.hash_password(password), user_id))
+            conn.execute('DELETE FROM sessions WHERE expires <= ?', (now,))
+            conn.execute('INSERT INTO sessions (token_hash, user_id, created, expires) VALUES (?, ?, ?, ?)',
+                (self._token_hash(token), user_id, now, now + self.session_ttl))
+        return token
 
     def get_user_by_token(self, token: str) -> Optional[dict]:
-        cur = self.conn.execute('SELECT username, email FROM users WHERE session_token=?', (token,))
+        token_hash = self._token_hash(token)
+        key = (os.path.abspath(self.db_path), token_hash)
+        user = _token_cache.get(key)
+        get_metrics().inc('cache_requests_total', cache='sessions', result='miss' if user is None else 'hit')
+        if user is not None:
+            return user
+        cur = self.conn.execute('''SELECT users.username, users.email, sessions.expires FROM sessions
+            JOIN users ON users.id = sessions.user_id WHERE sessions.token_hash=? AND sessions.expires > ?''',
+            (token_hash, time.time()))
         row = cur.fetchone()
         if row:
-            return {'username': row[0], 'email': row[1]}
-        return None 
\ No newline at end of file
+            user = {'username': row[0], 'email': row[1]}
+            _token_cache.put(key, user, row[2])
+            return user
+        return None
+
+    def logout(self, token: str):
+        token_hash = self._token_hash(token)
+        with transaction(self.db_path) as conn:
+            conn.execute('DELETE FROM sessions WHERE token_hash=?', (token_hash,))
+        _token_cache.discard((os.path.abspath(self.db_path), token_hash))
+
+    def logout_everywhere(self, username: str):
+        """
+        End every session of a user, e.g. after a password change.
+        """
+        with transaction(self.db_path) as conn:
+            conn.execute('DELETE FROM sessions WHERE user_id=(SELECT id FROM users WHERE username=?)', (username,))
+        _token_cache.discard_user(os.path.abspath(self.db_path), username)
@@ -0,0 +1,226 @@
+"""
+Offline benchmark of the analyze pipeline: scan, static analysis, LLM explanations (against a local stub),
+report rendering and style learning over a synthetic repo.
+
+    python benchmark.py --files 200 --lines 150 --density 0.05 --latency 0.1 --output bench.json
+    python benchmark.py --baseline bench.json   # flag stages that got slower
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+from input_pipeline import scan_files
+from static_analysis import StaticAnalyzer
+from llm_explainer import LLMExplainer
+from report import open_report, MarkdownReportWriter
+from html_report import HTMLReportWriter
+from style_learning import StyleLearner
+from openai_stub import start_stub_server
+
+# Lines that each trigger one known pylint message, used to control finding density
+ISSUE_TEMPLATES = [
+    ('import os{n}', 'W0611', 'Unused import os{n}'),
+    ('    unused_{n} = {n}', 'W0612', "Unused variable 'unused_{n}'"),
+    ('    if value == None:', 'C0121', "Comparison 'value == None' should be 'value is None'"),
+]
+
+def make_synthetic_repo(root: str, files: int, lines_per_file: int, density: float, seed: int = 0) -> Dict[str, List[Dict]]:
+    """
+    Write `files` Python modules of roughly `lines_per_file` lines, where about `density` of the lines
+    carry a known issue. Returns the planted findings per path, used when pylint isn't installed.
+    """
+    rng = random.Random(seed)
+    planted = {}
+    for i in range(files):
+        package = os.path.join(root, f'pkg{i % 10}')
+        os.makedirs(package, exist_ok=True)
+        path = os.path.join(package, f'module_{i}.py')
+        # Imports go between the docstring and the functions; body lines are numbered once they're all known
+        imports, import_findings = [], []
+        body, body_findings = [], []
+        n = 0
+        while 1 + len(imports) + len(body) < lines_per_file:
+            body.append(f'def function_{n}(value):')
+            body.append(f'    """Return a value derived from {n}."""')
+            for _ in range(rng.randint(3, 8)):
+                if rng.random() < density:
+                    template, rule, message = rng.choice(ISSUE_TEMPLATES)
+                    if template.startswith('import'):
+                        imports.append(template.format(n=n))
+                        import_findings.append({'line': 1 + len(imports), 'type': rule, 'message': message.format(n=n)})
+                    else:
+                        body.append(template.format(n=n))
+                        body_findings.append({'line': len(body), 'type': rule, 'message': message.format(n=n)})
+                body.append(f'    value = value * {n} + {len(body)}')
+            body.append('    return value')
+            body.append('')
+            n += 1
+        for finding in body_findings:
+            finding['line'] += 1 + len(imports)
+        lines = ['"""Synthetic benchmark module."""', *imports, *body]
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        planted[path] = import_findings + body_findings
+    return planted
+
+def measure(name: str, func: Callable, items: int = 0, trace_memory: bool = False):
+    """
+    Time func and record the process max RSS afterwards. With trace_memory, also record the stage's
+    peak Python heap via tracemalloc, which slows the stage down noticeably.
+    """
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    peak = None
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    stage = {
+        'stage': name,
+        'seconds': round(elapsed, 4),
+        'items': items,
+        'throughput_per_s': round(items / elapsed, 2) if elapsed and items else None,
+        'peak_heap_mb': round(peak / 2 ** 20, 2) if peak is not None else None,
+        'max_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    }
+    return result, stage
+
+def _git_revision() -> Optional[str]:
+    try:
+        result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)))
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+def run_benchmark(files: int, lines: int, density: float, latency: float, rate_limit_every: int,
+                  concurrency: int, batch_size: int, seed: int = 0, trace_memory: bool = False) -> Dict:
+    root = tempfile.mkdtemp(prefix='debuggerai-bench-')
+    server, stub, base_url = start_stub_server(latency, rate_limit_every)
+    stages = []
+    try:
+        planted = make_synthetic_repo(root, files, lines, density, seed)
+        code_files, stage = measure('scan', lambda: scan_files(root, 'Python'), files, trace_memory)
+        stages.append(stage)
+
+        if shutil.which('pylint'):
+            findings, stage = measure('analyze', lambda: StaticAnalyzer.analyze_python_batch(code_files), len(code_files),
+                                      trace_memory)
+            stages.append(stage)
+            findings_source = 'pylint'
+        else:
+            findings = {path: items for path, items in planted.items()}
+            findings_source = 'planted'
+
+        explainer = LLMExplainer('stub-key', base_url=base_url, max_concurrency=concurrency, batch_size=batch_size,
+                                 requests_per_minute=1e9, tokens_per_minute=1e12)
+
+        async def explain_all():
+            results = await asyncio.gather(*[
+                explainer.explain_findings_async(f['code'], findings.get(f['relpath'], [])) for f in code_files])
+            await explainer.aclose()
+            return results
+        total_findings = sum(len(v) for v in findings.values())
+        explanations, stage = measure('explain', lambda: asyncio.run(explain_all()), total_findings, trace_memory)
+        stages.append(stage)
+
+        def render():
+            # The same streaming writers the app and CLI use, gzip included
+            html_writer = HTMLReportWriter(open_report(os.path.join(root, 'report.html.gz'), compress=True))
+            md_writer = MarkdownReportWriter(open_report(os.path.join(root, 'report.md.gz'), compress=True))
+            for f, ex in zip(code_files, explanations):
+                if ex:
+                    html_writer.add(f['filename'], ex)
+                    md_writer.add(f['filename'], ex)
+            for writer in (html_writer, md_writer):
+                writer.close()
+                writer.out.close()
+        _, stage = measure('report', render, total_findings, trace_memory)
+        stages.append(stage)
+
+        _, stage = measure('style', lambda: StyleLearner(cache_path=None).analyze_codebase(code_files),
+                           sum(f['code'].count('\n') for f in code_files), trace_memory)
+        stages.append(stage)
+    finally:
+        server.shutdown()
+        shutil.rmtree(root, ignore_errors=True)
+    return {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'revision': _git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpus': os.cpu_count()
+        },
+        'params': {
+            'files': files, 'lines_per_file': lines, 'density': density, 'latency': latency,
+            'rate_limit_every': rate_limit_every, 'concurrency': concurrency, 'batch_size': batch_size,
+            'findings_source': findings_source, 'findings': total_findings, 'trace_memory': trace_memory
+        },
+        'stub': stub.stats(),
+        'stages': stages,
+        'total_seconds': round(sum(s['seconds'] for s in stages), 4)
+    }
+
+def compare(current: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """
+    Stages whose time grew by more than `threshold` (a fraction) relative to the baseline run.
+    """
+    before = {s['stage']: s for s in baseline.get('stages', [])}
+    regressions = []
+    for stage in current['stages']:
+        old = before.get(stage['stage'])
+        if old and old['seconds'] > 0 and stage['seconds'] > old['seconds'] * (1 + threshold):
+            regressions.append(f"{stage['stage']}: {old['seconds']:.3f}s -> {stage['seconds']:.3f}s "
+                               f"(+{(stage['seconds'] / old['seconds'] - 1):.0%})")
+    return regressions
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark the DebuggerAI analyze pipeline offline')
+    parser.add_argument('--files', type=int, default=100)
+    parser.add_argument('--lines', type=int, default=120, help='lines per synthetic file')
+    parser.add_argument('--density', type=float, default=0.05, help='fraction of lines carrying an issue')
+    parser.add_argument('--latency', type=float, default=0.05, help='stub seconds per chat completion')
+    parser.add_argument('--rate-limit-every', type=int, default=0, help='stub answers every Nth request with 429')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--batch-size', type=int, default=1, help='findings per LLM request (1 = no batching)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--trace-memory', action='store_true', help='per-stage peak heap via tracemalloc (slower)')
+    parser.add_argument('--output', help='write the JSON result here')
+    parser.add_argument('--baseline', help='earlier JSON result to compare against')
+    parser.add_argument('--threshold', type=float, default=0.2, help='allowed slowdown before flagging, as a fraction')
+    args = parser.parse_args(argv)
+
+    result = run_benchmark(args.files, args.lines, args.density, args.latency, args.rate_limit_every,
+                           args.concurrency, args.batch_size, args.seed, args.trace_memory)
+    for stage in result['stages']:
+        heap = f"heap {stage['peak_heap_mb']:>7.2f} MB  " if stage['peak_heap_mb'] is not None else ''
+        print(f"{stage['stage']:<8} {stage['seconds']:>9.3f}s  {stage['throughput_per_s'] or 0:>10.1f}/s  "
+              f"{heap}rss {stage['max_rss_mb']:>7.1f} MB")
+    print(f"stub: {result['stub']}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(result, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            regressions = compare(result, json.load(f), args.threshold)
+        for line in regressions:
+            print(f'REGRESSION {line}')
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
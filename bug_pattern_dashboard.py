@@ -1,5 +1,12 @@
+import time
 from collections import Counter, defaultdict
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+from storage import get_connection, ensure_schema, transaction
+
+DAY_SECONDS = 86400
+
+def pattern_key(ex: Dict) -> Tuple[str, str]:
+    return ex['type'], ex['message'].split(':')[0]
 
 class BugPatternSummarizer:
     def __init__(self):
@@ -12,10 +19,19 @@ class BugPatternSummarizer:
         Returns: dict with pattern counts and examples
         """
         for file_explanations in all_explanations:
-            for ex in file_explanations:
-                key = (ex['type'], ex['message'].split(':')[0])
-                self.patterns[key] += 1
-                self.by_type[ex['type']].append(ex['message'])
+            self.add(file_explanations)
+        return self.summary()
+
+    def add(self, file_explanations: List[Dict]):
+        """
+        Fold one file's explanations into the running counts.
+        """
+        for ex in file_explanations:
+            key = pattern_key(ex)
+            self.patterns[key] += 1
+            self.by_type[ex['type']].append(ex['message'])
+
+    def summary(self) -> Dict:
         top_patterns = self.patterns.most_common(10)
         summary = {
             'top_patterns': [
@@ -23,4 +39,114 @@ class BugPatternSummarizer:
             ],
             'by_type': {k: v[:5] for k, v in self.by_type.items()}
         }
-        return summary 
\ No newline at end of file
+        return summary
+
+class BugPatternStore:
+    """
+    Findings persisted across runs for trend queries.
+    Repos and rules are dictionary-encoded to integers; every write also bumps a per-day, per-rule rollup,
+    so dashboard queries read the small rollup table instead of scanning raw events.
+    """
+    def __init__(self, db_path='bug_patterns.db'):
+        self.db_path = db_path
+        self._create_table()
+
+    @property
+    def conn(self):
+        return get_connection(self.db_path)
+
+    def _create_table(self):
+        ensure_schema(self.db_path, [
+            '''CREATE TABLE IF NOT EXISTS repos (
+                id INTEGER PRIMARY KEY,
+                name TEXT UNIQUE
+            )''',
+            '''CREATE TABLE IF NOT EXISTS rules (
+                id INTEGER PRIMARY KEY,
+                type TEXT,
+                pattern TEXT,
+                UNIQUE (type, pattern)
+            )''',
+            '''CREATE TABLE IF NOT EXISTS finding_events (
+                id INTEGER PRIMARY KEY,
+                user TEXT,
+                repo_id INTEGER,
+                file TEXT,
+                rule_id INTEGER,
+                day INTEGER,
+                timestamp REAL
+            )''',
+            'CREATE INDEX IF NOT EXISTS idx_finding_events_repo_day ON finding_events (repo_id, day)',
+            '''CREATE TABLE IF NOT EXISTS rule_daily (
+                repo_id INTEGER,
+                user TEXT,
+                day INTEGER,
+                rule_id INTEGER,
+                count INTEGER,
+                PRIMARY KEY (repo_id, day, rule_id, user)
+            ) WITHOUT ROWID''',
+            'CREATE INDEX IF NOT EXISTS idx_rule_daily_user_day ON rule_daily (user, day)'
+        ])
+
+    def _id(self, conn, table: str, columns: Tuple[str, ...], values: Tuple) -> int:
+        where = ' AND '.join(f'{c}=?' for c in columns)
+        row = conn.execute(f'SELECT id FROM {table} WHERE {where}', values).fetchone()
+        if row:
+            return row[0]
+        placeholders = ', '.join('?' for _ in columns)
+        return conn.execute(f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({placeholders})', values).lastrowid
+
+    def record_run(self, user: str, repo: str, results: List[Tuple[str, List[Dict]]], timestamp: Optional[float] = None):
+        """
+        results: (filename, explanations) per file; written together with their rollups in one transaction
+        """
+        timestamp = timestamp or time.time()
+        day = int(timestamp // DAY_SECONDS)
+        with transaction(self.db_path) as conn:
+            repo_id = self._id(conn, 'repos', ('name',), (repo,))
+            rule_ids = {}
+            events = []
+            daily = Counter()
+            for filename, explanations in results:
+                for ex in explanations:
+                    key = pattern_key(ex)
+                    if key not in rule_ids:
+                        rule_ids[key] = self._id(conn, 'rules', ('type', 'pattern'), key)
+                    events.append((user, repo_id, filename, rule_ids[key], day, timestamp))
+                    daily[rule_ids[key]] += 1
+            conn.executemany('''INSERT INTO finding_events (user, repo_id, file, rule_id, day, timestamp)
+                VALUES (?, ?, ?, ?, ?, ?)''', events)
+            conn.executemany('''INSERT INTO rule_daily (repo_id, user, day, rule_id, count) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (repo_id, day, rule_id, user) DO UPDATE SET count = count + excluded.count''',
+                [(repo_id, user, day, rule_id, n) for rule_id, n in daily.items()])
+
+    def _filters(self, repo: Optional[str], user: Optional[str], days: int) -> Tuple[str, List]:
+        clauses, params = ['d.day >= ?'], [int(time.time() // DAY_SECONDS) - days + 1]
+        if repo is not None:
+            clauses.append('d.repo_id = (SELECT id FROM repos WHERE name=?)')
+            params.append(repo)
+        if user is not None:
+            clauses.append('d.user = ?')
+            params.append(user)
+        return ' AND '.join(clauses), params
+
+    def top_rules(self, repo: Optional[str] = None, user: Optional[str] = None, days: int = 30, limit: int = 10) -> List[Dict]:
+        where, params = self._filters(repo, user, days)
+        cur = self.conn.execute(f'''SELECT r.type, r.pattern, SUM(d.count) AS total FROM rule_daily d
+            JOIN rules r ON r.id = d.rule_id WHERE {where}
+            GROUP BY d.rule_id ORDER BY total DESC LIMIT ?''', params + [limit])
+        return [{'type': t, 'pattern': p, 'count': n} for t, p, n in cur.fetchall()]
+
+    def daily_totals(self, repo: Optional[str] = None, user: Optional[str] = None, days: int = 30) -> List[Dict]:
+        where, params = self._filters(repo, user, days)
+        cur = self.conn.execute(f'''SELECT d.day, SUM(d.count) FROM rule_daily d WHERE {where}
+            GROUP BY d.day ORDER BY d.day''', params)
+        return [{'date': time.strftime('%Y-%m-%d', time.gmtime(day * DAY_SECONDS)), 'count': n} for day, n in cur.fetchall()]
+
+    def prune_events(self, older_than_days: int):
+        """
+        Drop raw events past retention; the daily rollups are kept.
+        """
+        cutoff = int(time.time() // DAY_SECONDS) - older_than_days
+        with transaction(self.db_path) as conn:
+            conn.execute('DELETE FROM finding_events WHERE day < ?', (cutoff,))
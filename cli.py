@@ -0,0 +1,206 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+from input_pipeline import SUPPORTED_EXTENSIONS, AUTO_DETECT
+from report import open_report, MarkdownReportWriter
+from html_report import HTMLReportWriter
+from fix_diff import combine_patch
+
+# Heavy modules (openai, the analysis pipeline) are imported inside main() once the arguments are known,
+# so --help is instant and static-only runs never load the OpenAI client. Streamlit is never imported.
+
+FORMATS = ['json', 'md', 'html', 'patch']
+
+class ReportWriter:
+    """
+    Appends each file's report to the requested output files as soon as it finishes.
+    """
+    def __init__(self, output_dir: str, formats: List[str], compress: bool = False):
+        os.makedirs(output_dir, exist_ok=True)
+        suffix = '.gz' if compress else ''
+        self.paths = {fmt: os.path.join(output_dir, f"debuggerai_{'fixes' if fmt == 'patch' else 'report'}."
+                                                    f"{'jsonl' if fmt == 'json' else fmt}{suffix}") for fmt in formats}
+        self.files = {fmt: open_report(path, compress) for fmt, path in self.paths.items()}
+        self.html = HTMLReportWriter(self.files['html']) if 'html' in self.files else None
+        self.md = MarkdownReportWriter(self.files['md']) if 'md' in self.files else None
+
+    def write(self, filename: str, relpath: str, explanations: List[Dict], report_md: Optional[str] = None,
+              code: Optional[str] = None, patch_path: Optional[str] = None):
+        """
+        code and patch_path (relative to the analyzed folder) add the file's fixes to the combined patch.
+        """
+        if 'patch' in self.files and code is not None:
+            patch = combine_patch(patch_path or filename, code, explanations)
+            if patch:
+                self.files['patch'].write(patch + '\n')
+        if 'json' in self.files:
+            self.files['json'].write(json.dumps({'file': relpath, 'explanations': explanations}) + '\n')
+        if self.md is not None:
+            self.md.add(filename, explanations, report_md)
+        if self.html is not None:
+            self.html.add(filename, explanations)
+        for f in self.files.values():
+            f.flush()
+
+    def close(self):
+        for writer in (self.html, self.md):
+            if writer is not None:
+                writer.close()
+        for f in self.files.values():
+            f.close()
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='debuggerai', description='Analyze a file or folder without the web UI.')
+    parser.add_argument('path', help='file or folder to analyze')
+    parser.add_argument('--language', default='Python', choices=[*SUPPORTED_EXTENSIONS, 'auto'],
+                        help='auto scans every supported language in one pass, detected per file')
+    parser.add_argument('--depth', default='Intermediate', help='explanation depth (Beginner, Intermediate, Expert, ...)')
+    parser.add_argument('--model', default='gpt-4o')
+    parser.add_argument('--api-key', default=os.environ.get('OPENAI_API_KEY'), help='defaults to $OPENAI_API_KEY')
+    parser.add_argument('--base-url', default=None, help='OpenAI-compatible endpoint')
+    parser.add_argument('--static-only', action='store_true', help='run the linters only, no LLM explanations')
+    parser.add_argument('--no-batch', action='store_true', help='one API request per finding')
+    parser.add_argument('--max-concurrency', type=int, default=8, help='concurrent API requests')
+    parser.add_argument('--max-calls', type=int, help='LLM budget: explain the most important findings first, in at most this many API calls')
+    parser.add_argument('--max-tokens', type=int, help='LLM budget in prompt plus completion tokens')
+    parser.add_argument('--max-seconds', type=int, help='LLM budget in seconds spent explaining, after the scan')
+    parser.add_argument('--workers', type=int, default=None, help='concurrent analysis workers (default: one per CPU)')
+    parser.add_argument('--job-dir', help='checkpoint results here; rerun with the same directory to resume')
+    parser.add_argument('--output-dir', help='where reports are written (default: the job dir, else ./debuggerai-report)')
+    parser.add_argument('--format', default='md', help=f"comma separated output formats: {', '.join(FORMATS)} "
+                                                        "(patch: every suggested fix, for `patch -p1` in the analyzed folder)")
+    parser.add_argument('--gzip', action='store_true', help='gzip the report files')
+    parser.add_argument('--fail-on-findings', action='store_true', help='exit with status 1 if anything was found (for CI); '
+                                                                      'files that could not be analysed always exit with status 3')
+    parser.add_argument('--quiet', action='store_true', help='no per-file progress on stderr')
+    return parser
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    formats = [fmt.strip() for fmt in args.format.split(',') if fmt.strip()]
+    unknown = [fmt for fmt in formats if fmt not in FORMATS]
+    if unknown or not formats:
+        print(f"Unknown output format: {', '.join(unknown) or args.format}", file=sys.stderr)
+        return 2
+    if not os.path.exists(args.path):
+        print(f"No such file or folder: {args.path}", file=sys.stderr)
+        return 2
+    if not args.static_only and not args.api_key:
+        print("No OpenAI API key: pass --api-key, set OPENAI_API_KEY or use --static-only", file=sys.stderr)
+        return 2
+
+    from async_utils import configure_engine
+    from bug_pattern_dashboard import BugPatternSummarizer
+    from jobs import JobStore, run_job
+
+    if not args.static_only:
+        from llm_explainer import EXPLANATION_DEPTHS
+        if args.depth not in EXPLANATION_DEPTHS:
+            print(f"Unknown depth {args.depth!r}; choose from {', '.join(EXPLANATION_DEPTHS)}", file=sys.stderr)
+            return 2
+    if args.workers:
+        configure_engine(pool_sizes={'analysis': args.workers}, tool_limits={'pylint': args.workers, 'clang-tidy': args.workers})
+    language = AUTO_DETECT if args.language == 'auto' else args.language
+    settings = {'language': language, 'static_only': args.static_only, 'depth': args.depth, 'model': args.model,
+                'batch_size': 1 if args.no_batch else 6}
+    budget = {name: getattr(args, name) for name in ('max_calls', 'max_tokens', 'max_seconds') if getattr(args, name)}
+    if budget and not args.static_only:
+        settings['budget'] = budget
+    # Without --job-dir the checkpoints go to a throwaway directory, so both cases run the same way
+    scratch = None if args.job_dir else tempfile.TemporaryDirectory(prefix='debuggerai-job-')
+    job_dir = args.job_dir or scratch.name
+    os.makedirs(job_dir, exist_ok=True)
+    store = JobStore(os.path.join(job_dir, 'jobs.db'))
+    jobs = store.list_jobs(limit=1)
+    if jobs:
+        run_id = jobs[0]['run_id']
+        if jobs[0]['folder'] != os.path.abspath(args.path) or jobs[0]['settings'] != settings:
+            print(f"{job_dir} belongs to a run of {jobs[0]['folder']} with different settings: {jobs[0]['settings']}", file=sys.stderr)
+            return 2
+    else:
+        run_id = store.create_job(None, args.path, settings)
+
+    writer = ReportWriter(args.output_dir or args.job_dir or 'debuggerai-report', formats, args.gzip)
+    summarizer = BugPatternSummarizer()
+    total_findings = 0
+    # Patch paths are relative to the analyzed folder
+    root = args.path if os.path.isdir(args.path) else os.path.dirname(args.path)
+
+    def source(path):
+        if 'patch' not in formats:
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                return f.read()
+        except OSError:
+            # Deleted or unreadable since it was analysed: left out of the patch rather than failing the run
+            return None
+
+    def on_resume(path, explanations):
+        # Results kept from the interrupted run go first so the reports cover the whole tree
+        nonlocal total_findings
+        writer.write(os.path.basename(path), path, explanations, code=source(path), patch_path=os.path.relpath(path, root))
+        summarizer.add(explanations)
+        total_findings += len(explanations)
+
+    analyzed = 0
+    languages = {}
+    usage = {}
+
+    def on_result(file, explanations, report_md):
+        nonlocal total_findings, analyzed
+        analyzed += 1
+        languages[file['language']] = languages.get(file['language'], 0) + 1
+        if explanations:
+            writer.write(file['filename'], file['relpath'], explanations, report_md, code=file['code'],
+                         patch_path=os.path.relpath(file['relpath'], root))
+            summarizer.add(explanations)
+            total_findings += len(explanations)
+        if not args.quiet:
+            print(f"{file['relpath']}: {len(explanations)} findings", file=sys.stderr)
+
+    started = time.time()
+    try:
+        run_job(store, run_id, args.api_key, on_result=on_result, on_budget=usage.update, on_resume=on_resume,
+                base_url=args.base_url, max_concurrency=args.max_concurrency)
+        # Read before the scratch job dir is removed
+        progress = store.progress(run_id)
+    except KeyboardInterrupt:
+        print("Interrupted; rerun with the same --job-dir to resume" if args.job_dir else "Interrupted", file=sys.stderr)
+        return 130
+    finally:
+        writer.close()
+        if scratch is not None:
+            scratch.cleanup()
+
+    notes = []
+    if scratch is None:
+        # Only a --job-dir can hold files finished by an earlier run
+        notes.append(f"{progress.get('done', 0) - analyzed} done by a previous run")
+    if progress.get('failed'):
+        notes.append(f"{progress['failed']} failed")
+    print(f"Analyzed {analyzed} files" + (f" ({', '.join(notes)})" if notes else '') +
+          f", {total_findings} findings in {time.time() - started:.1f}s", file=sys.stderr)
+    if len(languages) > 1:
+        print("  " + ", ".join(f"{name}: {count} files" for name, count in sorted(languages.items())), file=sys.stderr)
+    if usage:
+        print(f"  LLM budget: {usage['calls']} calls, {usage['tokens']} tokens, {usage['seconds']}s; "
+              f"{usage['learned']} from explanation templates, {usage['explained']} explained, {usage['cached']} from cache, "
+              f"{usage['templated']} templated"
+              + (f" (ran out of {usage['exhausted']})" if usage['exhausted'] else ''), file=sys.stderr)
+    for pattern in summarizer.summary()['top_patterns'][:5]:
+        print(f"  {pattern['count']:>5}  {pattern['type']}  {pattern['pattern']}", file=sys.stderr)
+    for fmt, path in writer.paths.items():
+        print(f"{fmt}: {path}", file=sys.stderr)
+    if progress.get('failed'):
+        # A linter or API outage must not pass for a clean run
+        print(f"{progress['failed']} files could not be analysed", file=sys.stderr)
+        return 3
+    return 1 if args.fail_on_findings and total_findings else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,71 @@
+import ast
+from typing import List, Dict, Optional, Tuple
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting
+    return len(text) // 4
+
+class ContextExtractor:
+    """
+    Cuts a file down to the code relevant to one finding: the enclosing function/class
+    (found with ast for Python) plus a window of lines around the finding, trimmed to a token budget.
+    """
+    def __init__(self, code: str, language: str = 'Python', window: int = 20, max_scope_lines: int = 200,
+                 max_tokens: Optional[int] = 3000):
+        self.lines = code.splitlines()
+        self.language = language
+        self.window = window
+        self.max_scope_lines = max_scope_lines
+        self.max_tokens = max_tokens
+        self.full_tokens = estimate_tokens(code)
+        self.scopes = self._python_scopes(code) if language == 'Python' else []
+
+    @staticmethod
+    def _python_scopes(code: str) -> List[Tuple[int, int]]:
+        try:
+            tree = ast.parse(code)
+        except (SyntaxError, ValueError):
+            return []
+        scopes = []
+        for node in ast.walk(tree):
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+                scopes.append((start, node.end_lineno or node.lineno))
+        return scopes
+
+    def enclosing_scope(self, line: int) -> Optional[Tuple[int, int]]:
+        containing = [s for s in self.scopes if s[0] <= line <= s[1] and s[1] - s[0] < self.max_scope_lines]
+        if not containing:
+            return None
+        # The innermost scope that is small enough to send whole
+        return min(containing, key=lambda s: s[1] - s[0])
+
+    def extract(self, line: int, last_line: Optional[int] = None) -> Dict:
+        """
+        Returns {'code', 'start', 'end', 'tokens_saved'} with 1-based inclusive line numbers.
+        Pass last_line to cover a range of findings; the budget never trims inside that range.
+        """
+        total = len(self.lines)
+        first = max(1, min(line, total or 1))
+        last = max(first, min(last_line or first, total or 1))
+        start, end = max(1, first - self.window), min(total, last + self.window)
+        for target in {first, last}:
+            scope = self.enclosing_scope(target)
+            if scope:
+                start, end = min(start, scope[0]), max(end, scope[1])
+        size = sum(len(l) + 1 for l in self.lines[start - 1:end])
+        # Shrink towards the finding lines until the excerpt fits the budget
+        while self.max_tokens and size // 4 > self.max_tokens and (start < first or end > last):
+            if end <= last or (start < first and first - start >= end - last):
+                size -= len(self.lines[start - 1]) + 1
+                start += 1
+            else:
+                size -= len(self.lines[end - 1]) + 1
+                end -= 1
+        text = '\n'.join(self.lines[start - 1:end])
+        return {
+            'code': text,
+            'start': start,
+            'end': end,
+            'tokens_saved': max(0, self.full_tokens - estimate_tokens(text))
+        }
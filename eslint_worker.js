@@ -0,0 +1,61 @@
+// Long-lived ESLint worker for DebuggerAI (see linter_backends.py). Node and ESLint load once; each stdin
+// line is a JSON request answered by one JSON line on stdout:
+//   {"id": 1, "op": "ping"}                 -> {"id": 1, "ok": true, "version": "..."}
+//   {"id": 2, "op": "lint", "path": "a.js"} -> {"id": 2, "findings": [{"line", "type", "message"}]}
+// ESLINT_MODULE points at a specific eslint install; ESLINT_CONFIG at a config file to use for every file.
+const path = require('path');
+const readline = require('readline');
+
+function loadESLint() {
+  const candidates = [process.env.ESLINT_MODULE || 'eslint'];
+  try {
+    // Fall back to a global install, which require() doesn't search
+    const globalRoot = require('child_process').execSync('npm root -g', { stdio: ['ignore', 'pipe', 'ignore'] });
+    candidates.push(path.join(globalRoot.toString().trim(), 'eslint'));
+  } catch (e) {
+    // npm missing; only the local candidates apply
+  }
+  for (const candidate of candidates) {
+    try {
+      return require(candidate).ESLint;
+    } catch (e) {
+      // try the next one
+    }
+  }
+  process.stderr.write('eslint_worker: cannot load eslint\n');
+  process.exit(1);
+}
+
+const ESLint = loadESLint();
+const eslint = new ESLint(process.env.ESLINT_CONFIG ? { overrideConfigFile: process.env.ESLINT_CONFIG } : {});
+const reply = message => process.stdout.write(JSON.stringify(message) + '\n');
+
+async function handle(line) {
+  let request;
+  try {
+    request = JSON.parse(line);
+  } catch (e) {
+    return;
+  }
+  if (request.op === 'ping') {
+    reply({ id: request.id, ok: true, version: ESLint.version });
+    return;
+  }
+  try {
+    const [result] = await eslint.lintFiles([request.path]);
+    const findings = (result ? result.messages : []).map(m => ({
+      line: m.line || 0,
+      type: m.ruleId || (m.fatal ? 'fatal' : 'eslint'),
+      message: m.message
+    }));
+    reply({ id: request.id, findings });
+  } catch (e) {
+    reply({ id: request.id, error: e.message });
+  }
+}
+
+// Requests are handled one at a time, in order; the backend only sends one at a time anyway
+let queue = Promise.resolve();
+readline.createInterface({ input: process.stdin })
+  .on('line', line => { queue = queue.then(() => handle(line)); })
+  .on('close', () => queue.then(() => process.exit(0)));
@@ -0,0 +1,267 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+from rules import rule_id
+from telemetry import get_metrics
+
+# How much an explanation of a finding is worth, by its category. Notes only annotate the diagnostic
+# before them and pylint's informational messages aren't bugs, so neither is ever sent to the LLM.
+TYPE_SEVERITY = {'fatal': 1.0, 'error': 0.9, 'warning': 0.5, 'note': 0.0, 'checkstyle': 0.2}
+# pylint message ids start with their category: Fatal, Error, Warning, Refactor, Convention, Information
+PYLINT_SEVERITY = {'F': 1.0, 'E': 0.9, 'W': 0.5, 'R': 0.25, 'C': 0.1, 'I': 0.0}
+# eslint reports the rule as the type, which says nothing about severity
+DEFAULT_SEVERITY = 0.4
+PYLINT_ID = re.compile(r'^[A-Z]\d{4}$')
+# Ratings are 1-5; a rule's average is pulled towards the neutral rating until it has a few ratings
+NEUTRAL_RATING = 3.0
+RATING_PRIOR = 2
+
+def severity(finding: Dict) -> float:
+    finding_type = finding['type']
+    if finding_type in TYPE_SEVERITY:
+        return TYPE_SEVERITY[finding_type]
+    if PYLINT_ID.match(finding_type):
+        return PYLINT_SEVERITY.get(finding_type[0], DEFAULT_SEVERITY)
+    return DEFAULT_SEVERITY
+
+def template_explanation(finding: Dict) -> Dict:
+    """
+    Report entry for a finding that wasn't worth, or didn't fit in, the run's LLM budget.
+    """
+    if severity(finding) == 0:
+        reason = "informational findings aren't sent to it."
+    else:
+        reason = "this run's explanation budget went to higher-priority findings."
+    return {'line': finding['line'], 'type': finding['type'], 'message': finding['message'],
+            'explanation': f"{finding['message']} ({rule_id(finding)}). Not explained by the LLM: {reason}",
+            'fix': ''}
+
+class ExplanationBudget:
+    """
+    Per-run limits on LLM use. None means unlimited.
+    """
+    def __init__(self, max_calls: Optional[int] = None, max_tokens: Optional[int] = None, max_seconds: Optional[float] = None):
+        self.max_calls = max_calls
+        self.max_tokens = max_tokens
+        self.max_seconds = max_seconds
+
+    @classmethod
+    def from_dict(cls, limits: Optional[Dict]) -> 'ExplanationBudget':
+        return cls(**(limits or {}))
+
+    def to_dict(self) -> Dict:
+        return {'max_calls': self.max_calls, 'max_tokens': self.max_tokens, 'max_seconds': self.max_seconds}
+
+class ExplanationScheduler:
+    """
+    Explains a run's findings highest value first within a budget, instead of every finding as its file finishes.
+    A finding's value is its severity, scaled by how users rated explanations of its rule, and divided by
+    how many findings of the same rule rank above it: the tenth unused import teaches less than the first.
+    Findings the explainer's template library knows are served from it first, at no cost.
+    Findings that don't fit get a cached explanation if one exists, else a templated one.
+    Each request reserves its full completion allowance against max_tokens until it finishes, so the budget
+    is never overshot by more than the requests' real prompt sizes exceed their estimates.
+    """
+    def __init__(self, explainer, budget: Optional[ExplanationBudget] = None, feedback_db=None):
+        self.explainer = explainer
+        self.budget = budget or ExplanationBudget()
+        self.ratings = feedback_db.rule_ratings() if feedback_db is not None else {}
+        # (file, findings) in the order files finished analysis
+        self.files: List[Tuple[Dict, List[Dict]]] = []
+        self.counts = {'findings': 0, 'learned': 0, 'explained': 0, 'cached': 0, 'templated': 0}
+        self.exhausted: Optional[str] = None
+        self.seconds = 0.0
+        self._started = None
+        self._usage_start = (0, 0)
+        # (-value, tie-break, file index, finding indices): the groups still to explain, best first
+        self._queue = []
+        self._order = itertools.count()
+
+    def add(self, file: Dict, findings: List[Dict]):
+        self.files.append((file, findings))
+        self.counts['findings'] += len(findings)
+
+    def _rating_factor(self, rule: str) -> float:
+        average, count = self.ratings.get(rule, (NEUTRAL_RATING, 0))
+        return (average * count + NEUTRAL_RATING * RATING_PRIOR) / (count + RATING_PRIOR) / NEUTRAL_RATING
+
+    def values(self) -> List[List[float]]:
+        """
+        Value of explaining each finding, per file.
+        """
+        ranked = sorted(((severity(f) * self._rating_factor(rule_id(f)), n, i)
+                         for n, (_, findings) in enumerate(self.files) for i, f in enumerate(findings)),
+                        key=lambda item: -item[0])
+        values = [[0.0] * len(findings) for _, findings in self.files]
+        seen = {}
+        for value, n, i in ranked:
+            rule = rule_id(self.files[n][1][i])
+            values[n][i] = value / (1 + seen.get(rule, 0))
+            seen[rule] = seen.get(rule, 0) + 1
+        return values
+
+    def _calls(self) -> int:
+        return self.explainer.calls - self._usage_start[0]
+
+    def _tokens(self) -> int:
+        return self.explainer.prompt_tokens + self.explainer.completion_tokens - self._usage_start[1]
+
+    def _remaining_seconds(self) -> Optional[float]:
+        if self.budget.max_seconds is None:
+            return None
+        return self.budget.max_seconds - (time.monotonic() - self._started)
+
+    def _spent(self) -> Optional[str]:
+        """
+        Which limit is used up, if any.
+        """
+        if self.budget.max_calls is not None and self._calls() >= self.budget.max_calls:
+            return 'calls'
+        if self.budget.max_tokens is not None and self._tokens() >= self.budget.max_tokens:
+            return 'tokens'
+        remaining = self._remaining_seconds()
+        if remaining is not None and remaining <= 0:
+            return 'seconds'
+        return None
+
+    def _fits(self, in_flight: Dict, estimate: int) -> bool:
+        if self.budget.max_calls is not None and self._calls() + len(in_flight) + 1 > self.budget.max_calls:
+            return False
+        reserved = sum(in_flight.values())
+        return self.budget.max_tokens is None or self._tokens() + reserved + estimate <= self.budget.max_tokens
+
+    async def _wait(self, in_flight: Dict):
+        """
+        Wait for a request to finish; at the time limit, cancel whatever is still running.
+        """
+        remaining = self._remaining_seconds()
+        done, _ = await asyncio.wait(in_flight, timeout=None if remaining is None else max(0.0, remaining),
+                                     return_when=asyncio.FIRST_COMPLETED)
+        if not done:
+            self.exhausted = 'seconds'
+            for task in in_flight:
+                task.cancel()
+            await asyncio.gather(*in_flight, return_exceptions=True)
+            done = set(in_flight)
+        for task in done:
+            del in_flight[task]
+
+    def _push(self, value: float, n: int, group: List[int]):
+        heapq.heappush(self._queue, (-value, next(self._order), n, group))
+
+    async def _explain(self, n: int, group: List[int], plan: Tuple, values: List[float]):
+        file, findings = self.files[n]
+        extractor, _, explanations = plan
+        if self.explainer.trace is not None:
+            self.explainer.trace.bind(file=file['relpath'])
+        try:
+            results = await self.explainer.explain_group_async(extractor, [findings[i] for i in group], fallback=False)
+        except Exception:
+            # Left to the cache or the template, like findings over budget
+            logging.exception("Explaining findings in %s failed", file['relpath'])
+            return
+        for i, explanation in zip(group, results):
+            if explanation is None:
+                # The batch answer missed it; ask again on its own, if the budget still allows
+                self._push(values[i], n, [i])
+            else:
+                explanations[i] = explanation
+                self.counts['explained'] += 1
+
+    async def run(self) -> List[Tuple[Dict, List[Dict]]]:
+        """
+        Explain within the budget and return (file, explanations) for every added file, in the order added.
+        """
+        self._started = time.monotonic()
+        self._usage_start = (self.explainer.calls, self.explainer.prompt_tokens + self.explainer.completion_tokens)
+        plans = []
+        values = self.values()
+        for n, (file, findings) in enumerate(self.files):
+            explanations = [None] * len(findings)
+            for i, explanation in self.explainer.learned_explanations(findings, file.get('language')).items():
+                explanations[i] = explanation
+                self.counts['learned'] += 1
+            worth = [i for i in range(len(findings)) if values[n][i] > 0 and explanations[i] is None]
+            extractor, groups = self.explainer.plan(file['code'], [findings[i] for i in worth], file.get('language'))
+            groups = [[worth[i] for i in group] for group in groups]
+            plans.append((extractor, groups, explanations))
+            for group in groups:
+                self._push(sum(values[n][i] for i in group), n, group)
+
+        in_flight = {}
+        skipped = False
+        while self._queue or in_flight:
+            if not self._queue:
+                # Batch answers that missed findings requeue them
+                await self._wait(in_flight)
+                continue
+            _, _, n, group = heapq.heappop(self._queue)
+            findings = self.files[n][1]
+            extractor, _, explanations = plans[n]
+            cached = self.explainer.cached_explanations(extractor, [findings[i] for i in group])
+            if all(explanation is not None for explanation in cached):
+                # Free, so it doesn't count against the budget
+                for i, explanation in zip(group, cached):
+                    explanations[i] = explanation
+                self.counts['cached'] += len(group)
+                continue
+            estimate = self.explainer.estimate_tokens(extractor, [findings[i] for i in group])
+            while True:
+                self.exhausted = self._spent()
+                if self.exhausted or (len(in_flight) < self.explainer.max_concurrency and self._fits(in_flight, estimate)):
+                    break
+                if not in_flight:
+                    # Too big for what's left of the token budget on its own; smaller groups may still fit
+                    break
+                await self._wait(in_flight)
+            if self.exhausted:
+                break
+            if not self._fits(in_flight, estimate):
+                skipped = True
+                continue
+            task = asyncio.ensure_future(self._explain(n, group, plans[n], values[n]))
+            in_flight[task] = estimate
+        while in_flight:
+            await self._wait(in_flight)
+        if self.exhausted is None and skipped:
+            self.exhausted = 'tokens'
+        self.seconds = time.monotonic() - self._started
+
+        results = []
+        for (file, findings), (extractor, groups, explanations) in zip(self.files, plans):
+            self._fill(extractor, findings, groups, explanations)
+            results.append((file, explanations))
+        metrics = get_metrics()
+        for source in ('learned', 'explained', 'cached', 'templated'):
+            metrics.inc('scheduled_explanations_total', self.counts[source], source=source)
+        return results
+
+    def _fill(self, extractor, findings: List[Dict], groups: List[List[int]], explanations: List):
+        """
+        Cached, else templated, explanations for findings that weren't explained.
+        """
+        grouped = {i for group in groups for i in group}
+        missing = [[i for i in group if explanations[i] is None] for group in groups]
+        missing += [[i] for i in range(len(findings)) if i not in grouped and explanations[i] is None]
+        for group in missing:
+            if not group:
+                continue
+            cached = self.explainer.cached_explanations(extractor, [findings[i] for i in group])
+            for i, explanation in zip(group, cached):
+                if explanation is not None:
+                    explanations[i] = explanation
+                    self.counts['cached'] += 1
+                else:
+                    explanations[i] = template_explanation(findings[i])
+                    self.counts['templated'] += 1
+
+    def report(self) -> Dict:
+        """
+        Budget and usage for the run, and how each finding was explained.
+        """
+        return {**self.budget.to_dict(), 'calls': self._calls(), 'tokens': self._tokens(),
+                'seconds': round(self.seconds, 1), **self.counts, 'exhausted': self.exhausted}
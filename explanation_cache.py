@@ -0,0 +1,130 @@
+import asyncio
+import hashlib
+import threading
+import time
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Dict, Optional
+from storage import get_connection, ensure_schema, transaction
+from telemetry import get_metrics
+
+class ExplanationCache:
+    """
+    Persistent LLM responses keyed by a hash of the normalized prompt and model.
+    Entries expire after ttl_seconds and the least recently used are evicted past max_entries.
+    Identical requests made while one is already in flight wait for that result instead of calling the API again.
+    """
+    def __init__(self, db_path='explanation_cache.db', ttl_seconds: float = 30 * 24 * 3600, max_entries: int = 20000):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.in_flight: Dict[str, Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.merged = 0
+        self._create_table()
+
+    @property
+    def conn(self):
+        return get_connection(self.db_path)
+
+    def _create_table(self):
+        ensure_schema(self.db_path, ['''CREATE TABLE IF NOT EXISTS explanations (
+            key TEXT PRIMARY KEY,
+            response TEXT,
+            created REAL,
+            last_used REAL
+        )''', 'CREATE INDEX IF NOT EXISTS idx_explanations_last_used ON explanations (last_used)'])
+
+    @staticmethod
+    def make_key(prompt: str, model: str) -> str:
+        normalized = ' '.join(prompt.split())
+        return hashlib.sha256(f'{model}\0{normalized}'.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self.lock:
+            return self._get(key)
+
+    def _get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with transaction(self.db_path) as conn:
+            row = conn.execute('SELECT response, created FROM explanations WHERE key=?', (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl_seconds:
+                conn.execute('DELETE FROM explanations WHERE key=?', (key,))
+                return None
+            conn.execute('UPDATE explanations SET last_used=? WHERE key=?', (now, key))
+        return row[0]
+
+    def put(self, key: str, response: str):
+        now = time.time()
+        with transaction(self.db_path) as conn:
+            conn.execute('INSERT OR REPLACE INTO explanations (key, response, created, last_used) VALUES (?, ?, ?, ?)',
+                (key, response, now, now))
+            count = conn.execute('SELECT COUNT(*) FROM explanations').fetchone()[0]
+            if count > self.max_entries:
+                conn.execute('''DELETE FROM explanations WHERE key IN (
+                    SELECT key FROM explanations ORDER BY last_used LIMIT ?)''', (count - self.max_entries,))
+
+    def _claim(self, key: str):
+        """
+        Returns (cached response, in-flight future, whether the caller must compute it).
+        """
+        with self.lock:
+            cached = self._get(key)
+            if cached is not None:
+                self.hits += 1
+                get_metrics().inc('cache_requests_total', cache='explanation', result='hit')
+                return cached, None, False
+            future = self.in_flight.get(key)
+            if future is None:
+                future = Future()
+                self.in_flight[key] = future
+                self.misses += 1
+                get_metrics().inc('cache_requests_total', cache='explanation', result='miss')
+                return None, future, True
+            self.merged += 1
+            get_metrics().inc('cache_requests_total', cache='explanation', result='merged')
+            return None, future, False
+
+    def get_or_compute(self, key: str, compute: Callable[[], str]) -> str:
+        cached, future, owner = self._claim(key)
+        if cached is not None:
+            return cached
+        if not owner:
+            return future.result()
+        try:
+            response = compute()
+            self.put(key, response)
+            future.set_result(response)
+            return response
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.in_flight.pop(key, None)
+
+    async def get_or_compute_async(self, key: str, compute: Callable[[], Awaitable[str]]) -> str:
+        cached, future, owner = self._claim(key)
+        if cached is not None:
+            return cached
+        if not owner:
+            return await asyncio.wrap_future(future)
+        try:
+            response = await compute()
+            self.put(key, response)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            # Includes cancellation, so waiters on this key are never left hanging
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.in_flight.pop(key, None)
+
+    def stats(self) -> Dict:
+        entries = self.conn.execute('SELECT COUNT(*) FROM explanations').fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses, 'merged': self.merged, 'entries': entries}
@@ -0,0 +1,189 @@
+import argparse
+import json
+import re
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from feedback import FeedbackDB
+from rules import rule_id
+from storage import get_connection, ensure_schema, transaction
+from telemetry import get_metrics
+
+# A rule needs this many good ratings at this depth and language before its explanation is reused
+MIN_RATING = 4
+MIN_SUPPORT = 2
+# Placeholders from static-only runs and over-budget findings aren't worth learning
+PLACEHOLDER = re.compile(r'^Not explained|Not explained by the LLM')
+# Stripped from message words before they're substituted into the explanation, e.g. 'x' -> x
+WORD_PUNCTUATION = '\'"`,.:;()[]{}'
+# Code blocks quote the rated user's source and fix; only the prose around them is reused,
+# without the line introducing a block ("Fixed code:")
+CODE_BLOCK = re.compile(r'(?:^[^\n]*:[ \t]*\n+)?```.*?(?:```|\Z)', re.DOTALL | re.MULTILINE)
+
+def _message_params(message: str, others: List[str]) -> List[int]:
+    """
+    Word positions where messages of the same rule differ, e.g. the name in "Unused import os".
+    """
+    words = message.split()
+    params = set()
+    for other in others:
+        other_words = other.split()
+        if len(other_words) == len(words):
+            params.update(i for i, (a, b) in enumerate(zip(words, other_words)) if a != b)
+    return sorted(params)
+
+def _prose(explanation: str) -> str:
+    """
+    The explanation without its code blocks.
+    """
+    return re.sub(r'\n{3,}', '\n\n', CODE_BLOCK.sub('', explanation)).strip()
+
+def _substitute(text: str, old: str, new: str) -> Optional[str]:
+    """
+    Swap old for new where the text quotes or backticks it. None if old also appears bare,
+    where a name can't be told apart from an ordinary word (a parameter 'a' and the article).
+    """
+    old, new = old.strip(WORD_PUNCTUATION), new.strip(WORD_PUNCTUATION)
+    if not old or old == new:
+        return text
+    quoted = re.compile(r'([\'"`])' + re.escape(old) + r'\1')
+    if re.search(r'(?<!\w)' + re.escape(old) + r'(?!\w)', quoted.sub('', text)):
+        return None
+    return quoted.sub(lambda m: m.group(1) + new + m.group(1), text)
+
+class TemplateLibrary:
+    """
+    Explanations learned from highly rated feedback, served for common rules without calling the LLM.
+    Built offline from the feedback database (python explanation_templates.py --feedback feedback.db).
+    One explanation per (rule, language, depth), taken from the best rated feedback for that rule.
+    Words that vary between the rule's messages are parameters: a finding whose message matches
+    everywhere else gets the explanation with its own values (where quoted) and line number swapped in.
+    Only the prose is kept, never the code blocks of the rated answer, since the library is shared
+    by every user. Anything else, rare rules included, is a miss and goes to the LLM.
+    """
+    def __init__(self, db_path='explanation_templates.db'):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._create_table()
+        self.templates = self._load()
+
+    @property
+    def conn(self):
+        return get_connection(self.db_path)
+
+    def _create_table(self):
+        ensure_schema(self.db_path, ['''CREATE TABLE IF NOT EXISTS explanation_templates (
+            rule TEXT,
+            language TEXT,
+            depth TEXT,
+            message TEXT,
+            params TEXT,
+            line INTEGER,
+            explanation TEXT,
+            rating REAL,
+            support INTEGER,
+            built REAL,
+            PRIMARY KEY (rule, language, depth)
+        )'''])
+
+    def _load(self) -> Dict[Tuple[str, str, str], Dict]:
+        rows = self.conn.execute('SELECT rule, language, depth, message, params, line, explanation FROM explanation_templates')
+        return {(rule, language, depth): {'words': message.split(), 'params': json.loads(params), 'line': line,
+                                          'explanation': explanation}
+                for rule, language, depth, message, params, line, explanation in rows}
+
+    def build(self, feedback_db: FeedbackDB, min_rating: float = MIN_RATING, min_support: int = MIN_SUPPORT) -> int:
+        """
+        Replace the library with templates from the feedback; returns how many were built.
+        A rule qualifies with min_support ratings of at least min_rating and an average of at least min_rating.
+        """
+        groups = defaultdict(list)
+        for rule, language, depth, message, line, explanation, rating in feedback_db.rated_explanations():
+            explanation = _prose(explanation or '')
+            if explanation and not PLACEHOLDER.search(explanation):
+                groups[(rule, language, depth)].append((message, line, explanation, rating))
+        now = time.time()
+        rows = []
+        for (rule, language, depth), ratings in groups.items():
+            good = [r for r in ratings if r[3] >= min_rating]
+            average = sum(r[3] for r in ratings) / len(ratings)
+            if len(good) < min_support or average < min_rating:
+                continue
+            # Highest rated, newest first among ties
+            message, line, explanation, rating = max(good, key=lambda r: r[3])
+            params = _message_params(message, [r[0] for r in good])
+            rows.append((rule, language, depth, message, json.dumps(params), line, explanation, average, len(good), now))
+        with transaction(self.db_path) as conn:
+            conn.execute('DELETE FROM explanation_templates')
+            conn.executemany('''INSERT INTO explanation_templates
+                (rule, language, depth, message, params, line, explanation, rating, support, built)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', rows)
+        self.templates = self._load()
+        return len(rows)
+
+    def lookup(self, finding: Dict, language: str, depth: str) -> Optional[Dict]:
+        """
+        A report entry for the finding from its rule's template, or None.
+        """
+        explanation = self._render(finding, language, depth)
+        result = 'miss' if explanation is None else 'hit'
+        with self.lock:
+            if explanation is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        get_metrics().inc('explanation_templates_total', result=result)
+        if explanation is None:
+            return None
+        return {'line': finding['line'], 'type': finding['type'], 'message': finding['message'],
+                'explanation': explanation, 'fix': ''}
+
+    def _render(self, finding: Dict, language: str, depth: str) -> Optional[str]:
+        template = self.templates.get((rule_id(finding), language, depth))
+        if template is None:
+            return None
+        words = finding['message'].split()
+        if len(words) != len(template['words']) or any(
+                a != b for i, (a, b) in enumerate(zip(words, template['words'])) if i not in template['params']):
+            return None
+        # Libraries built before code blocks were stripped still hold them
+        text = _prose(template['explanation'])
+        for i in template['params']:
+            text = _substitute(text, template['words'][i], words[i])
+            if text is None:
+                return None
+        if template['line'] is not None:
+            text = re.sub(rf'\b(line\s+){template["line"]}\b', lambda m: f"{m.group(1)}{finding['line']}", text)
+        return text
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {'templates': len(self.templates), 'hits': self.hits, 'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0}
+
+def _collect_template_metrics(metrics):
+    # Every library in the process, from the lookup counter
+    hits = metrics.value('explanation_templates_total', result='hit')
+    lookups = hits + metrics.value('explanation_templates_total', result='miss')
+    metrics.set_gauge('explanation_template_hit_ratio', hits / lookups if lookups else 0.0)
+
+get_metrics().add_collector(_collect_template_metrics)
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Build the explanation template library from rated feedback: explanations '
+                                                 'served for common rules without calling the LLM')
+    parser.add_argument('--feedback', default='feedback.db', help='feedback database to learn from')
+    parser.add_argument('--output', default='explanation_templates.db', help='template database to (re)build')
+    parser.add_argument('--min-rating', type=float, default=MIN_RATING)
+    parser.add_argument('--min-support', type=int, default=MIN_SUPPORT, help='good ratings a rule needs')
+    args = parser.parse_args(argv)
+    built = TemplateLibrary(args.output).build(FeedbackDB(args.feedback), args.min_rating, args.min_support)
+    print(f"Built {built} templates in {args.output}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
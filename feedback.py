@@ -1,31 +1,64 @@
-import sqlite3
-from typing import Optional
+from typing import Dict, List, Optional, Sequence, Tuple
+from storage import get_connection, ensure_schema, ensure_columns, insert_many, paginate
 
 class FeedbackDB:
     def __init__(self, db_path='feedback.db'):
-        self.conn = sqlite3.connect(db_path)
+        self.db_path = db_path
         self._create_table()
 
+    @property
+    def conn(self):
+        return get_connection(self.db_path)
+
     def _create_table(self):
-        self.conn.execute('''CREATE TABLE IF NOT EXISTS feedback (
+        ensure_schema(self.db_path, ['''CREATE TABLE IF NOT EXISTS feedback (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             filename TEXT,
             line INTEGER,
             explanation TEXT,
             fix TEXT,
             rating INTEGER,
-            comment TEXT
-        )''')
-        self.conn.commit()
+            comment TEXT,
+            rule TEXT,
+            language TEXT,
+            depth TEXT,
+            message TEXT
+        )''', 'CREATE INDEX IF NOT EXISTS idx_feedback_filename ON feedback (filename)'])
+        # Databases from before ratings were kept per rule
+        ensure_columns(self.db_path, 'feedback', {'rule': 'TEXT', 'language': 'TEXT', 'depth': 'TEXT', 'message': 'TEXT'})
+        ensure_schema(self.db_path, ['CREATE INDEX IF NOT EXISTS idx_feedback_rule ON feedback (rule)'])
+
+    def add_feedback(self, filename: str, line: int, explanation: str, fix: str, rating: int, comment: Optional[str] = None,
+                     rule: Optional[str] = None, language: Optional[str] = None, depth: Optional[str] = None,
+                     message: Optional[str] = None):
+        self.add_feedback_many([(filename, line, explanation, fix, rating, comment, rule, language, depth, message)])
 
-    def add_feedback(self, filename: str, line: int, explanation: str, fix: str, rating: int, comment: Optional[str] = None):
-        self.conn.execute('''INSERT INTO feedback (filename, line, explanation, fix, rating, comment)
-            VALUES (?, ?, ?, ?, ?, ?)''', (filename, line, explanation, fix, rating, comment))
-        self.conn.commit()
+    def add_feedback_many(self, rows: List[Sequence]):
+        """
+        rows: (filename, line, explanation, fix, rating, comment, rule, language, depth, message) tuples,
+        written in one transaction
+        """
+        insert_many(self.db_path, '''INSERT INTO feedback (filename, line, explanation, fix, rating, comment, rule, language, depth, message)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''', rows)
 
-    def get_feedback(self, filename: Optional[str] = None):
+    def get_feedback(self, filename: Optional[str] = None, limit: Optional[int] = None, offset: int = 0):
         if filename:
-            cur = self.conn.execute('SELECT * FROM feedback WHERE filename=?', (filename,))
+            sql, params = paginate('SELECT * FROM feedback WHERE filename=? ORDER BY id', [filename], limit, offset)
         else:
-            cur = self.conn.execute('SELECT * FROM feedback')
-        return cur.fetchall() 
\ No newline at end of file
+            sql, params = paginate('SELECT * FROM feedback ORDER BY id', [], limit, offset)
+        return self.conn.execute(sql, params).fetchall()
+
+    def rule_ratings(self) -> Dict[str, Tuple[float, int]]:
+        """
+        Average rating and number of ratings per rule.
+        """
+        rows = self.conn.execute('SELECT rule, AVG(rating), COUNT(*) FROM feedback WHERE rule IS NOT NULL GROUP BY rule')
+        return {rule: (average, count) for rule, average, count in rows}
+
+    def rated_explanations(self) -> List[Tuple]:
+        """
+        (rule, language, depth, message, line, explanation, rating) for every rating with its finding recorded, newest first.
+        """
+        return self.conn.execute('''SELECT rule, language, depth, message, line, explanation, rating FROM feedback
+            WHERE rule IS NOT NULL AND language IS NOT NULL AND depth IS NOT NULL AND message IS NOT NULL
+            ORDER BY id DESC''').fetchall()
\ No newline at end of file
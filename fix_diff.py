@@ -0,0 +1,233 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Fixes beyond this are shown as-is, without a diff
+MAX_FIX_LINES = 400
+MAX_FIX_CHARS = 20000
+# Above this many line pairs the changed middle of a diff is one replace block instead of being aligned
+LARGE_DIFF_CELLS = 250000
+DIFF_CONTEXT = 3
+# Lines around the finding searched for the code a fix replaces, beyond the fix's own length
+REGION_SEARCH_LINES = 20
+# How far a fix may be shorter or longer than the code it replaces and still line up with it
+REGION_SLACK = 2
+# A fix with no line found in the source still anchors on the finding's line if one of its lines is
+# this similar to it (a rewrite of that line); otherwise there's nothing to say where it goes
+REWRITE_SIMILARITY = 0.5
+# Lines made only of these words and punctuation (`pass`, `else:`, `}`) occur everywhere, so they don't anchor a fix
+TRIVIAL_WORDS = frozenset({'pass', 'return', 'break', 'continue', 'else', 'try', 'finally', 'except', 'do', 'default',
+                           'end', 'None', 'null', 'True', 'False', 'true', 'false'})
+WORD = re.compile(r'\w+')
+DIFF_CACHE_SIZE = 4096
+NO_NEWLINE = '\\ No newline at end of file'
+
+# (code digest, line, fix) -> (start, end, replacement lines, diff hunks), or None when there's no diff.
+# The hunks have no file headers, so report diffs and patches (named differently) share entries.
+_cache: 'OrderedDict[Tuple[str, int, str], Optional[Tuple]]' = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _indent(line: str) -> str:
+    return line[:len(line) - len(line.lstrip())]
+
+def _is_anchor(line: str) -> bool:
+    return any(word not in TRIVIAL_WORDS for word in WORD.findall(line))
+
+def locate_region(code_lines: List[str], fix_lines: List[str], line: int) -> Optional[Tuple[int, int]]:
+    """
+    The source lines [start, end) that a fix for a finding at line (1-based) replaces: the span of
+    nearby lines that reappear in the fix, always including the finding's own line.
+    None if no line of the fix is in the source next to the finding or rewrites the finding's line, e.g.
+    an import to add at the top, or if a shorter fix would drop source lines it doesn't account for:
+    either way the patch would apply but break the code.
+    """
+    target = line - 1
+    lo = max(0, target - len(fix_lines) - REGION_SEARCH_LINES)
+    hi = min(len(code_lines), line + len(fix_lines) + REGION_SEARCH_LINES)
+    positions = {}
+    for i in range(lo, hi):
+        positions.setdefault(code_lines[i].strip(), []).append(i)
+    start, end = target, target + 1
+    anchors = set()
+    for k, fix_line in enumerate(fix_lines):
+        if not _is_anchor(fix_line):
+            continue
+        # Only matches that put the fix over the finding count, the closest if there are several
+        offsets = [i for i in positions.get(fix_line.strip(), [])
+                   if i - k - REGION_SLACK <= target < i - k + len(fix_lines) + REGION_SLACK]
+        if offsets:
+            i = min(offsets, key=lambda i: abs(i - target))
+            start, end = min(start, i), max(end, i + 1)
+            anchors.add(i)
+    # The fix must sit over the finding: an anchor at or next to its line, or anchors on both sides of it
+    anchored = any(abs(i - target) <= 1 for i in anchors) or (anchors and min(anchors) < target < max(anchors))
+    if not anchored:
+        finding_line = code_lines[target].strip() if 0 <= target < len(code_lines) else ''
+        anchored = bool(finding_line) and any(
+            SequenceMatcher(None, finding_line, fix_line.strip()).ratio() >= REWRITE_SIMILARITY
+            for fix_line in fix_lines if fix_line.strip())
+        if not anchored:
+            return None
+    end = min(len(code_lines), end)
+    start = min(max(0, start), end)
+    if len(fix_lines) < end - start:
+        # Besides the finding's own line, every source line the fix drops must reappear in it
+        kept = {l.strip() for l in fix_lines}
+        if any(i != target and i not in anchors and code_lines[i].strip() and code_lines[i].strip() not in kept
+               for i in range(start, end)):
+            return None
+    return start, end
+
+def _reindent(region: List[str], fix_lines: List[str]) -> List[str]:
+    """
+    Shift a fix written at column 0 (e.g. a method shown on its own) to the region's indentation.
+    """
+    source = next((_indent(l) for l in region if l.strip()), '')
+    fix = next((_indent(l) for l in fix_lines if l.strip()), '')
+    if len(fix) >= len(source) or not source.startswith(fix):
+        return fix_lines
+    pad = source[len(fix):]
+    return [pad + l if l.strip() else l for l in fix_lines]
+
+def _opcodes(a: List[str], b: List[str]) -> List[Tuple[str, int, int, int, int]]:
+    """
+    SequenceMatcher opcodes over line hashes, after trimming the common prefix and suffix.
+    """
+    ha, hb = [hash(l) for l in a], [hash(l) for l in b]
+    prefix = 0
+    while prefix < min(len(a), len(b)) and ha[prefix] == hb[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < min(len(a), len(b)) - prefix and ha[len(a) - 1 - suffix] == hb[len(b) - 1 - suffix]:
+        suffix += 1
+    a_end, b_end = len(a) - suffix, len(b) - suffix
+    codes = [('equal', 0, prefix, 0, prefix)] if prefix else []
+    if prefix < a_end or prefix < b_end:
+        if (a_end - prefix) * (b_end - prefix) <= LARGE_DIFF_CELLS:
+            matcher = SequenceMatcher(None, ha[prefix:a_end], hb[prefix:b_end], autojunk=False)
+            codes.extend((tag, i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix) for tag, i1, i2, j1, j2 in matcher.get_opcodes())
+        else:
+            tag = 'replace' if prefix < a_end and prefix < b_end else ('delete' if prefix < a_end else 'insert')
+            codes.append((tag, prefix, a_end, prefix, b_end))
+    if suffix:
+        codes.append(('equal', a_end, len(a), b_end, len(b)))
+    return codes
+
+def _grouped(codes: List[Tuple], n: int = DIFF_CONTEXT) -> Iterator[List[Tuple]]:
+    # Same hunk grouping as difflib's get_grouped_opcodes
+    if not codes:
+        return
+    codes = list(codes)
+    if codes[0][0] == 'equal':
+        tag, i1, i2, j1, j2 = codes[0]
+        codes[0] = tag, max(i1, i2 - n), i2, max(j1, j2 - n), j2
+    if codes[-1][0] == 'equal':
+        tag, i1, i2, j1, j2 = codes[-1]
+        codes[-1] = tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == 'equal' and i2 - i1 > 2 * n:
+            group.append((tag, i1, min(i2, i1 + n), j1, min(j2, j1 + n)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - n), max(j1, j2 - n)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == 'equal'):
+        yield group
+
+def _range(start: int, stop: int) -> str:
+    length = stop - start
+    if length == 1:
+        return str(start + 1)
+    return f'{start + 1 if length else start},{length}'
+
+def unified_diff(path: str, old: List[str], new: List[str], newline_at_eof: bool = True) -> str:
+    """
+    A unified diff of two versions of a file, applicable with `patch -p1` or `git apply`.
+    """
+    return _with_headers(path, _hunks(old, new, newline_at_eof))
+
+def _with_headers(path: str, hunks: str) -> str:
+    return f'--- a/{path}\n+++ b/{path}\n{hunks}' if hunks else ''
+
+def _hunks(old: List[str], new: List[str], newline_at_eof: bool = True) -> str:
+    out = []
+
+    def emit(prefix: str, lines: List[str], i1: int, i2: int, total: int):
+        for i in range(i1, i2):
+            out.append(prefix + lines[i])
+            if i == total - 1 and not newline_at_eof:
+                out.append(NO_NEWLINE)
+
+    for group in _grouped(_opcodes(old, new)):
+        out.append(f'@@ -{_range(group[0][1], group[-1][2])} +{_range(group[0][3], group[-1][4])} @@')
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                if i2 == len(old) and j2 == len(new):
+                    emit(' ', old, i1, i2, len(old))
+                else:
+                    out.extend(' ' + l for l in old[i1:i2])
+            else:
+                emit('-', old, i1, i2, len(old))
+                emit('+', new, j1, j2, len(new))
+    return '\n'.join(out)
+
+def _edit(code: str, digest: str, line: int, fix: str) -> Optional[Tuple]:
+    """
+    (start, end, replacement lines, diff hunks) for one fix, memoized; None if it's too large, has no
+    place in the source or changes nothing.
+    """
+    key = (digest, line, fix)
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+    result = None
+    fix_lines = fix.splitlines()
+    if len(fix_lines) <= MAX_FIX_LINES and len(fix) <= MAX_FIX_CHARS:
+        code_lines = code.splitlines()
+        region = locate_region(code_lines, fix_lines, line)
+        if region is not None:
+            start, end = region
+            replacement = _reindent(code_lines[start:end], fix_lines)
+            if replacement != code_lines[start:end]:
+                new_lines = code_lines[:start] + replacement + code_lines[end:]
+                result = (start, end, replacement, _hunks(code_lines, new_lines, code.endswith('\n')))
+    with _cache_lock:
+        _cache[key] = result
+        if len(_cache) > DIFF_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return result
+
+def add_diffs(path: str, code: str, explanations: List[Dict]) -> List[Dict]:
+    """
+    Explanations with a 'diff' of each suggested fix against the file's own code, for the report renderers.
+    """
+    digest = hashlib.sha256(code.encode('utf-8', errors='ignore')).hexdigest()
+    annotated = []
+    for ex in explanations:
+        edit = _edit(code, digest, ex['line'], ex['fix']) if ex.get('fix') else None
+        annotated.append({**ex, 'diff': _with_headers(path, edit[3]) if edit is not None else ''})
+    return annotated
+
+def combine_patch(path: str, code: str, explanations: List[Dict]) -> str:
+    """
+    One patch applying every suggested fix in a file. Where fixes overlap, the first one listed wins.
+    """
+    digest = hashlib.sha256(code.encode('utf-8', errors='ignore')).hexdigest()
+    chosen = []
+    for ex in explanations:
+        edit = _edit(code, digest, ex['line'], ex['fix']) if ex.get('fix') else None
+        if edit is not None and not any(edit[0] < end and start < edit[1] for start, end, _, _ in chosen):
+            chosen.append(edit)
+    if not chosen:
+        return ''
+    code_lines = code.splitlines()
+    new_lines = list(code_lines)
+    # Bottom up, so the offsets of the edits above stay valid
+    for start, end, replacement, _ in sorted(chosen, key=lambda e: -e[0]):
+        new_lines[start:end] = replacement
+    return unified_diff(path, code_lines, new_lines, code.endswith('\n'))
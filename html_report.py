@@ -1,19 +1,82 @@
-from typing import List, Dict
-import difflib
+from typing import List, Dict, Iterable, Iterator, TextIO, Tuple
+import html
+import io
+from report import _drain
+
+# Files per page of the HTML report; only one page is shown at a time
+HTML_PAGE_SIZE = 50
+
+HTML_STYLE = """body{font-family:sans-serif;margin:2em;display:flex;flex-direction:column}
+#index{order:-1}.file summary{cursor:pointer;font-weight:bold;padding:.3em 0}
+pre{white-space:pre-wrap;background:#f8f8f8;padding:.5em}"""
+# Shows the page named in the URL fragment (or holding the linked file); without JS every page is shown
+HTML_SCRIPT = """function show(){var t=document.getElementById(location.hash.slice(1)||'page-1');if(!t)return;
+var p=t.classList.contains('page')?t:t.closest('.page');
+document.querySelectorAll('.page').forEach(function(s){s.hidden=s!==p});if(t.tagName==='DETAILS')t.open=true;}
+window.addEventListener('hashchange',show);show();"""
 
 def generate_html_report(filename: str, explanations: List[Dict]) -> str:
-    html = [f'<h1>🐞 DebuggerAI Report for <code>{filename}</code></h1>']
+    filename = html.escape(filename)
+    parts = [f'<h1>🐞 DebuggerAI Report for <code>{filename}</code></h1>']
     for ex in explanations:
-        html.append(f'<h2>Issue at line {ex["line"]} ({ex["type"]})</h2>')
-        html.append(f'<b>Error message:</b> {ex["message"]}<br>')
-        html.append(f'<b>Explanation:</b><pre>{ex["explanation"]}</pre>')
+        parts.append(f'<h2>Issue at line {ex["line"]} ({html.escape(str(ex["type"]))})</h2>')
+        parts.append(f'<b>Error message:</b> {html.escape(ex["message"])}<br>')
+        parts.append(f'<b>Explanation:</b><pre>{html.escape(ex["explanation"])}</pre>')
         if ex.get('fix'):
-            html.append(f'<b>Suggested fix:</b><pre>{ex["fix"]}</pre>')
-            orig_lines = ex['explanation'].splitlines()
-            fix_lines = ex['fix'].splitlines()
-            diff = difflib.unified_diff(orig_lines, fix_lines, fromfile='original', tofile='fix', lineterm='')
-            diff_text = '\n'.join(diff)
-            if diff_text:
-                html.append(f'<details><summary>Show Diff</summary><pre style="background:#f8f8f8">{diff_text}</pre></details>')
-        html.append('<hr>')
-    return '\n'.join(html) 
\ No newline at end of file
+            parts.append(f'<b>Suggested fix:</b><pre>{html.escape(ex["fix"])}</pre>')
+            if ex.get('diff'):
+                parts.append(f'<details><summary>Show Diff</summary><pre style="background:#f8f8f8">{html.escape(ex["diff"])}</pre></details>')
+        parts.append('<hr>')
+    return '\n'.join(parts)
+
+class HTMLReportWriter:
+    """
+    Writes one HTML report incrementally. Each file becomes a collapsed section as soon as it's added,
+    sections are grouped into pages of page_size files, and the index written on close is shown first via CSS.
+    Only the index entries are kept in memory.
+    """
+    def __init__(self, out: TextIO, page_size: int = HTML_PAGE_SIZE, title: str = 'DebuggerAI Report'):
+        self.out = out
+        self.page_size = page_size
+        self.title = html.escape(title)
+        self.index: List[Tuple[str, int]] = []
+        out.write(f'<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>{self.title}</title>'
+                  f'<style>{HTML_STYLE}</style></head><body>\n')
+
+    def add(self, filename: str, explanations: List[Dict]):
+        n = len(self.index)
+        if n % self.page_size == 0:
+            if n:
+                self.out.write('</section>\n')
+            self.out.write(f'<section class="page" id="page-{n // self.page_size + 1}">\n')
+        self.index.append((filename, len(explanations)))
+        self.out.write(f'<details class="file" id="file-{n + 1}"><summary>{html.escape(filename)} ({len(explanations)} issues)'
+                       f'</summary>\n{generate_html_report(filename, explanations)}\n</details>\n')
+
+    def close(self):
+        if self.index:
+            self.out.write('</section>\n')
+        total = sum(count for _, count in self.index)
+        self.out.write(f'<nav id="index"><h1>🐞 {self.title}</h1><p>{len(self.index)} files, {total} issues</p>\n')
+        for start in range(0, len(self.index), self.page_size):
+            page = start // self.page_size + 1
+            entries = self.index[start:start + self.page_size]
+            self.out.write(f'<details><summary><a href="#page-{page}">Page {page}</a> '
+                           f'(files {start + 1}–{start + len(entries)})</summary><ol start="{start + 1}">\n')
+            for i, (filename, count) in enumerate(entries, start + 1):
+                self.out.write(f'<li><a href="#file-{i}">{html.escape(filename)}</a> ({count})</li>\n')
+            self.out.write('</ol></details>\n')
+        self.out.write(f'</nav>\n<script>{HTML_SCRIPT}</script>\n</body></html>\n')
+        self.out.flush()
+
+def iter_html_report(files: Iterable[Tuple[str, List[Dict]]], page_size: int = HTML_PAGE_SIZE) -> Iterator[str]:
+    """
+    The same document as HTMLReportWriter, as chunks of text.
+    """
+    buffer = io.StringIO()
+    writer = HTMLReportWriter(buffer, page_size)
+    for filename, explanations in files:
+        writer.add(filename, explanations)
+        yield _drain(buffer)
+    writer.close()
+    yield _drain(buffer)
\ No newline at end of file
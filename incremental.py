@@ -0,0 +1,129 @@
+import os
+import hashlib
+import json
+import subprocess
+from typing import Iterator, List, Dict, Optional, Set, Tuple
+from input_pipeline import iter_files
+from storage import get_connection, ensure_schema, transaction
+
+def content_hash(code: str) -> str:
+    return hashlib.sha256(code.encode('utf-8', errors='ignore')).hexdigest()
+
+def git_changed_files(folder: str, ref: str) -> Optional[Set[str]]:
+    """
+    Absolute paths of files under folder that differ from ref, plus untracked files.
+    Returns None when folder isn't in a git work tree or ref can't be resolved.
+    """
+    def git(*args) -> Optional[List[str]]:
+        result = subprocess.run(['git', '-C', folder, *args], capture_output=True, text=True)
+        return result.stdout.splitlines() if result.returncode == 0 else None
+    top = git('rev-parse', '--show-toplevel')
+    changed = git('diff', '--name-only', ref, '--', '.')
+    untracked = git('ls-files', '--others', '--exclude-standard', '--full-name', '--', '.')
+    if not top or changed is None or untracked is None:
+        return None
+    return {os.path.normpath(os.path.join(top[0], p)) for p in changed + untracked}
+
+class AnalysisManifest:
+    """
+    Per-folder record of the last run: path -> (mtime, size, content hash, explanations).
+    Entries are scoped by a settings string so changing language or depth never reuses stale results.
+    """
+    def __init__(self, db_path='manifest.db'):
+        self.db_path = db_path
+        self._create_table()
+
+    @property
+    def conn(self):
+        return get_connection(self.db_path)
+
+    def _create_table(self):
+        ensure_schema(self.db_path, ['''CREATE TABLE IF NOT EXISTS manifest (
+            folder TEXT,
+            settings TEXT,
+            path TEXT,
+            mtime REAL,
+            size INTEGER,
+            hash TEXT,
+            explanations TEXT,
+            PRIMARY KEY (folder, settings, path)
+        )'''])
+
+    def load(self, folder: str, settings: str) -> Dict[str, Tuple]:
+        cur = self.conn.execute('SELECT path, mtime, size, hash, explanations FROM manifest WHERE folder=? AND settings=?',
+            (folder, settings))
+        return {row[0]: row[1:] for row in cur.fetchall()}
+
+    def save(self, folder: str, settings: str, entries: Dict[str, Tuple]):
+        with transaction(self.db_path) as conn:
+            conn.execute('DELETE FROM manifest WHERE folder=? AND settings=?', (folder, settings))
+            conn.executemany('''INSERT INTO manifest (folder, settings, path, mtime, size, hash, explanations)
+                VALUES (?, ?, ?, ?, ?, ?, ?)''', [(folder, settings, path, *entry) for path, entry in entries.items()])
+
+class IncrementalRun:
+    """
+    Decides which files of a folder need analysis and carries stored results for the rest.
+    Pass should_skip to iter_files, route yielded files through reuse()/record(), then call commit().
+    """
+    def __init__(self, manifest: AnalysisManifest, folder: str, settings: str, git_ref: Optional[str] = None):
+        self.manifest = manifest
+        self.folder = os.path.abspath(folder)
+        self.settings = settings
+        self.previous = manifest.load(self.folder, settings)
+        self.entries: Dict[str, Tuple] = {}
+        self.unchanged: List[str] = []
+        # (mtime, size) of each file to be read, as seen by should_skip before reading it
+        self.read_stats: Dict[str, Tuple] = {}
+        self.git_changed = git_changed_files(self.folder, git_ref) if git_ref else None
+
+    def should_skip(self, path: str, stat: os.stat_result) -> bool:
+        path = os.path.abspath(path)
+        prev = self.previous.get(path)
+        if self.git_changed is not None and path not in self.git_changed:
+            # Outside the diff: keep whatever we had, analyse nothing
+            if prev:
+                self._keep(path, prev)
+            return True
+        if prev and prev[0] == stat.st_mtime and prev[1] == stat.st_size:
+            self._keep(path, prev)
+            return True
+        self.read_stats[path] = (stat.st_mtime, stat.st_size)
+        return False
+
+    def _keep(self, path: str, prev: Tuple):
+        self.entries[path] = prev
+        self.unchanged.append(path)
+
+    def reuse(self, file: Dict) -> Optional[List[Dict]]:
+        """
+        Stored explanations for a file whose mtime changed but whose content didn't.
+        """
+        path = os.path.abspath(file['relpath'])
+        prev = self.previous.get(path)
+        if prev and prev[2] == content_hash(file['code']):
+            self.entries[path] = self._read_stat(path) + (prev[2], prev[3])
+            return json.loads(prev[3])
+        return None
+
+    def record(self, file: Dict, explanations: Optional[List[Dict]]):
+        path = os.path.abspath(file['relpath'])
+        self.entries[path] = self._read_stat(path) + (content_hash(file['code']), json.dumps(explanations or []))
+
+    def _read_stat(self, path: str) -> Tuple:
+        # Stat'ing now could pair an edit saved during analysis with the old content and results, so the
+        # next run would skip it. Without a stat from before the read, the next run checks the hash instead.
+        return self.read_stats.pop(path, (None, None))
+
+    def stored_results(self) -> List[Tuple[str, List[Dict]]]:
+        return [(path, json.loads(self.entries[path][3])) for path in self.unchanged]
+
+    def unchanged_files(self, language: str) -> Iterator[Dict]:
+        """
+        The skipped files, read from disk, for whole-codebase views such as style metrics.
+        """
+        for path in self.unchanged:
+            yield from iter_files(path, language)
+
+    def commit(self):
+        # Files missing from this run (deleted or now ignored) drop out of the manifest
+        self.manifest.save(self.folder, self.settings, self.entries)
@@ -1,5 +1,8 @@
 import os
-from typing import List, Dict, Optional
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Dict, Optional, Iterator
 
 SUPPORTED_EXTENSIONS = {
     'Python': ['.py'],
@@ -7,23 +10,220 @@ SUPPORTED_EXTENSIONS = {
     'JavaScript': ['.js', '.jsx'],
     'Java': ['.java']
 }
+# Pseudo-language for mixed repos: one walk over every supported language, classified per file
+AUTO_DETECT = 'Auto-detect'
+# Interpreters named on a shebang line, for extensionless scripts
+SHEBANG_LANGUAGES = {'python': 'Python', 'node': 'JavaScript', 'nodejs': 'JavaScript', 'java': 'Java'}
+# .h is shared by C, C++ and Objective-C; only the last can't be linted as C++
+OBJC_MARKERS = re.compile(r'^\s*(?:@interface|@implementation|@protocol|#import)\b', re.M)
 
-def scan_files(path: str, language: str) -> List[Dict]:
+# Vendored and generated directories that are never worth analyzing
+DEFAULT_EXCLUDES = ['.git/', 'node_modules/', 'build/', 'dist/', '__pycache__/', '.venv/', 'venv/', '.tox/', '.mypy_cache/']
+MAX_FILE_SIZE = 1024 * 1024
+# Bytes sniffed for NUL characters to tell binary files apart from source
+BINARY_SNIFF_BYTES = 8192
+
+class IgnoreRules:
     """
-    Recursively scan a file or directory for code files of the given language.
-    Returns a list of dicts: {filename, code, relpath}
+    Minimal .gitignore semantics: globs, '**', leading '/' anchors, trailing '/' for directories
+    and '!' negation. Rules are matched against paths relative to the directory that declared them.
+    """
+    def __init__(self, rules=None):
+        self.rules = rules or []
+
+    def extend(self, patterns: List[str], base: str = '') -> 'IgnoreRules':
+        rules = list(self.rules)
+        for pattern in patterns:
+            pattern = pattern.rstrip('\n').rstrip()
+            if not pattern or pattern.startswith('#'):
+                continue
+            negate = pattern.startswith('!')
+            if negate:
+                pattern = pattern[1:]
+            dir_only = pattern.endswith('/')
+            pattern = pattern.rstrip('/')
+            if pattern:
+                rules.append((base, self._compile(pattern), negate, dir_only))
+        return IgnoreRules(rules)
+
+    @staticmethod
+    def _compile(pattern: str):
+        anchored = '/' in pattern
+        pattern = pattern.lstrip('/')
+        out, i = '', 0
+        while i < len(pattern):
+            if pattern.startswith('**/', i):
+                out += '(?:.*/)?'
+                i += 3
+                continue
+            if pattern.startswith('**', i):
+                out += '.*'
+                i += 2
+                continue
+            c = pattern[i]
+            if c == '*':
+                out += '[^/]*'
+            elif c == '?':
+                out += '[^/]'
+            elif c == '[' and pattern.find(']', i + 1) != -1:
+                j = pattern.find(']', i + 1)
+                body = pattern[i + 1:j]
+                out += '[' + ('^' + body[1:] if body.startswith('!') else body) + ']'
+                i = j
+            else:
+                out += re.escape(c)
+            i += 1
+        return re.compile('^' + ('' if anchored else '(?:.*/)?') + out + '$')
+
+    def ignored(self, relpath: str, is_dir: bool) -> bool:
+        result = False
+        for base, regex, negate, dir_only in self.rules:
+            if dir_only and not is_dir:
+                continue
+            if base:
+                if not relpath.startswith(base + '/'):
+                    continue
+                path = relpath[len(base) + 1:]
+            else:
+                path = relpath
+            if regex.match(path):
+                result = not negate
+        return result
+
+def detect_language(path: str, code: Optional[str] = None) -> Optional[str]:
     """
-    exts = SUPPORTED_EXTENSIONS.get(language, [])
-    found = []
+    Language of a file from its extension, or from its contents where the extension is missing or
+    ambiguous. None if it isn't in a supported language (or can't be told without the contents).
+    """
+    ext = os.path.splitext(path)[1]
+    if ext == '.h':
+        return None if code is not None and OBJC_MARKERS.search(code) else 'C++'
+    if ext:
+        return next((language for language, exts in SUPPORTED_EXTENSIONS.items() if ext in exts), None)
+    if code is None or not code.startswith('#!'):
+        return None
+    words = code[2:].split('\n', 1)[0].split()
+    if words and os.path.basename(words[0]) == 'env':
+        # '#!/usr/bin/env -S node --flags' names the interpreter after env's own options
+        words = [w for w in words[1:] if not w.startswith('-') and '=' not in w]
+    if not words:
+        return None
+    # python3, python3.11, nodejs...
+    interpreter = re.match(r'[a-z]*', os.path.basename(words[0])).group(0)
+    return SHEBANG_LANGUAGES.get(interpreter)
+
+def _extensions(language: str) -> List[str]:
+    if language == AUTO_DETECT:
+        # '' stands for extensionless files, kept if their shebang names a supported interpreter
+        return sum(SUPPORTED_EXTENSIONS.values(), []) + ['']
+    return SUPPORTED_EXTENSIONS.get(language, [])
+
+def _matches(name: str, exts: List[str]) -> bool:
+    return any(name.endswith(ext) for ext in exts if ext) or ('' in exts and not os.path.splitext(name)[1])
+
+def _read_source(path: str) -> Optional[str]:
+    with open(path, 'rb') as f:
+        data = f.read()
+    if b'\0' in data[:BINARY_SNIFF_BYTES]:
+        return None
+    return data.decode('utf-8', errors='ignore')
+
+def _walk(root: str, exts: List[str], rules: IgnoreRules, max_file_size: int, use_gitignore: bool,
+          skip: Optional[Callable[[str, os.stat_result], bool]]) -> Iterator[str]:
+    stack = [('', rules)]
+    while stack:
+        rel_dir, dir_rules = stack.pop()
+        dir_path = os.path.join(root, rel_dir) if rel_dir else root
+        if use_gitignore:
+            gitignore = os.path.join(dir_path, '.gitignore')
+            if os.path.isfile(gitignore):
+                with open(gitignore, 'r', encoding='utf-8', errors='ignore') as f:
+                    dir_rules = dir_rules.extend(f.readlines(), rel_dir)
+        try:
+            entries = sorted(os.scandir(dir_path), key=lambda e: e.name)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            relpath = f'{rel_dir}/{entry.name}' if rel_dir else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if not dir_rules.ignored(relpath, True):
+                        subdirs.append((relpath, dir_rules))
+                elif entry.is_file() and _matches(entry.name, exts):
+                    stat = entry.stat()
+                    if dir_rules.ignored(relpath, False) or stat.st_size > max_file_size:
+                        continue
+                    if skip is None or not skip(entry.path, stat):
+                        yield entry.path
+            except OSError:
+                continue
+        # Reversed so directories are visited in name order
+        stack.extend(reversed(subdirs))
+
+def iter_files(path: str, language: str, excludes: Optional[List[str]] = None, max_file_size: int = MAX_FILE_SIZE,
+               use_gitignore: bool = True, workers: int = 8,
+               skip: Optional[Callable[[str, os.stat_result], bool]] = None) -> Iterator[Dict]:
+    """
+    Lazily scan a file or directory for code files of the given language, or of every supported
+    language with AUTO_DETECT. Directories are walked with os.scandir, skipping excluded/.gitignored paths,
+    oversized and binary files; contents are read on a thread pool and yielded as
+    {filename, code, relpath, language, on_disk} while the walk continues.
+    skip(path, stat) can veto files before they are read (e.g. unchanged since the last run).
+    """
+    exts = _extensions(language)
+    if os.path.isfile(path):
+        if _matches(os.path.basename(path), exts) and os.path.getsize(path) <= max_file_size:
+            entry = _entry(path, _read_source(path), language)
+            if entry is not None:
+                yield entry
+        return
+    rules = IgnoreRules().extend(DEFAULT_EXCLUDES if excludes is None else excludes)
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for full_path in _walk(path, exts, rules, max_file_size, use_gitignore, skip):
+            pending.append((full_path, pool.submit(_read_source, full_path)))
+            # Bound read-ahead so memory stays flat on huge trees
+            while len(pending) > workers * 4 or (pending and pending[0][1].done()):
+                yield from _collect(pending.popleft(), language)
+        while pending:
+            yield from _collect(pending.popleft(), language)
+
+def list_files(path: str, language: str, excludes: Optional[List[str]] = None, max_file_size: int = MAX_FILE_SIZE,
+               use_gitignore: bool = True) -> List[str]:
+    """
+    Paths iter_files would consider, found by the same walk but without reading any file. With AUTO_DETECT
+    this includes extensionless files that turn out not to be scripts once read.
+    """
+    exts = _extensions(language)
     if os.path.isfile(path):
-        if any(path.endswith(ext) for ext in exts):
-            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-                found.append({'filename': os.path.basename(path), 'relpath': path, 'code': f.read()})
-    else:
-        for root, _, files in os.walk(path):
-            for file in files:
-                if any(file.endswith(ext) for ext in exts):
-                    full_path = os.path.join(root, file)
-                    with open(full_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        found.append({'filename': file, 'relpath': full_path, 'code': f.read()})
-    return found 
\ No newline at end of file
+        return [path] if _matches(os.path.basename(path), exts) and os.path.getsize(path) <= max_file_size else []
+    rules = IgnoreRules().extend(DEFAULT_EXCLUDES if excludes is None else excludes)
+    return list(_walk(path, exts, rules, max_file_size, use_gitignore, None))
+
+def _entry(full_path: str, code: Optional[str], language: str) -> Optional[Dict]:
+    if code is None:
+        return None
+    if language == AUTO_DETECT:
+        language = detect_language(full_path, code)
+        if language is None:
+            return None
+    # on_disk: relpath is a real path, unlike the names of uploaded or pasted code
+    return {'filename': os.path.basename(full_path), 'relpath': full_path, 'code': code, 'language': language, 'on_disk': True}
+
+def _collect(item, language: str) -> Iterator[Dict]:
+    full_path, future = item
+    try:
+        code = future.result()
+    except OSError:
+        return
+    entry = _entry(full_path, code, language)
+    if entry is not None:
+        yield entry
+
+def scan_files(path: str, language: str, **kwargs) -> List[Dict]:
+    """
+    Recursively scan a file or directory for code files of the given language.
+    Returns a list of dicts: {filename, code, relpath, language, on_disk}
+    """
+    return list(iter_files(path, language, **kwargs))
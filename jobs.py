@@ -0,0 +1,393 @@
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Callable, Dict, List, Optional, Set, Tuple
+from storage import get_connection, ensure_schema, ensure_columns, transaction, paginate
+from input_pipeline import iter_files, list_files
+from pipeline import AnalysisPipeline
+from telemetry import RunTrace
+
+# Job lifecycle: queued -> running -> done | paused | failed. A job left 'running' or 'queued' by a
+# process that died becomes 'interrupted' once its heartbeat goes stale; all but 'done' can be resumed.
+RESUMABLE_STATES = ('paused', 'failed', 'interrupted')
+# File lifecycle within a job: pending -> running -> done | failed, or skipped if the scan never
+# yielded it (binary, unreadable or deleted). Budgeted jobs hold files with findings ('held') until the
+# scan ends; a held file keeps its findings, so resuming explains it without linting it again.
+# Resuming re-runs everything that isn't done, and done or held files whose mtime or size changed
+# since they were read.
+
+# Running and queued jobs are touched this often by the process that owns them; one not touched for
+# STALE_SECONDS belonged to a process that has died
+HEARTBEAT_SECONDS = 30
+STALE_SECONDS = 3 * HEARTBEAT_SECONDS
+
+class JobStore:
+    """
+    Persistent analysis jobs: a row per run and a row per file with its state. Each file's explanations
+    are checkpointed as soon as it finishes, so an interrupted run resumes without redoing completed work.
+    """
+    def __init__(self, db_path='jobs.db'):
+        self.db_path = db_path
+        self._create_tables()
+
+    @property
+    def conn(self):
+        return get_connection(self.db_path)
+
+    def _create_tables(self):
+        ensure_schema(self.db_path, ['''CREATE TABLE IF NOT EXISTS jobs (
+            run_id TEXT PRIMARY KEY,
+            user TEXT,
+            folder TEXT,
+            settings TEXT,
+            status TEXT,
+            error TEXT,
+            created REAL,
+            updated REAL
+        )''', '''CREATE TABLE IF NOT EXISTS job_files (
+            run_id TEXT,
+            path TEXT,
+            state TEXT,
+            findings INTEGER,
+            explanations TEXT,
+            error TEXT,
+            updated REAL,
+            PRIMARY KEY (run_id, path)
+        ) WITHOUT ROWID''',
+            'CREATE INDEX IF NOT EXISTS idx_jobs_user_created ON jobs (user, created)',
+            'CREATE INDEX IF NOT EXISTS idx_job_files_state ON job_files (run_id, state)'])
+        # The file as it was read, so resuming can tell whether a finished file has changed since
+        ensure_columns(self.db_path, 'job_files', {'mtime': 'REAL', 'size': 'INTEGER'})
+        # Static findings of a held file, waiting for the scheduler
+        ensure_columns(self.db_path, 'job_files', {'held_findings': 'TEXT'})
+
+    def create_job(self, user: Optional[str], folder: str, settings: Dict) -> str:
+        run_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with transaction(self.db_path) as conn:
+            conn.execute('INSERT INTO jobs (run_id, user, folder, settings, status, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (run_id, user, os.path.abspath(folder), json.dumps(settings), 'queued', now, now))
+        return run_id
+
+    def _job(self, row) -> Dict:
+        return {'run_id': row[0], 'user': row[1], 'folder': row[2], 'settings': json.loads(row[3]), 'status': row[4],
+                'error': row[5], 'created': row[6], 'updated': row[7], 'progress': self.progress(row[0])}
+
+    def get_job(self, run_id: str) -> Optional[Dict]:
+        row = self.conn.execute('SELECT * FROM jobs WHERE run_id=?', (run_id,)).fetchone()
+        return self._job(row) if row else None
+
+    def list_jobs(self, user: Optional[str] = None, limit: Optional[int] = None, offset: int = 0) -> List[Dict]:
+        if user:
+            sql, params = paginate('SELECT * FROM jobs WHERE user=? ORDER BY created DESC', [user], limit, offset)
+        else:
+            sql, params = paginate('SELECT * FROM jobs ORDER BY created DESC', [], limit, offset)
+        return [self._job(row) for row in self.conn.execute(sql, params).fetchall()]
+
+    def touch(self, run_ids: List[str]):
+        """
+        Heartbeat for running or queued jobs owned by this process.
+        """
+        now = time.time()
+        with transaction(self.db_path) as conn:
+            conn.executemany("UPDATE jobs SET updated=? WHERE run_id=? AND status IN ('running', 'queued')",
+                             [(now, run_id) for run_id in run_ids])
+
+    def set_status(self, run_id: str, status: str, error: Optional[str] = None):
+        with transaction(self.db_path) as conn:
+            conn.execute('UPDATE jobs SET status=?, error=?, updated=? WHERE run_id=?', (status, error, time.time(), run_id))
+
+    def sync_files(self, run_id: str, files: Dict[str, Tuple[float, int]]):
+        """
+        Register the job's files (path -> (mtime, size)) as pending, keeping the state of files seen before.
+        Done and held files that have changed since they were read are pending again; files that are gone
+        from the folder are dropped whatever their state, so their old results aren't reported on resume.
+        """
+        now = time.time()
+        with transaction(self.db_path) as conn:
+            conn.executemany('INSERT OR IGNORE INTO job_files (run_id, path, state, updated) VALUES (?, ?, ?, ?)',
+                [(run_id, path, 'pending', now) for path in files])
+            changed = [(now, run_id, path) for path, mtime, size in conn.execute(
+                "SELECT path, mtime, size FROM job_files WHERE run_id=? AND state IN ('done', 'held')", (run_id,))
+                if path in files and files[path] != (mtime, size)]
+            conn.executemany('''UPDATE job_files SET state='pending', findings=NULL, explanations=NULL, held_findings=NULL, updated=?
+                WHERE run_id=? AND path=?''', changed)
+            gone = [(run_id, path) for (path,) in conn.execute(
+                'SELECT path FROM job_files WHERE run_id=?', (run_id,)) if path not in files]
+            conn.executemany('DELETE FROM job_files WHERE run_id=? AND path=?', gone)
+
+    def mark_running(self, run_id: str, path: str):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            # Deleted since it was read, so there's nothing to compare on resume
+            self._set_file(run_id, path, 'running')
+            return
+        self._set_file(run_id, path, 'running', mtime=stat.st_mtime, size=stat.st_size)
+
+    def complete_file(self, run_id: str, path: str, explanations: List[Dict]):
+        self._set_file(run_id, path, 'done', findings=len(explanations), explanations=json.dumps(explanations))
+
+    def hold_file(self, run_id: str, path: str, findings: List[Dict]):
+        self._set_file(run_id, path, 'held', findings=len(findings), held_findings=json.dumps(findings))
+
+    def fail_file(self, run_id: str, path: str, error: str):
+        self._set_file(run_id, path, 'failed', error=error)
+
+    def _set_file(self, run_id: str, path: str, state: str, findings: Optional[int] = None,
+                  explanations: Optional[str] = None, error: Optional[str] = None,
+                  mtime: Optional[float] = None, size: Optional[int] = None, held_findings: Optional[str] = None):
+        # mtime and size are recorded when the file is read and kept through the later updates
+        with transaction(self.db_path) as conn:
+            conn.execute('''INSERT INTO job_files (run_id, path, state, findings, explanations, error, updated, mtime, size,
+                    held_findings)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (run_id, path) DO UPDATE SET state=excluded.state, findings=excluded.findings,
+                    explanations=excluded.explanations, error=excluded.error, updated=excluded.updated,
+                    mtime=COALESCE(excluded.mtime, mtime), size=COALESCE(excluded.size, size),
+                    held_findings=excluded.held_findings''',
+                (run_id, os.path.abspath(path), state, findings, explanations, error, time.time(), mtime, size,
+                 held_findings))
+
+    def skip_pending(self, run_id: str):
+        with transaction(self.db_path) as conn:
+            conn.execute("UPDATE job_files SET state='skipped', updated=? WHERE run_id=? AND state='pending'", (time.time(), run_id))
+
+    def finished_paths(self, run_id: str) -> Set[str]:
+        return {row[0] for row in self.conn.execute("SELECT path FROM job_files WHERE run_id=? AND state='done'", (run_id,))}
+
+    def held_findings(self, run_id: str) -> Dict[str, List[Dict]]:
+        """
+        Static findings per path for files a paused run held for the scheduler.
+        """
+        return {path: json.loads(findings) for path, findings in self.conn.execute(
+            "SELECT path, held_findings FROM job_files WHERE run_id=? AND state='held'", (run_id,))}
+
+    def progress(self, run_id: str) -> Dict[str, int]:
+        return dict(self.conn.execute('SELECT state, COUNT(*) FROM job_files WHERE run_id=? GROUP BY state', (run_id,)).fetchall())
+
+    def results(self, run_id: str, limit: Optional[int] = None, offset: int = 0) -> List[Tuple[str, List[Dict]]]:
+        """
+        (path, explanations) for finished files with findings, in path order.
+        """
+        sql, params = paginate("SELECT path, explanations FROM job_files WHERE run_id=? AND state='done' AND findings > 0 ORDER BY path",
+                               [run_id], limit, offset)
+        return [(path, json.loads(explanations)) for path, explanations in self.conn.execute(sql, params).fetchall()]
+
+    def recover(self) -> List[str]:
+        """
+        Mark jobs left running or queued by a dead process as interrupted: those whose heartbeat has
+        stopped. Jobs of other live processes sharing the database are left alone.
+        """
+        with transaction(self.db_path) as conn:
+            run_ids = [row[0] for row in conn.execute(
+                "SELECT run_id FROM jobs WHERE status IN ('running', 'queued') AND updated < ?", (time.time() - STALE_SECONDS,))]
+            conn.executemany("UPDATE jobs SET status='interrupted', updated=? WHERE run_id=?", [(time.time(), r) for r in run_ids])
+        return run_ids
+
+class _Heartbeat:
+    """
+    Calls beat every HEARTBEAT_SECONDS on a daemon thread until stopped.
+    """
+    def __init__(self, beat: Callable[[], None]):
+        self.beat = beat
+        self.stopped = threading.Event()
+
+    def _run(self):
+        while not self.stopped.wait(HEARTBEAT_SECONDS):
+            try:
+                self.beat()
+            except Exception:
+                logging.exception("Job heartbeat failed")
+
+    def start(self):
+        threading.Thread(target=self._run, name='debuggerai-heartbeat', daemon=True).start()
+
+    def stop(self):
+        self.stopped.set()
+
+def _file_stats(paths: List[str]) -> Dict[str, Tuple[float, int]]:
+    stats = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        stats[os.path.abspath(path)] = (stat.st_mtime, stat.st_size)
+    return stats
+
+def run_job(store: JobStore, run_id: str, api_key: Optional[str] = None, stop: Optional[threading.Event] = None,
+            on_result: Optional[Callable] = None, on_budget: Optional[Callable[[Dict], None]] = None,
+            on_resume: Optional[Callable[[str, List[Dict]], None]] = None, **explainer_options) -> str:
+    """
+    Run or resume a job in the calling thread, skipping files that are already done and unchanged since,
+    and return its final status. on_resume(path, explanations) gets the kept results with findings first.
+    Setting stop pauses it promptly; files that were in flight stay 'running' and are redone on resume,
+    mostly from the findings and explanation caches. Files held for a budgeted run's scheduler are
+    recorded with their findings and only explained on resume.
+    explainer_options (base_url, max_concurrency, ...) are passed to LLMExplainer.
+    With a 'budget' in the settings, on_budget gets the scheduler's usage report once the run ends.
+    """
+    job = store.get_job(run_id)
+    settings = job['settings']
+    language = settings['language']
+    store.set_status(run_id, 'running')
+    # Other processes sharing the database tell a live job from one whose process died by this
+    heartbeat = _Heartbeat(lambda: store.touch([run_id]))
+    heartbeat.start()
+    try:
+        # Registered up front so progress has a denominator; files finished by an earlier attempt stay
+        # done unless they have changed since
+        store.sync_files(run_id, _file_stats(list_files(job['folder'], language)))
+        finished = store.finished_paths(run_id)
+        held = store.held_findings(run_id)
+        if on_resume is not None:
+            for path, explanations in store.results(run_id):
+                on_resume(path, explanations)
+        trace = RunTrace(run_id=run_id)
+        explainer = None
+        scheduler = None
+        if not settings.get('static_only'):
+            if not api_key:
+                raise ValueError("An OpenAI API key is needed to run this job")
+            # Imported here so static-only jobs (and the CLI's --help) never load the OpenAI client
+            from explanation_cache import ExplanationCache
+            from explanation_templates import TemplateLibrary
+            from llm_explainer import LLMExplainer
+            explainer = LLMExplainer(api_key, depth=settings['depth'], model=settings['model'], cache=ExplanationCache(),
+                                     language=language, batch_size=settings['batch_size'], trace=trace,
+                                     templates=TemplateLibrary(), **explainer_options)
+            if settings.get('budget'):
+                from explain_scheduler import ExplanationScheduler, ExplanationBudget
+                from feedback import FeedbackDB
+                scheduler = ExplanationScheduler(explainer, ExplanationBudget.from_dict(settings['budget']), FeedbackDB())
+
+        def source():
+            for file in iter_files(job['folder'], language, skip=lambda path, stat: os.path.abspath(path) in finished):
+                path = os.path.abspath(file['relpath'])
+                if path in held:
+                    file['findings'] = held[path]
+                store.mark_running(run_id, file['relpath'])
+                yield file
+
+        def checkpoint(file, explanations, report_md):
+            store.complete_file(run_id, file['relpath'], explanations)
+            if on_result is not None:
+                on_result(file, explanations, report_md)
+
+        pipeline = AnalysisPipeline(language, explainer=explainer, trace=trace, stop=stop, scheduler=scheduler)
+        pipeline.run(source(), on_result=checkpoint, on_error=lambda file, e: store.fail_file(run_id, file['relpath'], repr(e)),
+                     on_held=lambda file, findings: store.hold_file(run_id, file['relpath'], findings))
+    except Exception as e:
+        store.set_status(run_id, 'failed', str(e))
+        raise
+    except BaseException:
+        store.set_status(run_id, 'interrupted')
+        raise
+    finally:
+        heartbeat.stop()
+    if scheduler is not None and on_budget is not None and not pipeline.stopped:
+        on_budget(scheduler.report())
+    if pipeline.stopped:
+        status = 'paused'
+    else:
+        store.skip_pending(run_id)
+        status = 'done'
+    store.set_status(run_id, status)
+    return status
+
+class JobQueue:
+    """
+    Runs queued jobs one at a time on a daemon thread that doesn't belong to any Streamlit session,
+    so a run keeps going when the browser disconnects or the script reruns.
+    """
+    def __init__(self, store: Optional[JobStore] = None, on_done: Optional[Callable[[Dict], None]] = None):
+        self.store = store or JobStore()
+        self.on_done = on_done
+        self.lock = threading.Lock()
+        self.queue = deque()
+        self.api_keys: Dict[str, Optional[str]] = {}
+        self.current: Optional[str] = None
+        self.stop = threading.Event()
+        self.wakeup = threading.Event()
+        self._recover()
+        self.thread = threading.Thread(target=self._work, name='debuggerai-jobs', daemon=True)
+        self.thread.start()
+        # Keeps this queue's waiting jobs alive for other processes, and picks up jobs whose process died since
+        self.heartbeat = _Heartbeat(self._beat)
+        self.heartbeat.start()
+
+    def _recover(self):
+        for run_id in self.store.recover():
+            logging.warning("Job %s was interrupted by a restart and can be resumed", run_id)
+
+    def _beat(self):
+        with self.lock:
+            queued = list(self.queue)
+        self.store.touch(queued)
+        self._recover()
+
+    def submit(self, run_id: str, api_key: Optional[str] = None):
+        """
+        Queue a new job, or resume a paused/failed/interrupted one from where it stopped.
+        """
+        with self.lock:
+            if run_id == self.current or run_id in self.queue:
+                return
+            # Kept in memory only; a job resumed after a restart needs the key again
+            self.api_keys[run_id] = api_key
+            self.queue.append(run_id)
+            self.store.set_status(run_id, 'queued')
+        self.wakeup.set()
+
+    def pause(self, run_id: str):
+        with self.lock:
+            if run_id in self.queue:
+                self.queue.remove(run_id)
+                self.api_keys.pop(run_id, None)
+                self.store.set_status(run_id, 'paused')
+            elif run_id == self.current:
+                self.stop.set()
+
+    def _next(self) -> Optional[str]:
+        with self.lock:
+            if not self.queue:
+                self.wakeup.clear()
+                return None
+            self.current = self.queue.popleft()
+            self.stop.clear()
+            return self.current
+
+    def _work(self):
+        while True:
+            run_id = self._next()
+            if run_id is None:
+                self.wakeup.wait()
+                continue
+            try:
+                status = run_job(self.store, run_id, self.api_keys.pop(run_id, None), self.stop)
+                logging.info("Job %s finished with status %s", run_id, status)
+                if status == 'done' and self.on_done is not None:
+                    self.on_done(self.store.get_job(run_id))
+            except Exception:
+                logging.exception("Job %s failed", run_id)
+            finally:
+                with self.lock:
+                    self.current = None
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_job_queue(on_done: Optional[Callable[[Dict], None]] = None) -> JobQueue:
+    """
+    The process-wide job queue, started on first use. on_done only applies when this call creates it.
+    """
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = JobQueue(on_done=on_done)
+        return _queue
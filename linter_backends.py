@@ -0,0 +1,473 @@
+import asyncio
+import atexit
+import json
+import logging
+import os
+import queue
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from async_utils import get_engine, ToolError
+from telemetry import get_metrics, MetricsRegistry
+
+# Placeholder for the linted file in one-shot command lines
+FILE = '{file}'
+# Files per clang-tidy process when batching through a compilation database
+CLANG_TIDY_BATCH_SIZE = 50
+CLANG_FLAGS = ['-x', 'c++', '-std=c++17']
+# Worker lifecycle: a JVM compiling its worker can take a while to answer the first ping
+STARTUP_TIMEOUT = 60
+PING_TIMEOUT = 5
+# An idle worker is pinged before reuse once it has been quiet this long
+HEALTH_CHECK_INTERVAL = 30
+# More restarts than this within RESTART_WINDOW seconds and the backend falls back to one process per file
+MAX_RESTARTS = 5
+RESTART_WINDOW = 60
+
+WORKER_DIR = os.path.dirname(os.path.abspath(__file__))
+STUB_SCRIPT = os.path.join(WORKER_DIR, 'linter_stub.py')
+
+@lru_cache(maxsize=None)
+def tool_version(tool: str) -> str:
+    try:
+        result = subprocess.run([tool, '--version'], capture_output=True, text=True, timeout=30)
+    except (OSError, subprocess.TimeoutExpired):
+        return 'unavailable'
+    return (result.stdout or result.stderr).strip()
+
+def parse_clang_tidy(output: str) -> Iterator[Tuple[str, Dict]]:
+    for line in output.splitlines():
+        # Match: filename:lineno:col: error|warning|note: message
+        m = re.match(r'^(.*?):(\d+):(\d*):\s*(error|warning|note):\s*(.*)$', line)
+        if m:
+            path, lineno, _, msg_type, msg = m.groups()
+            yield path, {'line': int(lineno), 'type': msg_type, 'message': msg}
+
+def parse_eslint(output: str) -> Iterator[Tuple[str, Dict]]:
+    for line in output.splitlines():
+        # Match: filename:lineno:col: message [type]
+        m = re.match(r'^(.*?):(\d+):(\d+):\s*(.*)\s\[(.*)\]$', line)
+        if m:
+            path, lineno, _, msg, msg_type = m.groups()
+            yield path, {'line': int(lineno), 'type': msg_type, 'message': msg}
+
+def parse_checkstyle(output: str) -> Iterator[Tuple[str, Dict]]:
+    for line in output.splitlines():
+        # Match: [ERROR] filename:lineno:col: message
+        m = re.match(r'^\[.*?\]\s*(.*?):(\d+):(\d*):\s*(.*)$', line)
+        if m:
+            path, lineno, _, msg = m.groups()
+            yield path, {'line': int(lineno), 'type': 'checkstyle', 'message': msg}
+
+def check_result(tool: str, result: subprocess.CompletedProcess, findings: int):
+    """
+    Raise ToolError if a linter run failed. Linters exit non-zero to report findings, so a non-zero
+    exit without any (or death by signal) means the tool itself failed, not that the code is clean.
+    """
+    if result.returncode < 0 or (result.returncode != 0 and not findings):
+        stderr = (result.stderr or '').strip()
+        raise ToolError(f'{tool} exited with status {result.returncode}' + (f': {stderr[-500:]}' if stderr else ''))
+
+def _source_name(filename: str, suffix: str) -> str:
+    # Keep the real name where possible; some checks (e.g. Java's outer type name) depend on it
+    name = os.path.basename(filename) or 'temp'
+    return name if name.endswith(suffix) else name + suffix
+
+class AnalyzerBackend:
+    """
+    How one language's linter is run. analyze_batch returns findings per relpath; backends that
+    can't lint several files in one go (batched = False) just lint them one at a time.
+    """
+    mode = ''
+    batched = False
+
+    def __init__(self, tool: str, command: List[str], suffix: str):
+        self.tool = tool
+        self.command = command
+        self.suffix = suffix
+
+    def signature(self) -> str:
+        """
+        Identify the tool, its version and how it's invoked. Daemons and stand-ins report findings
+        differently from the plain CLI, so each gets its own findings cache entries.
+        """
+        return f"{self.tool} {tool_version(self.tool)} {self.mode} {' '.join(os.path.basename(part) for part in self.command)}"
+
+    def analyze(self, code: str, filename: str) -> List[Dict]:
+        raise NotImplementedError
+
+    def analyze_batch(self, code_files: List[Dict]) -> Dict[str, List[Dict]]:
+        return {file['relpath']: self.analyze(file['code'], file['filename']) for file in code_files}
+
+    def health(self) -> Dict:
+        return {'tool': self.tool, 'mode': self.mode, 'available': shutil.which(self.command[0]) is not None}
+
+    def close(self):
+        pass
+
+class OneShotBackend(AnalyzerBackend):
+    """
+    One linter process per file. The fallback when a daemon can't be started or keeps crashing.
+    """
+    mode = 'process'
+
+    def __init__(self, tool: str, command: List[str], parse: Callable[[str], Iterator[Tuple[str, Dict]]], suffix: str):
+        super().__init__(tool, command, suffix)
+        self.parse = parse
+
+    def analyze(self, code: str, filename: str) -> List[Dict]:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, _source_name(filename, self.suffix))
+            with open(path, 'w', encoding='utf-8') as tmp:
+                tmp.write(code)
+            result = get_engine().run_subprocess([path if part == FILE else part for part in self.command], tool=self.tool)
+            findings = [finding for _, finding in self.parse(result.stdout)]
+            check_result(self.tool, result, len(findings))
+            return findings
+
+class ClangTidyBackend(AnalyzerBackend):
+    """
+    clang-tidy over batches of files with a generated compile_commands.json, so there's one process per
+    batch instead of per file and includes resolve against each file's original directory.
+    """
+    mode = 'batch'
+    batched = True
+
+    def __init__(self, command: List[str], batch_size: int = CLANG_TIDY_BATCH_SIZE):
+        super().__init__('clang-tidy', command, '.cpp')
+        self.batch_size = batch_size
+
+    def analyze(self, code: str, filename: str) -> List[Dict]:
+        return self.analyze_batch([{'filename': filename, 'relpath': filename, 'code': code}])[filename]
+
+    def analyze_batch(self, code_files: List[Dict]) -> Dict[str, List[Dict]]:
+        results = {}
+        for start in range(0, len(code_files), self.batch_size):
+            results.update(self._analyze_chunk(code_files[start:start + self.batch_size]))
+        return results
+
+    def _analyze_chunk(self, code_files: List[Dict]) -> Dict[str, List[Dict]]:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            by_path = {}
+            # clang-tidy may print symlink-resolved paths (e.g. /private/tmp on macOS)
+            lookup = {}
+            commands = []
+            for i, file in enumerate(code_files):
+                # A directory per file so equal basenames from different folders don't collide
+                file_dir = os.path.join(tmp_dir, str(i))
+                os.mkdir(file_dir)
+                path = os.path.join(file_dir, _source_name(file['filename'], self.suffix))
+                with open(path, 'w', encoding='utf-8') as tmp:
+                    tmp.write(file['code'])
+                by_path[path] = file['relpath']
+                lookup[path] = lookup[os.path.realpath(path)] = file['relpath']
+                # Only scanned files have a directory of their own; an upload's name would resolve against our CWD
+                source_dir = os.path.dirname(os.path.abspath(file['relpath'])) if file.get('on_disk') else None
+                includes = ['-I', source_dir] if source_dir and os.path.isdir(source_dir) else []
+                commands.append({'directory': file_dir, 'file': path,
+                                 'arguments': ['clang++', *CLANG_FLAGS, *includes, '-c', path]})
+            with open(os.path.join(tmp_dir, 'compile_commands.json'), 'w', encoding='utf-8') as f:
+                json.dump(commands, f)
+            result = get_engine().run_subprocess([*self.command, '-p', tmp_dir, '--quiet', *by_path], tool=self.tool)
+            results = {relpath: [] for relpath in by_path.values()}
+            parsed = list(parse_clang_tidy(result.stdout))
+            check_result(self.tool, result, len(parsed))
+            for path, finding in parsed:
+                relpath = lookup.get(path)
+                if relpath is not None:
+                    results[relpath].append(finding)
+            return results
+
+class _WorkerError(Exception):
+    pass
+
+class _Worker:
+    """
+    One warm linter process speaking the worker protocol: a JSON request per line on stdin, a JSON reply
+    per line on stdout ({"id", "op": "ping"} -> {"id", "ok"}; {"id", "op": "lint", "path"} -> {"id", "findings"}).
+    """
+    def __init__(self, command: List[str], work_dir: str):
+        self.work_dir = work_dir
+        self.proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                     text=True, encoding='utf-8', bufsize=1, cwd=work_dir)
+        self.lines = queue.Queue()
+        self.stderr = deque(maxlen=20)
+        self.next_id = 0
+        self.requests = 0
+        self.last_used = time.monotonic()
+        threading.Thread(target=self._read, args=(self.proc.stdout, self.lines.put), daemon=True).start()
+        threading.Thread(target=self._read, args=(self.proc.stderr, self.stderr.append), daemon=True).start()
+
+    @staticmethod
+    def _read(stream, sink):
+        for line in stream:
+            sink(line)
+        sink(None)
+
+    def alive(self) -> bool:
+        return self.proc.poll() is None
+
+    def request(self, message: Dict, timeout: float) -> Dict:
+        self.next_id += 1
+        message = {'id': self.next_id, **message}
+        try:
+            self.proc.stdin.write(json.dumps(message) + '\n')
+            self.proc.stdin.flush()
+        except (OSError, ValueError) as e:
+            raise _WorkerError(f'stdin closed ({e})')
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                line = self.lines.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                raise _WorkerError(f'no reply within {timeout}s')
+            if line is None:
+                tail = ''.join(chunk for chunk in self.stderr if chunk).strip()
+                raise _WorkerError(f'exited with status {self.proc.wait()}' + (f': {tail[-500:]}' if tail else ''))
+            try:
+                reply = json.loads(line)
+            except ValueError:
+                # Stray output (a JVM or Node warning) isn't part of the protocol
+                continue
+            if isinstance(reply, dict) and reply.get('id') == message['id']:
+                self.requests += 1
+                self.last_used = time.monotonic()
+                return reply
+
+    def stop(self, kill: bool = False):
+        if not kill:
+            try:
+                # Workers exit when stdin closes
+                self.proc.stdin.close()
+                self.proc.wait(timeout=2)
+            except (OSError, subprocess.TimeoutExpired):
+                kill = True
+        if kill and self.alive():
+            self.proc.kill()
+            self.proc.wait()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+class DaemonBackend(AnalyzerBackend):
+    """
+    Up to `workers` long-lived linter processes fed one file per request, so Node or JVM startup is
+    paid once per worker instead of once per file. A worker that crashes, hangs or fails its health
+    check is replaced. If the first worker never starts, or they keep dying, the backend falls back
+    to one process per file.
+    """
+    mode = 'daemon'
+
+    def __init__(self, tool: str, command: List[str], fallback: AnalyzerBackend, suffix: str, workers: Optional[int] = None):
+        super().__init__(tool, command, suffix)
+        self.fallback = fallback
+        self.size = workers or get_engine().tool_limits.get(tool, 1)
+        self.slots = threading.BoundedSemaphore(self.size)
+        self.lock = threading.Lock()
+        self.idle: List[_Worker] = []
+        self.live = 0
+        self.started = False
+        self.restarts = deque()
+        self.total_restarts = 0
+        self.disabled: Optional[str] = None
+        self.closed = False
+        self.tmp_dir = tempfile.mkdtemp(prefix=f'debuggerai-{tool}-')
+
+    def signature(self) -> str:
+        if self.disabled is not None:
+            return self.fallback.signature()
+        return super().signature()
+
+    def analyze(self, code: str, filename: str) -> List[Dict]:
+        # A file whose request kills the worker gets one retry on a fresh one, then the one-shot tool
+        for _ in range(2):
+            if self.disabled is not None:
+                break
+            if get_engine().is_cancelled():
+                raise asyncio.CancelledError()
+            with self.slots:
+                worker = None
+                try:
+                    worker = self._checkout()
+                    path = os.path.join(worker.work_dir, _source_name(filename, self.suffix))
+                    with open(path, 'w', encoding='utf-8') as tmp:
+                        tmp.write(code)
+                    started = time.monotonic()
+                    timeout = get_engine().tool_timeouts.get(self.tool, get_engine().default_timeout)
+                    reply = worker.request({'op': 'lint', 'path': path}, timeout)
+                    get_metrics().observe('linter_request_seconds', time.monotonic() - started, tool=self.tool)
+                    os.unlink(path)
+                except _WorkerError as e:
+                    if worker is not None:
+                        self._discard(worker, str(e))
+                    continue
+                self._checkin(worker)
+            if 'error' in reply:
+                raise ToolError(f"{self.tool} could not lint {filename}: {reply['error']}")
+            return reply.get('findings', [])
+        return self.fallback.analyze(code, filename)
+
+    def _checkout(self) -> _Worker:
+        with self.lock:
+            worker = self.idle.pop() if self.idle else None
+        if worker is not None and not worker.alive():
+            self._discard(worker, f'exited with status {worker.proc.returncode}')
+            worker = None
+        if worker is not None and time.monotonic() - worker.last_used > HEALTH_CHECK_INTERVAL:
+            try:
+                worker.request({'op': 'ping'}, PING_TIMEOUT)
+            except _WorkerError as e:
+                self._discard(worker, f'failed its health check ({e})')
+                worker = None
+        return worker or self._spawn()
+
+    def _checkin(self, worker: _Worker):
+        with self.lock:
+            if not self.closed:
+                self.idle.append(worker)
+                return
+            self.live -= 1
+        worker.stop()
+
+    def _spawn(self) -> _Worker:
+        worker = None
+        try:
+            worker = _Worker(self.command, tempfile.mkdtemp(dir=self.tmp_dir))
+            worker.request({'op': 'ping'}, STARTUP_TIMEOUT)
+        except (OSError, _WorkerError) as e:
+            if worker is not None:
+                worker.stop(kill=True)
+            if not self.started:
+                # Never came up at all (tool or runtime missing): don't keep retrying
+                self._disable(f'worker failed to start ({e})')
+            else:
+                self._record_restart(f'replacement worker failed to start ({e})')
+            raise _WorkerError(str(e))
+        with self.lock:
+            self.started = True
+            self.live += 1
+        return worker
+
+    def _discard(self, worker: _Worker, reason: str):
+        worker.stop(kill=True)
+        with self.lock:
+            self.live -= 1
+        self._record_restart(f'worker {reason}')
+
+    def _record_restart(self, reason: str):
+        logging.warning("%s %s; restarting it", self.tool, reason)
+        get_metrics().inc('linter_worker_restarts_total', tool=self.tool)
+        now = time.monotonic()
+        with self.lock:
+            self.total_restarts += 1
+            self.restarts.append(now)
+            while self.restarts and now - self.restarts[0] > RESTART_WINDOW:
+                self.restarts.popleft()
+            too_many = len(self.restarts) > MAX_RESTARTS
+        if too_many:
+            self._disable(f'{len(self.restarts)} worker restarts in {RESTART_WINDOW}s')
+
+    def _disable(self, reason: str):
+        with self.lock:
+            if self.disabled is not None:
+                return
+            self.disabled = reason
+        logging.warning("%s daemon disabled: %s; falling back to one process per file", self.tool, reason)
+
+    def health(self) -> Dict:
+        """
+        Pool state; idle workers that have died are replaced on next use and counted as restarts.
+        """
+        with self.lock:
+            dead = [w for w in self.idle if not w.alive()]
+            self.idle = [w for w in self.idle if w not in dead]
+        for worker in dead:
+            self._discard(worker, f'exited with status {worker.proc.returncode}')
+        with self.lock:
+            return {'tool': self.tool, 'mode': self.mode, 'workers': self.live, 'idle': len(self.idle),
+                    'max_workers': self.size, 'requests': sum(w.requests for w in self.idle),
+                    'restarts': self.total_restarts, 'disabled': self.disabled}
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            idle, self.idle = self.idle, []
+            self.live -= len(idle)
+        for worker in idle:
+            worker.stop()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+def _make_backend(language: str, daemons: bool, stub: bool, stub_args: List[str]) -> Optional[AnalyzerBackend]:
+    # Stand-ins speak the same CLI formats and worker protocol as the real tools, for offline runs
+    stub_cmd = [sys.executable, STUB_SCRIPT]
+    if language == 'C++':
+        return ClangTidyBackend([*stub_cmd, 'clang-tidy', *stub_args] if stub else ['clang-tidy'])
+    if language == 'JavaScript':
+        fallback = OneShotBackend('eslint', [*stub_cmd, 'eslint', *stub_args, FILE] if stub else
+                                  ['eslint', FILE, '--format', 'compact'], parse_eslint, '.js')
+        if not daemons:
+            return fallback
+        worker = [*stub_cmd, 'worker', *stub_args] if stub else ['node', os.path.join(WORKER_DIR, 'eslint_worker.js')]
+        return DaemonBackend('eslint', worker, fallback, '.js')
+    if language == 'Java':
+        fallback = OneShotBackend('checkstyle', [*stub_cmd, 'checkstyle', *stub_args, FILE] if stub else
+                                  ['checkstyle', '-f', 'plain', FILE], parse_checkstyle, '.java')
+        jar = os.environ.get('CHECKSTYLE_JAR')
+        if not daemons or not (stub or jar):
+            return fallback
+        # Java 11+ runs the single-file worker source directly; Checkstyle comes from its all-in-one jar
+        worker = [*stub_cmd, 'worker', *stub_args] if stub else [
+            'java', '-cp', jar, os.path.join(WORKER_DIR, 'CheckstyleWorker.java'),
+            os.environ.get('CHECKSTYLE_CONFIG', '/sun_checks.xml')]
+        return DaemonBackend('checkstyle', worker, fallback, '.java')
+    return None
+
+_settings = {
+    'daemons': os.environ.get('DEBUGGERAI_LINTER_DAEMONS', '1') != '0',
+    'stub': os.environ.get('DEBUGGERAI_LINTER_STUB', '0') != '0',
+    'stub_args': []
+}
+_backends: Dict[str, Optional[AnalyzerBackend]] = {}
+_backends_lock = threading.Lock()
+
+def get_backend(language: str) -> Optional[AnalyzerBackend]:
+    """
+    The shared backend for a language (None if there's no linter for it), created on first use.
+    """
+    with _backends_lock:
+        if language not in _backends:
+            _backends[language] = _make_backend(language, **_settings)
+        return _backends[language]
+
+def configure_backends(daemons: bool = True, stub: bool = False, stub_args: Optional[List[str]] = None):
+    """
+    Replace the shared backends. daemons=False runs one linter process per file; stub=True swaps every
+    tool for linter_stub.py, with stub_args such as ['--startup', '0.5', '--crash-after', '100'].
+    """
+    close_backends()
+    _settings.update(daemons=daemons, stub=stub, stub_args=list(stub_args or []))
+
+def close_backends():
+    with _backends_lock:
+        backends = [b for b in _backends.values() if b is not None]
+        _backends.clear()
+    for backend in backends:
+        backend.close()
+
+def backend_health() -> Dict[str, Dict]:
+    with _backends_lock:
+        backends = dict(_backends)
+    return {language: backend.health() for language, backend in backends.items() if backend is not None}
+
+def _collect_backend_metrics(metrics: MetricsRegistry):
+    for health in backend_health().values():
+        if 'workers' in health:
+            metrics.set_gauge('linter_workers', health['workers'], tool=health['tool'])
+
+get_metrics().add_collector(_collect_backend_metrics)
+atexit.register(close_backends)
@@ -0,0 +1,92 @@
+"""
+Local stand-ins for clang-tidy, eslint and checkstyle, for benchmarks and offline testing of the linter
+backends. Findings come from the text alone: TODO comments, long lines and trailing whitespace.
+
+    python linter_stub.py worker --startup 0.5 --crash-after 100   # daemon protocol on stdin/stdout
+    python linter_stub.py eslint --startup 0.5 file.js            # one process per file, CLI output
+    python linter_stub.py clang-tidy -p build/ --quiet a.cpp b.cpp
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import List, Tuple
+
+MAX_LINE_LENGTH = 100
+
+def lint(code: str) -> List[Tuple[int, str, str]]:
+    """
+    (line, rule, message) for every issue in the text.
+    """
+    issues = []
+    for number, line in enumerate(code.splitlines(), 1):
+        if 'TODO' in line:
+            issues.append((number, 'todo-comment', 'Unresolved TODO comment'))
+        if len(line) > MAX_LINE_LENGTH:
+            issues.append((number, 'line-length', f'Line is longer than {MAX_LINE_LENGTH} characters ({len(line)})'))
+        if line != line.rstrip():
+            issues.append((number, 'trailing-whitespace', 'Trailing whitespace'))
+    return issues
+
+def lint_file(path: str) -> List[Tuple[int, str, str]]:
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        return lint(f.read())
+
+# One-shot output in each tool's format, as parsed by linter_backends
+CLI_FORMATS = {
+    'clang-tidy': '{path}:{line}:1: warning: {message} [{rule}]',
+    'eslint': '{path}:{line}:1: {message} [{rule}]',
+    'checkstyle': '[WARN] {path}:{line}:1: {message} [{rule}]'
+}
+
+def run_cli(tool: str, files: List[str]):
+    for path in files:
+        for line, rule, message in lint_file(path):
+            print(CLI_FORMATS[tool].format(path=path, line=line, rule=rule, message=message))
+
+def run_worker(crash_after: int):
+    """
+    Answer worker protocol requests until stdin closes; with crash_after, die abruptly after that many files.
+    """
+    linted = 0
+    for line in sys.stdin:
+        try:
+            request = json.loads(line)
+        except ValueError:
+            continue
+        if request.get('op') == 'ping':
+            reply = {'id': request.get('id'), 'ok': True, 'version': 'stub'}
+        else:
+            linted += 1
+            if crash_after and linted > crash_after:
+                os._exit(1)
+            try:
+                findings = [{'line': n, 'type': rule, 'message': message} for n, rule, message in lint_file(request['path'])]
+                reply = {'id': request.get('id'), 'findings': findings}
+            except (KeyError, OSError) as e:
+                reply = {'id': request.get('id'), 'error': str(e)}
+        sys.stdout.write(json.dumps(reply) + '\n')
+        sys.stdout.flush()
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Offline stand-in for the DebuggerAI linters')
+    parser.add_argument('mode', choices=['worker', *CLI_FORMATS])
+    parser.add_argument('--startup', type=float, default=0.0, help='seconds to sleep first, like a JVM or Node starting')
+    parser.add_argument('--crash-after', type=int, default=0, help='worker exits abruptly after this many files')
+    parser.add_argument('-p', dest='build_dir', help='compilation database directory (ignored)')
+    parser.add_argument('--quiet', action='store_true')
+    # Anything after '--' (compiler flags) and unknown tool options are ignored
+    args, rest = parser.parse_known_args(argv)
+    if '--' in rest:
+        rest = rest[:rest.index('--')]
+    files = [arg for arg in rest if not arg.startswith('-')]
+    time.sleep(args.startup)
+    if args.mode == 'worker':
+        run_worker(args.crash_after)
+    else:
+        run_cli(args.mode, files)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
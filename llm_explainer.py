@@ -1,5 +1,14 @@
+import asyncio
+import json
+import random
+import re
+import time
 import openai
-from typing import List, Dict
+from contextlib import nullcontext
+from typing import List, Dict, Optional, Tuple
+from explanation_cache import ExplanationCache
+from context_extraction import ContextExtractor
+from telemetry import RunTrace, get_metrics
 
 EXPLANATION_DEPTHS = [
     'Beginner',
@@ -8,39 +17,299 @@ EXPLANATION_DEPTHS = [
     'Explain like I’m 12'
 ]
 
+MAX_TOKENS = 500
+# Completion budget per finding when several findings share one request
+BATCH_TOKENS_PER_FINDING = 350
+
+DEPTH_STYLES = {
+    'Beginner': 'Explain in simple terms for a beginner programmer.',
+    'Intermediate': 'Explain clearly for someone with some programming experience.',
+    'Expert': 'Give a detailed, technical explanation for an expert.',
+    'Explain like I’m 12': 'Explain as if teaching a 12-year-old, using analogies and simple language.'
+}
+
+CODE_FENCES = {
+    'Python': 'python',
+    'C++': 'cpp',
+    'JavaScript': 'javascript',
+    'Java': 'java'
+}
+
+class TokenBucket:
+    """
+    Async token bucket refilled continuously at rate_per_minute.
+    """
+    def __init__(self, rate_per_minute: float):
+        self.capacity = rate_per_minute
+        self.tokens = rate_per_minute
+        self.rate = rate_per_minute / 60.0
+        self.updated = time.monotonic()
+
+    async def acquire(self, amount: float = 1):
+        amount = min(amount, self.capacity)
+        while True:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return
+            await asyncio.sleep((amount - self.tokens) / self.rate)
+
 class LLMExplainer:
-    def __init__(self, api_key: str, depth: str = 'Intermediate'):
+    def __init__(self, api_key: str, depth: str = 'Intermediate', model: str = 'gpt-4o', cache: Optional[ExplanationCache] = None,
+                 base_url: Optional[str] = None, max_concurrency: int = 8, requests_per_minute: float = 500,
+                 tokens_per_minute: float = 30000, max_retries: int = 5, language: str = 'Python',
+                 context_window: int = 20, max_prompt_tokens: Optional[int] = 3000, batch_size: int = 1,
+                 trace: Optional[RunTrace] = None, templates=None):
         openai.api_key = api_key
+        if base_url:
+            openai.base_url = base_url
+        self.api_key = api_key
+        self.base_url = base_url
         self.depth = depth
+        self.model = model
+        self.cache = cache
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.language = language
+        self.context_window = context_window
+        self.max_prompt_tokens = max_prompt_tokens
+        self.prompt_tokens_saved = 0
+        # API usage so far, for budgets and reporting
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        # Findings per request when batching nearby findings; 1 disables batching
+        self.batch_size = batch_size
+        # Each API call is recorded as an 'explain' span with its token usage
+        self.trace = trace
+        # TemplateLibrary consulted before any API call; rules it can't serve go to the LLM
+        self.templates = templates
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self._semaphore = None
+        self._async_client = None
 
-    def explain_findings(self, code: str, findings: List[Dict]) -> List[Dict]:
-        explanations = []
-        for finding in findings:
-            prompt = self._build_prompt(code, finding)
-            response = self._call_openai(prompt)
-            fix = self._extract_fix(response)
-            explanations.append({
-                'line': finding['line'],
-                'type': finding['type'],
-                'message': finding['message'],
-                'explanation': response,
-                'fix': fix
-            })
+    def explain_findings(self, code: str, findings: List[Dict], language: Optional[str] = None) -> List[Dict]:
+        explanations = [None] * len(findings)
+        extractor = self._context_extractor(code, language)
+        for group in self._pending_groups(extractor, findings, explanations):
+            group_findings = [findings[i] for i in group]
+            for i, explanation in zip(group, self._explain_group(extractor, group_findings)):
+                explanations[i] = explanation
         return explanations
 
-    def _build_prompt(self, code: str, finding: Dict) -> str:
-        style = {
-            'Beginner': 'Explain in simple terms for a beginner programmer.',
-            'Intermediate': 'Explain clearly for someone with some programming experience.',
-            'Expert': 'Give a detailed, technical explanation for an expert.',
-            'Explain like I’m 12': 'Explain as if teaching a 12-year-old, using analogies and simple language.'
-        }[self.depth]
+    async def explain_findings_async(self, code: str, findings: List[Dict], language: Optional[str] = None) -> List[Dict]:
+        """
+        Explain all findings concurrently, bounded by max_concurrency and the rate limits.
+        language overrides the explainer's own for this file (mixed-language runs).
+        """
+        explanations = [None] * len(findings)
+        extractor = self._context_extractor(code, language)
+
+        async def explain(group):
+            group_explanations = await self._explain_group_async(extractor, [findings[i] for i in group])
+            for i, explanation in zip(group, group_explanations):
+                explanations[i] = explanation
+        await asyncio.gather(*[explain(g) for g in self._pending_groups(extractor, findings, explanations)])
+        return explanations
+
+    def learned_explanations(self, findings: List[Dict], language: Optional[str] = None) -> Dict[int, Dict]:
+        """
+        Explanations the template library serves without the API, by finding index.
+        """
+        if self.templates is None:
+            return {}
+        found = {}
+        for i, finding in enumerate(findings):
+            explanation = self.templates.lookup(finding, language or self.language, self.depth)
+            if explanation is not None:
+                found[i] = explanation
+        return found
+
+    def _pending_groups(self, extractor: ContextExtractor, findings: List[Dict], explanations: List) -> List[List[int]]:
+        """
+        Fill in what the template library knows and group the remaining finding indices into requests.
+        """
+        for i, explanation in self.learned_explanations(findings, extractor.language).items():
+            explanations[i] = explanation
+        rest = [i for i, explanation in enumerate(explanations) if explanation is None]
+        return [[rest[j] for j in group] for group in self._group_findings(extractor, [findings[i] for i in rest])]
+
+    def plan(self, code: str, findings: List[Dict], language: Optional[str] = None) -> Tuple[ContextExtractor, List[List[int]]]:
+        """
+        The context extractor and the request groups (finding indices) explain_findings would use.
+        """
+        extractor = self._context_extractor(code, language)
+        return extractor, self._group_findings(extractor, findings)
+
+    async def explain_group_async(self, extractor: ContextExtractor, group: List[Dict], fallback: bool = True) -> List[Optional[Dict]]:
+        """
+        Without fallback, findings a batch answer didn't cover come back as None instead of being asked one by one.
+        """
+        return await self._explain_group_async(extractor, group, fallback)
+
+    def estimate_tokens(self, extractor: ContextExtractor, group: List[Dict]) -> int:
+        """
+        Rough prompt plus completion tokens for explaining a group, before any cache hit.
+        """
+        if len(group) == 1:
+            return len(self._build_prompt(extractor, group[0], record=False)) // 4 + MAX_TOKENS
+        return len(self._build_batch_prompt(extractor, group, record=False)) // 4 + BATCH_TOKENS_PER_FINDING * len(group)
+
+    def cached_explanations(self, extractor: ContextExtractor, group: List[Dict]) -> List[Optional[Dict]]:
+        """
+        Explanations for a group that are already in the cache, without calling the API; None where there are none.
+        """
+        found = [None] * len(group)
+        if self.cache is None:
+            return found
+        if len(group) > 1:
+            response = self.cache.get(ExplanationCache.make_key(self._build_batch_prompt(extractor, group, record=False), self.model))
+            if response is not None:
+                found = self._parse_batch_response(response, group)
+        for i, finding in enumerate(group):
+            if found[i] is None:
+                response = self.cache.get(ExplanationCache.make_key(self._build_prompt(extractor, finding, record=False), self.model))
+                if response is not None:
+                    found[i] = self._to_explanation(finding, response)
+        return found
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.close()
+            self._async_client = None
+
+    def _to_explanation(self, finding: Dict, response: str) -> Dict:
+        return {
+            'line': finding['line'],
+            'type': finding['type'],
+            'message': finding['message'],
+            'explanation': response,
+            'fix': self._extract_fix(response)
+        }
+
+    def _context_extractor(self, code: str, language: Optional[str] = None) -> ContextExtractor:
+        return ContextExtractor(code, language or self.language, window=self.context_window, max_tokens=self.max_prompt_tokens)
+
+    def _group_findings(self, extractor: ContextExtractor, findings: List[Dict]) -> List[List[int]]:
+        """
+        Group finding indices that share an enclosing scope, or sit within context_window lines
+        of each other at module level, into batches of at most batch_size.
+        """
+        order = sorted(range(len(findings)), key=lambda i: findings[i]['line'])
+        if self.batch_size <= 1:
+            return [[i] for i in order]
+        groups = []
+        current, current_scope = [], None
+        for i in order:
+            line = findings[i]['line']
+            scope = extractor.enclosing_scope(line)
+            if current and len(current) < self.batch_size and scope == current_scope and (
+                    scope is not None or line - findings[current[0]]['line'] <= self.context_window):
+                current.append(i)
+            else:
+                if current:
+                    groups.append(current)
+                current, current_scope = [i], scope
+        if current:
+            groups.append(current)
+        return groups
+
+    def _explain_group(self, extractor: ContextExtractor, group: List[Dict]) -> List[Dict]:
+        if len(group) == 1:
+            return [self._explain_single(extractor, group[0])]
+        prompt = self._build_batch_prompt(extractor, group)
+        response = self._explain(prompt, BATCH_TOKENS_PER_FINDING * len(group))
+        parsed = self._parse_batch_response(response, group)
+        # Fall back to one request per finding for anything the batch answer didn't cover
+        return [ex if ex is not None else self._explain_single(extractor, f) for ex, f in zip(parsed, group)]
+
+    async def _explain_group_async(self, extractor: ContextExtractor, group: List[Dict], fallback: bool = True) -> List[Dict]:
+        if len(group) == 1:
+            return [await self._explain_single_async(extractor, group[0])]
+        prompt = self._build_batch_prompt(extractor, group)
+        response = await self._explain_async(prompt, BATCH_TOKENS_PER_FINDING * len(group))
+        parsed = self._parse_batch_response(response, group)
+        if not fallback:
+            return parsed
+        missing = [f for ex, f in zip(parsed, group) if ex is None]
+        fallback = iter(await asyncio.gather(*[self._explain_single_async(extractor, f) for f in missing]))
+        return [ex if ex is not None else next(fallback) for ex in parsed]
+
+    def _explain_single(self, extractor: ContextExtractor, finding: Dict) -> Dict:
+        return self._to_explanation(finding, self._explain(self._build_prompt(extractor, finding)))
+
+    async def _explain_single_async(self, extractor: ContextExtractor, finding: Dict) -> Dict:
+        return self._to_explanation(finding, await self._explain_async(self._build_prompt(extractor, finding)))
+
+    def _build_batch_prompt(self, extractor: ContextExtractor, group: List[Dict], record: bool = True) -> str:
+        context = extractor.extract(min(f['line'] for f in group), max(f['line'] for f in group))
+        if record:
+            self.prompt_tokens_saved += context['tokens_saved'] * len(group)
+        issues = '\n'.join(f"{n}. line {f['line']}: {f['type']}: {f['message']}" for n, f in enumerate(group, 1))
+        return f"""
+You are an AI coding tutor. {DEPTH_STYLES[self.depth]}\nExplain why this code triggers each of the numbered issues below:
+
+Code (lines {context['start']}-{context['end']} of the file):
+```{CODE_FENCES.get(extractor.language, '')}
+{context['code']}
+```
+
+Issues:
+{issues}
+
+For each issue, explain the bug, suggest a fix, and explain the concept behind the bug.
+Respond with only a JSON array containing one object per issue, of the form
+{{"id": <issue number>, "explanation": "<explanation>", "fix": "<fixed code, or empty string>"}}
+"""
+
+    def _parse_batch_response(self, response: str, group: List[Dict]) -> List[Optional[Dict]]:
+        """
+        Map a batched JSON answer back onto the group's findings; None marks findings it didn't cover.
+        """
+        parsed = [None] * len(group)
+        text = response.strip()
+        fenced = re.search(r'```(?:json)?\n([\s\S]+?)```', text)
+        if fenced:
+            text = fenced.group(1)
+        try:
+            items = json.loads(text)
+        except ValueError:
+            return parsed
+        if not isinstance(items, list):
+            return parsed
+        for item in items:
+            if not isinstance(item, dict) or not isinstance(item.get('explanation'), str):
+                continue
+            try:
+                index = int(item.get('id')) - 1
+            except (TypeError, ValueError):
+                continue
+            if 0 <= index < len(group) and parsed[index] is None:
+                finding = group[index]
+                fix = item.get('fix')
+                parsed[index] = {
+                    'line': finding['line'],
+                    'type': finding['type'],
+                    'message': finding['message'],
+                    'explanation': item['explanation'].strip(),
+                    'fix': fix.strip() if isinstance(fix, str) else ''
+                }
+        return parsed
+
+    def _build_prompt(self, extractor: ContextExtractor, finding: Dict, record: bool = True) -> str:
+        context = extractor.extract(finding['line'])
+        if record:
+            self.prompt_tokens_saved += context['tokens_saved']
+        style = DEPTH_STYLES[self.depth]
         return f"""
 You are an AI coding tutor. {style}\nExplain why this code triggers a {finding['type']} error at line {finding['line']}:
 
-Code:
-```python
-{code}
+Code (lines {context['start']}-{context['end']} of the file):
+```{CODE_FENCES.get(extractor.language, '')}
+{context['code']}
 ```
 
 Error message: {finding['message']}
@@ -48,19 +317,92 @@ Error message: {finding['message']}
 Explain the bug, suggest a fix, and explain the concept behind the bug. Output the fixed code in a separate code block if possible.
 """
 
-    def _call_openai(self, prompt: str) -> str:
-        response = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=500,
-            temperature=0.2
-        )
+    def _explain(self, prompt: str, max_tokens: int = MAX_TOKENS) -> str:
+        if self.cache is None:
+            return self._call_openai(prompt, max_tokens)
+        key = ExplanationCache.make_key(prompt, self.model)
+        return self.cache.get_or_compute(key, lambda: self._call_openai(prompt, max_tokens))
+
+    async def _explain_async(self, prompt: str, max_tokens: int = MAX_TOKENS) -> str:
+        if self.cache is None:
+            return await self._call_openai_async(prompt, max_tokens)
+        key = ExplanationCache.make_key(prompt, self.model)
+        return await self.cache.get_or_compute_async(key, lambda: self._call_openai_async(prompt, max_tokens))
+
+    def _span(self, **attrs):
+        return self.trace.span('explain', **attrs) if self.trace is not None else nullcontext(attrs)
+
+    def _record_usage(self, span: Dict, response):
+        self.calls += 1
+        usage = getattr(response, 'usage', None)
+        if usage is None:
+            return
+        self.prompt_tokens += usage.prompt_tokens
+        self.completion_tokens += usage.completion_tokens
+        span['prompt_tokens'] = usage.prompt_tokens
+        span['completion_tokens'] = usage.completion_tokens
+        metrics = get_metrics()
+        metrics.inc('llm_tokens_total', usage.prompt_tokens, kind='prompt')
+        metrics.inc('llm_tokens_total', usage.completion_tokens, kind='completion')
+
+    def _call_openai(self, prompt: str, max_tokens: int = MAX_TOKENS) -> str:
+        with self._span(model=self.model, max_tokens=max_tokens) as span:
+            response = openai.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": prompt}],
+                max_tokens=max_tokens,
+                temperature=0.2
+            )
+            get_metrics().inc('llm_requests_total', outcome='ok')
+            self._record_usage(span, response)
         content = response.choices[0].message.content
         return content.strip() if content else ""
 
+    async def _call_openai_async(self, prompt: str, max_tokens: int = MAX_TOKENS) -> str:
+        if self._async_client is None:
+            # Retries are handled below so they share the rate limiters
+            self._async_client = openai.AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        # Rough estimate: ~4 characters per prompt token plus the completion budget
+        estimated_tokens = len(prompt) // 4 + max_tokens
+        metrics = get_metrics()
+        # The span covers rate limiting and retries too, so it's the latency the file actually waited
+        with self._span(model=self.model, max_tokens=max_tokens, retries=0) as span:
+            for attempt in range(self.max_retries + 1):
+                await self.request_bucket.acquire()
+                await self.token_bucket.acquire(estimated_tokens)
+                async with self._semaphore:
+                    try:
+                        response = await self._async_client.chat.completions.create(
+                            model=self.model,
+                            messages=[{"role": "user", "content": prompt}],
+                            max_tokens=max_tokens,
+                            temperature=0.2
+                        )
+                    except openai.RateLimitError as e:
+                        metrics.inc('llm_requests_total', outcome='rate_limited')
+                        if attempt == self.max_retries:
+                            raise
+                        delay = self._retry_delay(e, attempt)
+                    else:
+                        metrics.inc('llm_requests_total', outcome='ok')
+                        self._record_usage(span, response)
+                        content = response.choices[0].message.content
+                        return content.strip() if content else ""
+                span['retries'] += 1
+                metrics.inc('llm_retries_total')
+                await asyncio.sleep(delay)
+
+    @staticmethod
+    def _retry_delay(error, attempt: int) -> float:
+        retry_after = error.response.headers.get('retry-after') if error.response is not None else None
+        try:
+            return float(retry_after)
+        except (TypeError, ValueError):
+            return min(60.0, 2 ** attempt) + random.uniform(0, 1)
+
     def _extract_fix(self, response: str) -> str:
-        import re
-        code_blocks = re.findall(r'```(?:python)?\n([\s\S]+?)```', response)
+        code_blocks = re.findall(r'```(?:[\w+-]+)?\n([\s\S]+?)```', response)
         if len(code_blocks) > 1:
             return code_blocks[1].strip()
         elif code_blocks:
@@ -0,0 +1,120 @@
+"""
+Local stand-in for the OpenAI chat-completions endpoint, for benchmarks and offline testing.
+
+    python openai_stub.py --port 8787 --latency 0.2 --rate-limit-every 10
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, Tuple
+
+class StubState:
+    def __init__(self, latency: float = 0.05, rate_limit_every: int = 0, retry_after: float = 0.05):
+        self.latency = latency
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.rate_limited = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.active = 0
+        self.peak_active = 0
+
+    def stats(self) -> Dict:
+        with self.lock:
+            return {
+                'requests': self.requests,
+                'rate_limited': self.rate_limited,
+                'prompt_tokens': self.prompt_tokens,
+                'completion_tokens': self.completion_tokens,
+                'peak_concurrency': self.peak_active
+            }
+
+def _answer(prompt: str) -> str:
+    ids = re.findall(r'^(\d+)\. line \d+:', prompt, re.M)
+    if 'JSON array' in prompt and ids:
+        # Batched request: one structured item per numbered issue
+        return json.dumps([{'id': int(i), 'explanation': f'Stub explanation for issue {i}.', 'fix': 'pass'} for i in ids])
+    return 'Stub explanation of the issue and the concept behind it.\n\n```python\npass\n```'
+
+def _make_handler(state: StubState):
+    class Handler(BaseHTTPRequestHandler):
+        # Keep-alive, like the real API
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, body: Dict, headers: Dict = None):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('content-type', 'application/json')
+            self.send_header('content-length', str(len(data)))
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get('content-length', 0))) or b'{}')
+            with state.lock:
+                state.requests += 1
+                n = state.requests
+                state.active += 1
+                state.peak_active = max(state.peak_active, state.active)
+            try:
+                time.sleep(state.latency)
+            finally:
+                with state.lock:
+                    state.active -= 1
+            if state.rate_limit_every and n % state.rate_limit_every == 0:
+                with state.lock:
+                    state.rate_limited += 1
+                self._send(429, {'error': {'message': 'Rate limit reached (stub)', 'type': 'rate_limit_exceeded'}},
+                           {'retry-after': str(state.retry_after)})
+                return
+            prompt = ''.join(m.get('content') or '' for m in body.get('messages', []))
+            content = _answer(prompt)
+            usage = {'prompt_tokens': len(prompt) // 4, 'completion_tokens': len(content) // 4}
+            usage['total_tokens'] = usage['prompt_tokens'] + usage['completion_tokens']
+            with state.lock:
+                state.prompt_tokens += usage['prompt_tokens']
+                state.completion_tokens += usage['completion_tokens']
+            self._send(200, {
+                'id': f'chatcmpl-stub-{n}',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': body.get('model', 'stub'),
+                'choices': [{'index': 0, 'finish_reason': 'stop', 'message': {'role': 'assistant', 'content': content}}],
+                'usage': usage
+            })
+    return Handler
+
+def start_stub_server(latency: float = 0.05, rate_limit_every: int = 0, host: str = '127.0.0.1',
+                      port: int = 0) -> Tuple[ThreadingHTTPServer, StubState, str]:
+    """
+    Serve in a daemon thread. Returns (server, state, base_url); call server.shutdown() when done.
+    """
+    state = StubState(latency, rate_limit_every)
+    server = ThreadingHTTPServer((host, port), _make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f'http://{host}:{server.server_port}/v1'
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local OpenAI chat-completions stub')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8787)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per request')
+    parser.add_argument('--rate-limit-every', type=int, default=0, help='answer every Nth request with HTTP 429')
+    args = parser.parse_args()
+    server, _, url = start_stub_server(args.latency, args.rate_limit_every, args.host, args.port)
+    print(f'OpenAI stub listening on {url}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,227 @@
+import asyncio
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Optional
+from analysis_cache import FindingsCache
+from fix_diff import add_diffs
+from async_utils import run_in_executor, iterate_in_executor, RunToken, run_scope, current_run
+from report import generate_markdown_report
+from static_analysis import StaticAnalyzer
+from telemetry import RunTrace
+
+# Files per linter batch (pylint, clang-tidy) while streaming; small enough that the first reports arrive quickly
+STREAM_BATCH_SIZE = 50
+# How often a run with a stop event checks it while waiting on slow files
+STOP_POLL_SECONDS = 0.5
+
+def static_explanations(findings: List[Dict]) -> List[Dict]:
+    """
+    Report entries for findings that aren't sent to the LLM (static-only runs).
+    """
+    return [{'line': f['line'], 'type': f['type'], 'message': f['message'],
+             'explanation': 'Not explained (static analysis only).', 'fix': ''} for f in findings]
+
+class AnalysisPipeline:
+    """
+    Streams files through static analysis, LLM explanation and report rendering.
+    Each file starts as soon as the source yields it and is handed to on_result as soon as it finishes,
+    instead of waiting for the full walk or the slowest file. Without an explainer only static analysis runs.
+    With a scheduler (see explain_scheduler), files with findings are held until the scan is done and then
+    explained together, most valuable findings first, within the run's LLM budget.
+    A file that already carries 'findings' (held by an earlier run that was paused) skips static analysis.
+    Shared by the Streamlit app and the command line.
+    """
+    def __init__(self, language: str, findings_cache: Optional[FindingsCache] = None, explainer=None,
+                 trace: Optional[RunTrace] = None, incremental_run=None, batch_size: int = STREAM_BATCH_SIZE,
+                 max_in_flight: Optional[int] = None, stop: Optional[threading.Event] = None, scheduler=None):
+        self.language = language
+        self.findings_cache = findings_cache or FindingsCache()
+        self.explainer = explainer
+        self.trace = trace or RunTrace()
+        self.incremental_run = incremental_run
+        self.batch_size = batch_size
+        # Files read but not finished; the scan waits beyond this so memory stays flat on huge trees
+        self.max_in_flight = max_in_flight or 4 * batch_size
+        # Setting stop abandons the files in flight and returns; they are simply not reported
+        self.stop = stop
+        self.stopped = False
+        self.scheduler = scheduler if explainer is not None else None
+        self.files_seen = 0
+        self.files_done = 0
+        # Files per language; with AUTO_DETECT each file carries its own language
+        self.languages: Dict[str, int] = {}
+        # One linter process per batch of files rather than one per file, where the linter supports it.
+        # Mixed runs keep a batch per language, so each linter works through its own queue concurrently.
+        self._batched: Dict[str, bool] = {}
+        self._batch_tasks = {}
+        self._batches: Dict[str, Dict] = {}
+        # Set by run(); get_engine().stats(token) reports this run's share of the shared pools
+        self.token: Optional[RunToken] = None
+
+    def run(self, file_source: Iterable[Dict], on_result: Optional[Callable] = None,
+            on_progress: Optional[Callable] = None, on_error: Optional[Callable] = None,
+            on_held: Optional[Callable] = None):
+        """
+        Blocking entry point. Any failure or interruption cancels this run's queued analysis and kills its
+        running linters; other runs sharing the engine carry on.
+        on_result(file, explanations, report_md) is called for every finished file (an empty list and
+        no report when it's clean), then on_progress(done, seen, scanning). With on_error(file, exception),
+        a failing file is reported there and the run carries on instead of aborting.
+        on_held(file, findings) is called for each file held for the scheduler, so it can be recorded
+        before the explanations arrive.
+        """
+        token = self.token = RunToken()
+        with run_scope(token):
+            try:
+                asyncio.run(self.run_async(file_source, on_result, on_progress, on_error, on_held))
+            except BaseException:
+                # Stop button, rerun or failure: don't leave linters running for an abandoned run
+                token.cancel()
+                raise
+
+    async def run_async(self, file_source: Iterable[Dict], on_result: Optional[Callable] = None,
+                        on_progress: Optional[Callable] = None, on_error: Optional[Callable] = None,
+                        on_held: Optional[Callable] = None):
+        pending = {}
+        files = iterate_in_executor(self.trace.iterate(file_source, 'scan'))
+        next_file = None
+        scanning = True
+        try:
+            while True:
+                if self.stop is not None and self.stop.is_set():
+                    self.stopped = True
+                    for task in list(pending) + ([next_file] if next_file is not None else []):
+                        task.cancel()
+                    # Only this run's linters; other runs on the engine are unaffected
+                    token = current_run()
+                    if token is not None:
+                        token.cancel()
+                    break
+                if scanning and next_file is None:
+                    if len(pending) < self.max_in_flight:
+                        next_file = asyncio.ensure_future(files.__anext__())
+                    else:
+                        # At the limit: lint the partial batch so the files holding it up can finish
+                        self._flush_batch()
+                if next_file is None and not pending:
+                    break
+                waiting = (set(pending) | {next_file}) if next_file is not None else set(pending)
+                finished, _ = await asyncio.wait(waiting, timeout=STOP_POLL_SECONDS if self.stop is not None else None,
+                                                 return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    if task is next_file:
+                        next_file = None
+                        try:
+                            file = task.result()
+                        except StopAsyncIteration:
+                            # Walk finished: lint whatever is left in the partial batch
+                            scanning = False
+                            self._flush_batch()
+                            continue
+                        self.files_seen += 1
+                        language = file.get('language', self.language)
+                        self.languages[language] = self.languages.get(language, 0) + 1
+                        stored = self.incremental_run.reuse(file) if self.incremental_run is not None else None
+                        if stored is None and 'findings' not in file and self._is_batched(language):
+                            self._queue_batch_file(file, language)
+                        pending[asyncio.ensure_future(self._analyze_file(file, stored))] = file
+                        continue
+                    file = pending.pop(task)
+                    try:
+                        _, explanations, report_md = task.result()
+                    except Exception as e:
+                        if on_error is None:
+                            raise
+                        logging.exception("Analysis of %s failed", file['relpath'])
+                        on_error(file, e)
+                    else:
+                        if explanations is None:
+                            # Held for the scheduler; its findings come back in place of a report
+                            if on_held is not None:
+                                on_held(file, report_md)
+                            continue
+                        if on_result is not None:
+                            on_result(file, explanations, report_md)
+                    self.files_done += 1
+                    if on_progress is not None:
+                        on_progress(self.files_done, self.files_seen, scanning)
+            if self.scheduler is not None and not self.stopped:
+                for file, explanations in await self.scheduler.run():
+                    _, explanations, report_md = self._finish(file, explanations)
+                    if on_result is not None:
+                        on_result(file, explanations, report_md)
+                    self.files_done += 1
+                    if on_progress is not None:
+                        on_progress(self.files_done, self.files_seen, False)
+        finally:
+            self.findings_cache.flush()
+            if self.explainer is not None:
+                await self.explainer.aclose()
+
+    def _is_batched(self, language: str) -> bool:
+        if language not in self._batched:
+            self._batched[language] = StaticAnalyzer.supports_batch(language)
+        return self._batched[language]
+
+    def _flush_batch(self, language: Optional[str] = None):
+        """
+        Start linting the partial batch for a language, or for every language.
+        """
+        for batch_language in [language] if language is not None else list(self._batches):
+            batch = self._batches.pop(batch_language, None)
+            if batch is not None:
+                batch['task'] = run_in_executor(self.findings_cache.analyze_batch, batch['files'], batch_language,
+                                                workload='analysis')
+                batch['ready'].set()
+
+    def _queue_batch_file(self, file: Dict, language: str):
+        batch = self._batches.get(language)
+        if batch is None:
+            batch = self._batches[language] = {'files': [], 'task': None, 'ready': asyncio.Event()}
+        batch['files'].append(file)
+        self._batch_tasks[file['relpath']] = batch
+        if len(batch['files']) >= self.batch_size:
+            self._flush_batch(language)
+
+    async def _analyze_file(self, file: Dict, stored: Optional[List[Dict]] = None):
+        if stored is not None:
+            # Touched but byte-identical since the last run
+            if not stored:
+                return file, [], None
+            return file, stored, generate_markdown_report(file['filename'], stored)
+        # Runs as its own task, so every span below (including explain calls) is tagged with the file
+        self.trace.bind(file=file['relpath'])
+        language = file.get('language', self.language)
+        with self.trace.span('analyze', language=language) as span:
+            batch = self._batch_tasks.pop(file['relpath'], None)
+            if 'findings' in file:
+                findings = file['findings']
+            elif batch is not None:
+                await batch['ready'].wait()
+                findings = (await batch['task'])[file['relpath']]
+            else:
+                findings = await run_in_executor(self.findings_cache.analyze_code, file['code'], language, file['filename'],
+                                                 workload='analysis')
+            span['findings'] = len(findings)
+        if not findings:
+            if self.incremental_run is not None:
+                self.incremental_run.record(file, [])
+            return file, [], None
+        if self.scheduler is not None:
+            self.scheduler.add(file, findings)
+            return file, None, findings
+        if self.explainer is not None:
+            explanations = await self.explainer.explain_findings_async(file['code'], findings, language)
+        else:
+            explanations = static_explanations(findings)
+        return self._finish(file, explanations)
+
+    def _finish(self, file: Dict, explanations: List[Dict]):
+        # Diffed once here, so both report formats (and reused results) share the same diffs
+        with self.trace.span('diff', findings=len(explanations)):
+            explanations = add_diffs(file['filename'], file['code'], explanations)
+        if self.incremental_run is not None:
+            self.incremental_run.record(file, explanations)
+        with self.trace.span('report', findings=len(explanations)):
+            report_md = generate_markdown_report(file['filename'], explanations)
+        return file, explanations, report_md
@@ -1,5 +1,6 @@
-from typing import List, Dict
-import difflib
+from typing import List, Dict, Iterable, Iterator, Optional, TextIO, Tuple
+import gzip
+import io
 
 def generate_markdown_report(filename: str, explanations: List[Dict]) -> str:
     report = [f"# 🐞 DebuggerAI Report for `{filename}`\n"]
@@ -9,12 +10,55 @@ def generate_markdown_report(filename: str, explanations: List[Dict]) -> str:
         report.append(f"**Explanation:**\n\n{ex['explanation']}\n")
         if ex.get('fix'):
             report.append(f"**Suggested fix:**\n\n```python\n{ex['fix']}\n```\n")
-            # Show diff if fix is present
-            orig_lines = ex['explanation'].splitlines()
-            fix_lines = ex['fix'].splitlines()
-            diff = difflib.unified_diff(orig_lines, fix_lines, fromfile='original', tofile='fix', lineterm='')
-            diff_text = '\n'.join(diff)
-            if diff_text:
-                report.append(f"**Diff:**\n\n```diff\n{diff_text}\n```\n")
+            # Diffs against the source are computed once by the pipeline (fix_diff.add_diffs)
+            if ex.get('diff'):
+                report.append(f"**Diff:**\n\n```diff\n{ex['diff']}\n```\n")
         report.append('---')
-    return '\n'.join(report) 
\ No newline at end of file
+    return '\n'.join(report)
+
+def open_report(path: str, compress: bool = False) -> TextIO:
+    """
+    Text stream for a report file, gzip-compressed when compress is set (name it .gz).
+    """
+    if compress:
+        return gzip.open(path, 'wt', encoding='utf-8', compresslevel=6)
+    return open(path, 'w', encoding='utf-8')
+
+class MarkdownReportWriter:
+    """
+    Writes one Markdown document incrementally, a file's section at a time, with a per-file summary at the end.
+    Only the summary rows are kept in memory.
+    """
+    def __init__(self, out: TextIO, title: str = 'DebuggerAI Report'):
+        self.out = out
+        self.summary: List[Tuple[str, int]] = []
+        out.write(f"# 🐞 {title}\n\n")
+
+    def add(self, filename: str, explanations: List[Dict], report_md: Optional[str] = None):
+        self.summary.append((filename, len(explanations)))
+        self.out.write((report_md or generate_markdown_report(filename, explanations)) + '\n\n')
+
+    def close(self):
+        self.out.write(f"## Summary\n\n{len(self.summary)} files, {sum(n for _, n in self.summary)} issues\n\n")
+        self.out.write('| File | Issues |\n| --- | --- |\n')
+        for filename, count in self.summary:
+            self.out.write(f"| `{filename}` | {count} |\n")
+        self.out.flush()
+
+def iter_markdown_report(files: Iterable[Tuple[str, List[Dict]]]) -> Iterator[str]:
+    """
+    The same document as MarkdownReportWriter, as chunks of text.
+    """
+    buffer = io.StringIO()
+    writer = MarkdownReportWriter(buffer)
+    for filename, explanations in files:
+        writer.add(filename, explanations)
+        yield _drain(buffer)
+    writer.close()
+    yield _drain(buffer)
+
+def _drain(buffer: io.StringIO) -> str:
+    text = buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    return text
\ No newline at end of file
@@ -0,0 +1,12 @@
+import re
+from typing import Dict
+
+# Rule name at the end of a message: pylint's "(unused-import)", clang-tidy's and checkstyle's "[...]"
+RULE_SUFFIX = re.compile(r'[\[(]([A-Za-z][\w.-]*)[\])]\s*$')
+
+def rule_id(finding: Dict) -> str:
+    """
+    The rule a finding comes from, e.g. 'unused-import' or 'bugprone-use-after-move'; the type otherwise.
+    """
+    m = RULE_SUFFIX.search(finding['message'])
+    return m.group(1) if m else finding['type']
@@ -1,31 +1,38 @@
-import sqlite3
 import json
 import time
 from typing import Optional, List
+from storage import get_connection, ensure_schema, insert_many, paginate
 
 class SessionHistoryDB:
     def __init__(self, db_path='session_history.db'):
-        self.conn = sqlite3.connect(db_path)
+        self.db_path = db_path
         self._create_table()
 
+    @property
+    def conn(self):
+        return get_connection(self.db_path)
+
     def _create_table(self):
-        self.conn.execute('''CREATE TABLE IF NOT EXISTS sessions (
+        ensure_schema(self.db_path, ['''CREATE TABLE IF NOT EXISTS sessions (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user TEXT,
             timestamp REAL,
             files TEXT,
             summary TEXT
-        )''')
-        self.conn.commit()
+        )''', 'CREATE INDEX IF NOT EXISTS idx_sessions_user_timestamp ON sessions (user, timestamp)'])
 
     def add_session(self, user: str, files: List[str], summary: str):
-        self.conn.execute('''INSERT INTO sessions (user, timestamp, files, summary) VALUES (?, ?, ?, ?)''',
-            (user, time.time(), json.dumps(files), summary))
-        self.conn.commit()
+        insert_many(self.db_path, '''INSERT INTO sessions (user, timestamp, files, summary) VALUES (?, ?, ?, ?)''',
+            [(user, time.time(), json.dumps(files), summary)])
 
-    def get_sessions(self, user: Optional[str] = None):
+    def get_sessions(self, user: Optional[str] = None, limit: Optional[int] = None, offset: int = 0):
         if user:
-            cur = self.conn.execute('SELECT * FROM sessions WHERE user=? ORDER BY timestamp DESC', (user,))
+            sql, params = paginate('SELECT * FROM sessions WHERE user=? ORDER BY timestamp DESC', [user], limit, offset)
         else:
-            cur = self.conn.execute('SELECT * FROM sessions ORDER BY timestamp DESC')
-        return cur.fetchall() 
\ No newline at end of file
+            sql, params = paginate('SELECT * FROM sessions ORDER BY timestamp DESC', [], limit, offset)
+        return self.conn.execute(sql, params).fetchall()
+
+    def count_sessions(self, user: Optional[str] = None) -> int:
+        if user:
+            return self.conn.execute('SELECT COUNT(*) FROM sessions WHERE user=?', (user,)).fetchone()[0]
+        return self.conn.execute('SELECT COUNT(*) FROM sessions').fetchone()[0]
@@ -1,122 +1,111 @@
-import subprocess
+import os
 import tempfile
 import re
 from typing import List, Dict
+from async_utils import get_engine
+from linter_backends import get_backend, tool_version, check_result
+
+PYLINT_ARGS = ['--output-format=text', '--score=n', '--disable=all', '--enable=E,W,C,R']
+# Max files handed to one pylint process; keeps argv and memory bounded on huge folders.
+PYLINT_BATCH_SIZE = 200
+
+# C++, JavaScript and Java go through the pluggable backends in linter_backends (batched clang-tidy,
+# warm eslint and checkstyle workers); pylint is batched here.
 
 class StaticAnalyzer:
     @staticmethod
     def analyze_code(code: str, language: str, filename: str = "temp") -> List[Dict]:
         if language == 'Python':
             return StaticAnalyzer._analyze_python(code)
-        elif language == 'C++':
-            return StaticAnalyzer._analyze_cpp(code, filename)
-        elif language == 'JavaScript':
-            return StaticAnalyzer._analyze_js(code, filename)
-        elif language == 'Java':
-            return StaticAnalyzer._analyze_java(code, filename)
-        else:
-            return []
+        backend = get_backend(language)
+        return backend.analyze(code, filename) if backend is not None else []
 
     @staticmethod
-    def _analyze_python(code: str) -> List[Dict]:
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as tmp:
-            tmp.write(code)
-            tmp.flush()
-            tmp_name = tmp.name
-        try:
-            result = subprocess.run([
-                'pylint', tmp_name, '--output-format=text', '--score=n', '--disable=all', '--enable=E,W,C,R'
-            ], capture_output=True, text=True)
-            findings = []
-            for line in result.stdout.splitlines():
-                # Match: filename:lineno:col: type: message
-                m = re.match(r'^(.*?):(\d+):(\d*):\s*([A-Z]\d+):\s*(.*)$', line)
-                if m:
-                    _, lineno, _, msg_type, msg = m.groups()
-                    findings.append({
-                        'line': int(lineno),
-                        'type': msg_type,
-                        'message': msg
-                    })
-            return findings
-        finally:
-            import os
-            os.unlink(tmp_name)
+    def tool_signature(language: str) -> str:
+        """
+        Identify the analyzer, its version and enabled checks for a language.
+        """
+        if language == 'Python':
+            return f"pylint {tool_version('pylint')} {' '.join(PYLINT_ARGS)}"
+        backend = get_backend(language)
+        return backend.signature() if backend is not None else ''
 
     @staticmethod
-    def _analyze_cpp(code: str, filename: str) -> List[Dict]:
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.cpp', delete=False) as tmp:
-            tmp.write(code)
-            tmp.flush()
-            tmp_name = tmp.name
-        try:
-            result = subprocess.run([
-                'clang-tidy', tmp_name, '--', '-std=c++17'
-            ], capture_output=True, text=True)
-            findings = []
-            for line in result.stdout.splitlines():
-                # Match: filename:lineno:col: error|warning|note: message
-                m = re.match(r'^(.*?):(\d+):(\d*):\s*(error|warning|note):\s*(.*)$', line)
-                if m:
-                    _, lineno, _, msg_type, msg = m.groups()
-                    findings.append({
-                        'line': int(lineno),
-                        'type': msg_type,
-                        'message': msg
-                    })
-            return findings
-        finally:
-            import os
-            os.unlink(tmp_name)
+    def supports_batch(language: str) -> bool:
+        """
+        Whether the language's linter checks many files per process, so callers should group files.
+        """
+        backend = get_backend(language)
+        return language == 'Python' or (backend is not None and backend.batched)
 
     @staticmethod
-    def _analyze_js(code: str, filename: str) -> List[Dict]:
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.js', delete=False) as tmp:
-            tmp.write(code)
-            tmp.flush()
-            tmp_name = tmp.name
-        try:
-            result = subprocess.run([
-                'eslint', tmp_name, '--format', 'compact'
-            ], capture_output=True, text=True)
-            findings = []
-            for line in result.stdout.splitlines():
-                # Match: filename:lineno:col: message [type]
-                m = re.match(r'^(.*?):(\d+):(\d+):\s*(.*)\s\[(.*)\]$', line)
-                if m:
-                    _, lineno, _, msg, msg_type = m.groups()
-                    findings.append({
-                        'line': int(lineno),
-                        'type': msg_type,
-                        'message': msg
-                    })
-            return findings
-        finally:
-            import os
-            os.unlink(tmp_name)
+    def analyze_batch(code_files: List[Dict], language: str) -> Dict[str, List[Dict]]:
+        """
+        Findings per relpath for several files of one language.
+        """
+        if language == 'Python':
+            return StaticAnalyzer.analyze_python_batch(code_files)
+        backend = get_backend(language)
+        if backend is None:
+            return {file['relpath']: [] for file in code_files}
+        return backend.analyze_batch(code_files)
 
     @staticmethod
-    def _analyze_java(code: str, filename: str) -> List[Dict]:
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.java', delete=False) as tmp:
+    def analyze_python_batch(code_files: List[Dict], batch_size: int = PYLINT_BATCH_SIZE) -> Dict[str, List[Dict]]:
+        """
+        Run pylint once per batch of files instead of once per file.
+        Returns a dict mapping each file's relpath to its findings.
+        """
+        results = {}
+        for start in range(0, len(code_files), batch_size):
+            results.update(StaticAnalyzer._analyze_python_chunk(code_files[start:start + batch_size]))
+        return results
+
+    @staticmethod
+    def _analyze_python_chunk(code_files: List[Dict]) -> Dict[str, List[Dict]]:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            by_name = {}
+            for i, file in enumerate(code_files):
+                tmp_name = f'debuggerai_{i}.py'
+                with open(os.path.join(tmp_dir, tmp_name), 'w', encoding='utf-8') as tmp:
+                    tmp.write(file['code'])
+                by_name[tmp_name] = file['relpath']
+            # duplicate-code only fires across files, so disable it to match single-file results
+            result = get_engine().run_subprocess(
+                ['pylint', *by_name, *PYLINT_ARGS, '--disable=duplicate-code'], cwd=tmp_dir
+            )
+            results = {relpath: [] for relpath in by_name.values()}
+            parsed = list(StaticAnalyzer._parse_pylint(result.stdout))
+            check_result('pylint', result, len(parsed))
+            for path, finding in parsed:
+                relpath = by_name.get(os.path.basename(path))
+                if relpath is not None:
+                    results[relpath].append(finding)
+            return results
+
+    @staticmethod
+    def _parse_pylint(output: str):
+        for line in output.splitlines():
+            # Match: filename:lineno:col: type: message
+            m = re.match(r'^(.*?):(\d+):(\d*):\s*([A-Z]\d+):\s*(.*)$', line)
+            if m:
+                path, lineno, _, msg_type, msg = m.groups()
+                yield path, {
+                    'line': int(lineno),
+                    'type': msg_type,
+                    'message': msg
+                }
+
+    @staticmethod
+    def _analyze_python(code: str) -> List[Dict]:
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as tmp:
             tmp.write(code)
             tmp.flush()
             tmp_name = tmp.name
         try:
-            result = subprocess.run([
-                'checkstyle', '-f', 'plain', tmp_name
-            ], capture_output=True, text=True)
-            findings = []
-            for line in result.stdout.splitlines():
-                # Match: [ERROR] filename:lineno:col: message
-                m = re.match(r'^\[.*?\]\s*(.*?):(\d+):(\d*):\s*(.*)$', line)
-                if m:
-                    _, lineno, _, msg = m.groups()
-                    findings.append({
-                        'line': int(lineno),
-                        'type': 'checkstyle',
-                        'message': msg
-                    })
+            result = get_engine().run_subprocess(['pylint', tmp_name, *PYLINT_ARGS])
+            findings = [finding for _, finding in StaticAnalyzer._parse_pylint(result.stdout)]
+            check_result('pylint', result, len(findings))
             return findings
         finally:
-            import os
-            os.unlink(tmp_name) 
\ No newline at end of file
+            os.unlink(tmp_name)
@@ -0,0 +1,101 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Sequence
+
+_local = threading.local()
+_schema_lock = threading.Lock()
+_schema_ready = set()
+
+def get_connection(db_path: str) -> sqlite3.Connection:
+    """
+    One cached connection per (thread, database file), in WAL mode so readers never block the writer.
+    """
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    key = os.path.abspath(db_path)
+    conn = connections.get(key)
+    if conn is None:
+        conn = sqlite3.connect(db_path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        connections[key] = conn
+    return conn
+
+def ensure_schema(db_path: str, statements: Sequence[str]):
+    """
+    Run CREATE TABLE/INDEX statements once per process and database file, not on every rerun.
+    """
+    key = (os.path.abspath(db_path), tuple(statements))
+    if key in _schema_ready:
+        return
+    with _schema_lock:
+        if key in _schema_ready:
+            return
+        with transaction(db_path) as conn:
+            for statement in statements:
+                conn.execute(statement)
+        _schema_ready.add(key)
+
+def ensure_columns(db_path: str, table: str, columns: Dict[str, str]):
+    """
+    Add columns (name -> type) that a table created by an older version is missing, once per process.
+    """
+    key = (os.path.abspath(db_path), table, tuple(columns.items()))
+    if key in _schema_ready:
+        return
+    with _schema_lock:
+        if key in _schema_ready:
+            return
+        with transaction(db_path) as conn:
+            existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+            for name, column_type in columns.items():
+                if name not in existing:
+                    conn.execute(f'ALTER TABLE {table} ADD COLUMN {name} {column_type}')
+        _schema_ready.add(key)
+
+@contextmanager
+def transaction(db_path: str):
+    """
+    Commit everything executed inside the block at once, or roll it all back on error.
+    """
+    conn = get_connection(db_path)
+    with conn:
+        yield conn
+
+def insert_many(db_path: str, sql: str, rows: Iterable[Sequence]):
+    with transaction(db_path) as conn:
+        conn.executemany(sql, rows)
+
+def paginate(sql: str, params: List, limit=None, offset: int = 0):
+    if limit is None:
+        return sql, params
+    return f'{sql} LIMIT ? OFFSET ?', params + [limit, offset]
+
+class BatchWriter:
+    """
+    Buffer rows for one INSERT statement and write them in a single transaction every batch_size rows.
+    """
+    def __init__(self, db_path: str, sql: str, batch_size: int = 200):
+        self.db_path = db_path
+        self.sql = sql
+        self.batch_size = batch_size
+        self.rows = []
+
+    def add(self, row: Sequence):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            rows, self.rows = self.rows, []
+            insert_many(self.db_path, self.sql, rows)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.flush()
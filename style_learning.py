@@ -1,51 +1,189 @@
+import ast
+import hashlib
+import json
+import os
 import re
-from typing import List, Dict
+from array import array
+from collections import Counter
+from typing import Iterable, List, Dict, Optional
+from input_pipeline import SUPPORTED_EXTENSIONS
+from storage import get_connection, ensure_schema, BatchWriter
 
-class StyleLearner:
+# Bump when partial computation changes so cached partials are recomputed
+STYLE_VERSION = 2
+LENGTH_BUCKET_WIDTH = 10
+LENGTH_BUCKETS = 21  # last bucket collects lines of 200+ characters
+INDENT_BUCKETS = 33  # last bucket collects indents of 32+ spaces
+
+# Slots in StylePartial.counts
+LINES, LENGTH_SUM, INDENTED_LINES, INDENT_SUM, SNAKE, CAMEL, PASCAL, DOCSTRINGS = range(8)
+
+# Function declarations for languages without a parser in the stdlib
+FUNCTION_PATTERNS = {
+    'JavaScript': re.compile(r'\bfunction\s*\*?\s*([A-Za-z_$][\w$]*)|\b([A-Za-z_$][\w$]*)\s*=\s*(?:async\s+)?(?:function\b|\([^)]*\)\s*=>)'),
+    'Java': re.compile(r'^[ \t]*(?:[\w<>\[\],.?]+[ \t]+)+([A-Za-z_]\w*)[ \t]*\([^;{)\n]*\)[^;{\n]*\{', re.M),
+    'C++': re.compile(r'^[ \t]*(?:[\w:<>,*&]+[ \t]+)+[*&]*(?:\w+::)*([A-Za-z_~]\w*)[ \t]*\([^;{)\n]*\)[^;{\n]*\{', re.M)
+}
+DOC_COMMENT = re.compile(r'/\*\*')
+PY_DEF = re.compile(r'\bdef\s+([A-Za-z_]\w*)')
+CONTROL_KEYWORDS = {'if', 'for', 'while', 'switch', 'catch', 'return', 'else'}
+
+class StylePartial:
+    """
+    Mergeable per-file style summary: fixed-size counters and histograms, independent of file length.
+    """
     def __init__(self):
+        self.counts = array('q', [0] * 8)
+        self.length_hist = array('q', [0] * LENGTH_BUCKETS)
+        self.indent_hist = array('q', [0] * INDENT_BUCKETS)
+
+    def merge(self, other: 'StylePartial'):
+        for mine, theirs in ((self.counts, other.counts), (self.length_hist, other.length_hist),
+                             (self.indent_hist, other.indent_hist)):
+            for i, value in enumerate(theirs):
+                mine[i] += value
+
+    def to_json(self) -> str:
+        return json.dumps([list(self.counts), list(self.length_hist), list(self.indent_hist)])
+
+    @staticmethod
+    def from_json(data: str) -> 'StylePartial':
+        partial = StylePartial()
+        counts, length_hist, indent_hist = json.loads(data)
+        partial.counts = array('q', counts)
+        partial.length_hist = array('q', length_hist)
+        partial.indent_hist = array('q', indent_hist)
+        return partial
+
+def language_for(filename: str) -> Optional[str]:
+    ext = os.path.splitext(filename)[1]
+    for language, exts in SUPPORTED_EXTENSIONS.items():
+        if ext in exts:
+            return language
+    return None
+
+def _classify(partial: StylePartial, names: Iterable[str]):
+    for name in names:
+        bare = name.strip('_')
+        if not bare:
+            continue
+        if bare.lower() == bare:
+            partial.counts[SNAKE] += 1
+        elif bare[0].isupper():
+            partial.counts[PASCAL] += 1
+        else:
+            partial.counts[CAMEL] += 1
+
+def _python_names_and_docstrings(code: str, partial: StylePartial):
+    try:
+        tree = ast.parse(code)
+    except (SyntaxError, ValueError):
+        # Unparsable source: fall back to a whole-file scan
+        _classify(partial, PY_DEF.findall(code))
+        partial.counts[DOCSTRINGS] += (code.count('"""') + code.count("'''")) // 2
+        return
+    names = []
+    if ast.get_docstring(tree) is not None:
+        partial.counts[DOCSTRINGS] += 1
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            names.append(node.name)
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)) and ast.get_docstring(node) is not None:
+            partial.counts[DOCSTRINGS] += 1
+    _classify(partial, names)
+
+def file_partial(code: str, language: Optional[str]) -> StylePartial:
+    partial = StylePartial()
+    lines = code.splitlines()
+    # Counter over map() counts in C; the Python-level loops below only touch distinct values
+    for length, n in Counter(map(len, lines)).items():
+        partial.length_hist[min(length // LENGTH_BUCKET_WIDTH, LENGTH_BUCKETS - 1)] += n
+        partial.counts[LENGTH_SUM] += length * n
+    partial.counts[LINES] = len(lines)
+    indents = Counter(len(line) - len(line.lstrip(' ')) for line in lines if line.startswith(' '))
+    for indent, n in indents.items():
+        partial.indent_hist[min(indent, INDENT_BUCKETS - 1)] += n
+        partial.counts[INDENT_SUM] += indent * n
+        partial.counts[INDENTED_LINES] += n
+    if language == 'Python':
+        _python_names_and_docstrings(code, partial)
+    elif language in FUNCTION_PATTERNS:
+        names = [next(g for g in groups if g) if isinstance(groups, tuple) else groups
+                 for groups in FUNCTION_PATTERNS[language].findall(code)]
+        _classify(partial, [n for n in names if n not in CONTROL_KEYWORDS])
+        partial.counts[DOCSTRINGS] += len(DOC_COMMENT.findall(code))
+    return partial
+
+class StyleLearner:
+    def __init__(self, cache_path: Optional[str] = 'style_cache.db'):
         self.metrics = {}
+        self.cache_path = cache_path
+        self.total = StylePartial()
+        if cache_path:
+            ensure_schema(cache_path, ['''CREATE TABLE IF NOT EXISTS style_partials (
+                key TEXT PRIMARY KEY,
+                partial TEXT
+            )'''])
 
-    def analyze_codebase(self, code_files: List[Dict]) -> Dict:
+    def analyze_codebase(self, code_files: Iterable[Dict]) -> Dict:
         """
         Analyze codebase style: indentation, naming, docstrings, line length, etc.
+        Files are folded into running totals one at a time; per-file partials are cached by content hash.
         Returns a dict of style metrics and suggestions.
         """
-        indent_counts = []
-        max_line_lengths = []
-        snake_case = camel_case = pascal_case = 0
-        docstring_count = 0
+        self.total = StylePartial()
+        writer = BatchWriter(self.cache_path, 'INSERT OR REPLACE INTO style_partials (key, partial) VALUES (?, ?)') \
+            if self.cache_path else None
         for file in code_files:
-            lines = file['code'].splitlines()
-            for line in lines:
-                if line.startswith(' '):
-                    indent_counts.append(len(line) - len(line.lstrip(' ')))
-                max_line_lengths.append(len(line))
-                # Naming conventions
-                for match in re.findall(r'def ([a-zA-Z_][a-zA-Z0-9_]*)', line):
-                    if '_' in match:
-                        snake_case += 1
-                    elif match and match[0].isupper():
-                        pascal_case += 1
-                    else:
-                        camel_case += 1
-                # Docstrings
-                if '"""' in line or "'''" in line:
-                    docstring_count += 1
-        avg_indent = sum(indent_counts) / len(indent_counts) if indent_counts else 0
-        avg_line_length = sum(max_line_lengths) / len(max_line_lengths) if max_line_lengths else 0
-        total_funcs = snake_case + camel_case + pascal_case
-        self.metrics = {
-            'avg_indent': avg_indent,
-            'avg_line_length': avg_line_length,
-            'snake_case': snake_case,
-            'camel_case': camel_case,
-            'pascal_case': pascal_case,
-            'docstring_count': docstring_count,
-            'total_funcs': total_funcs
-        }
+            self.total.merge(self._partial(file, writer))
+        if writer:
+            writer.flush()
+        self.metrics = self._metrics(self.total)
         suggestions = self._style_suggestions()
         return {'metrics': self.metrics, 'suggestions': suggestions}
 
+    def _partial(self, file: Dict, writer: Optional[BatchWriter]) -> StylePartial:
+        language = file.get('language') or language_for(file['filename']) or language_for(file.get('relpath', ''))
+        if writer is None:
+            return file_partial(file['code'], language)
+        digest = hashlib.sha256(file['code'].encode('utf-8', errors='ignore')).hexdigest()
+        key = f'{STYLE_VERSION}:{language}:{digest}'
+        row = get_connection(self.cache_path).execute('SELECT partial FROM style_partials WHERE key=?', (key,)).fetchone()
+        if row:
+            return StylePartial.from_json(row[0])
+        partial = file_partial(file['code'], language)
+        writer.add((key, partial.to_json()))
+        return partial
+
+    @staticmethod
+    def _metrics(total: StylePartial) -> Dict:
+        c = total.counts
+        total_funcs = c[SNAKE] + c[CAMEL] + c[PASCAL]
+        return {
+            'avg_indent': c[INDENT_SUM] / c[INDENTED_LINES] if c[INDENTED_LINES] else 0,
+            'avg_line_length': c[LENGTH_SUM] / c[LINES] if c[LINES] else 0,
+            'p95_line_length': StyleLearner._percentile(total.length_hist, 0.95) * LENGTH_BUCKET_WIDTH,
+            'total_lines': c[LINES],
+            'snake_case': c[SNAKE],
+            'camel_case': c[CAMEL],
+            'pascal_case': c[PASCAL],
+            'docstring_count': c[DOCSTRINGS],
+            'total_funcs': total_funcs
+        }
+
+    @staticmethod
+    def _percentile(hist: array, fraction: float) -> int:
+        """
+        Upper edge (in buckets) of the bucket containing the given fraction of samples.
+        """
+        target = sum(hist) * fraction
+        seen = 0
+        for bucket, n in enumerate(hist):
+            seen += n
+            if n and seen >= target:
+                return bucket + 1
+        return 0
+
     def _style_suggestions(self) -> List[str]:
         s = []
         if self.metrics.get('avg_indent', 0) not in (2, 4):
@@ -56,4 +194,4 @@ class StyleLearner:
             s.append("Most functions should use snake_case naming.")
         if self.metrics.get('docstring_count', 0) < self.metrics.get('total_funcs', 0) * 0.5:
             s.append("Add more docstrings to your functions/classes.")
-        return s 
\ No newline at end of file
+        return s
@@ -0,0 +1,296 @@
+import contextvars
+import json
+import logging
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+# Seconds; spans range from sub-millisecond cache hits to multi-minute linter runs
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+METRIC_PREFIX = 'debuggerai_'
+# Spans kept in memory per run for the profile; beyond that they're only logged
+MAX_SPANS = 100000
+# Numeric span attributes totalled per stage in the run profile
+SUMMED_ATTRS = ('findings', 'prompt_tokens', 'completion_tokens', 'retries')
+
+trace_logger = logging.getLogger('debuggerai.trace')
+# Attributes added to every span recorded from the current task, e.g. the file being analysed
+_span_context: contextvars.ContextVar = contextvars.ContextVar('debuggerai_span_context', default={})
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+class _Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+class MetricsRegistry:
+    """
+    Process-wide counters, gauges and latency histograms with labels, exported as Prometheus text or JSON.
+    Collectors are called before each export to refresh gauges such as executor queue depth.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.gauges: Dict[str, Dict[LabelKey, float]] = {}
+        self.histograms: Dict[str, Dict[LabelKey, _Histogram]] = {}
+        self.collectors: List[Callable[['MetricsRegistry'], None]] = []
+
+    @staticmethod
+    def _key(labels: Dict) -> LabelKey:
+        return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def value(self, name: str, **labels) -> float:
+        """
+        Current value of one counter series.
+        """
+        with self.lock:
+            return self.counters.get(name, {}).get(self._key(labels), 0)
+
+    def set_gauge(self, name: str, value: float, **labels):
+        with self.lock:
+            self.gauges.setdefault(name, {})[self._key(labels)] = value
+
+    def observe(self, name: str, value: float, **labels):
+        key = self._key(labels)
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = _Histogram()
+            series[key].observe(value)
+
+    def add_collector(self, collector: Callable[['MetricsRegistry'], None]):
+        self.collectors.append(collector)
+
+    def _collect(self):
+        for collector in self.collectors:
+            try:
+                collector(self)
+            except Exception:
+                logging.exception("Metrics collector failed")
+
+    def snapshot(self) -> Dict:
+        self._collect()
+        with self.lock:
+            return {
+                'counters': {name: [{'labels': dict(k), 'value': v} for k, v in series.items()]
+                             for name, series in self.counters.items()},
+                'gauges': {name: [{'labels': dict(k), 'value': v} for k, v in series.items()]
+                           for name, series in self.gauges.items()},
+                'histograms': {name: [{'labels': dict(k), 'count': h.count, 'sum': round(h.sum, 6),
+                                       'buckets': dict(zip([str(b) for b in h.buckets] + ['+Inf'], _cumulative(h.counts)))}
+                                      for k, h in series.items()]
+                               for name, series in self.histograms.items()}
+            }
+
+    def to_prometheus(self) -> str:
+        self._collect()
+        lines = []
+        with self.lock:
+            for kind, metrics in (('counter', self.counters), ('gauge', self.gauges)):
+                for name, series in sorted(metrics.items()):
+                    lines.append(f'# TYPE {METRIC_PREFIX}{name} {kind}')
+                    for key, value in series.items():
+                        lines.append(f'{METRIC_PREFIX}{name}{_labels(key)} {value}')
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f'# TYPE {METRIC_PREFIX}{name} histogram')
+                for key, h in series.items():
+                    bounds = [str(b) for b in h.buckets] + ['+Inf']
+                    for bound, count in zip(bounds, _cumulative(h.counts)):
+                        lines.append(f'{METRIC_PREFIX}{name}_bucket{_labels(key + (("le", bound),))} {count}')
+                    lines.append(f'{METRIC_PREFIX}{name}_sum{_labels(key)} {h.sum}')
+                    lines.append(f'{METRIC_PREFIX}{name}_count{_labels(key)} {h.count}')
+        return '\n'.join(lines) + '\n'
+
+def _cumulative(counts: List[int]) -> List[int]:
+    total, result = 0, []
+    for count in counts:
+        total += count
+        result.append(total)
+    return result
+
+def _labels(key: LabelKey) -> str:
+    if not key:
+        return ''
+    escaped = (v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in key)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(key, escaped)) + '}'
+
+_metrics = MetricsRegistry()
+
+def get_metrics() -> MetricsRegistry:
+    return _metrics
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+class RunTrace:
+    """
+    Timed spans for one analysis run. Every span is tagged with the run ID, logged as a JSON line
+    and observed in the stage latency histogram; the run profile summarizes them per stage.
+    """
+    def __init__(self, run_id: Optional[str] = None, metrics: Optional[MetricsRegistry] = None, max_spans: int = MAX_SPANS):
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.metrics = metrics or get_metrics()
+        self.max_spans = max_spans
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.spans: List[Dict] = []
+        self.dropped = 0
+
+    @staticmethod
+    def bind(**attrs):
+        """
+        Add attributes to every span recorded later in the current task (asyncio tasks copy the context).
+        """
+        _span_context.set({**_span_context.get(), **attrs})
+
+    @contextmanager
+    def span(self, stage: str, **attrs) -> Iterator[Dict]:
+        """
+        Time the block as one span. The yielded dict can be filled in with attributes known only at the end.
+        """
+        start = time.perf_counter()
+        try:
+            yield attrs
+        except BaseException as e:
+            attrs['error'] = type(e).__name__
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - start, **attrs)
+
+    def record(self, stage: str, seconds: float, **attrs):
+        span = {
+            'run_id': self.run_id,
+            'stage': stage,
+            'offset': round(time.time() - self.started - seconds, 6),
+            'seconds': round(seconds, 6),
+            **_span_context.get(),
+            **attrs
+        }
+        self.metrics.observe('stage_seconds', seconds, stage=stage)
+        with self.lock:
+            if len(self.spans) < self.max_spans:
+                self.spans.append(span)
+            else:
+                self.dropped += 1
+        trace_logger.info(json.dumps(span, default=str))
+
+    def iterate(self, iterable: Iterable, stage: str = 'scan') -> Iterator:
+        """
+        Wrap a blocking iterator of files, recording the wait for each item as a span.
+        """
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.record(stage, time.perf_counter() - start, file=item.get('relpath'), bytes=len(item.get('code', '')))
+            yield item
+
+    def stage_summary(self) -> List[Dict]:
+        with self.lock:
+            spans = list(self.spans)
+        stages: Dict[str, List[Dict]] = {}
+        for span in spans:
+            stages.setdefault(span['stage'], []).append(span)
+        summary = []
+        for stage, stage_spans in stages.items():
+            durations = sorted(s['seconds'] for s in stage_spans)
+            row = {
+                'stage': stage,
+                'spans': len(durations),
+                'total_seconds': round(sum(durations), 3),
+                'p50_seconds': round(_percentile(durations, 50), 3),
+                'p95_seconds': round(_percentile(durations, 95), 3),
+                'max_seconds': round(durations[-1], 3),
+                'errors': sum(1 for s in stage_spans if 'error' in s)
+            }
+            for attr in SUMMED_ATTRS:
+                values = [s[attr] for s in stage_spans if isinstance(s.get(attr), (int, float))]
+                if values:
+                    row[attr] = sum(values)
+            summary.append(row)
+        return sorted(summary, key=lambda r: r['total_seconds'], reverse=True)
+
+    def slowest(self, limit: int = 10) -> List[Dict]:
+        with self.lock:
+            return sorted(self.spans, key=lambda s: s['seconds'], reverse=True)[:limit]
+
+    def profile(self) -> Dict:
+        return {
+            'run_id': self.run_id,
+            'wall_seconds': round(time.time() - self.started, 3),
+            'stages': self.stage_summary(),
+            'slowest': self.slowest(),
+            'dropped_spans': self.dropped
+        }
+
+    def to_json(self) -> str:
+        """
+        Full dump of the run: profile, every span kept, and the process metrics.
+        """
+        with self.lock:
+            spans = list(self.spans)
+        return json.dumps({**self.profile(), 'spans': spans, 'metrics': self.metrics.snapshot()}, default=str)
+
+_server = None
+_server_lock = threading.Lock()
+
+def start_metrics_server(port: int, host: str = '127.0.0.1', registry: Optional[MetricsRegistry] = None) -> ThreadingHTTPServer:
+    """
+    Serve /metrics (Prometheus text format) and /metrics.json from a daemon thread.
+    Started at most once per process, so it's safe to call on every Streamlit rerun.
+    """
+    global _server
+    registry = registry or get_metrics()
+    with _server_lock:
+        if _server is not None:
+            return _server
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                path = self.path.split('?')[0]
+                if path == '/metrics':
+                    body, content_type = registry.to_prometheus(), 'text/plain; version=0.0.4'
+                elif path == '/metrics.json':
+                    body, content_type = json.dumps(registry.snapshot()), 'application/json'
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        _server = ThreadingHTTPServer((host, port), Handler)
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name='debuggerai-metrics', daemon=True).start()
+        logging.info("Metrics endpoint listening on http://%s:%d/metrics", host, port)
+        return _server
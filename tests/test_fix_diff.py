@@ -0,0 +1,90 @@
+"""
+Where suggested fixes go in the source, and the combined patch built from them, in fix_diff.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import fix_diff
+from fix_diff import add_diffs, combine_patch, locate_region, unified_diff
+
+def patched(code, changes):
+    # The expected file after a patch: {0-based line: replacement lines}, None to drop the line
+    lines = []
+    for i, line in enumerate(code.splitlines()):
+        if i not in changes:
+            lines.append(line)
+        elif changes[i] is not None:
+            lines.extend(changes[i])
+    return lines
+
+class LocateRegionTest(unittest.TestCase):
+    def test_trivial_fix_does_not_replace_the_function(self):
+        # Used to give a patch deleting `def g():` and its body
+        self.assertIsNone(locate_region(['def g():', '    pass'], ['pass'], 1))
+        self.assertEqual(combine_patch('b.py', 'def g():\n    pass\n', [{'line': 1, 'fix': 'pass'}]), '')
+
+    def test_punctuation_and_keywords_do_not_anchor(self):
+        code = ['int f() {', '    return 0;', '}', '', 'int g() {', '    return 1;', '}']
+        self.assertIsNone(locate_region(code, ['}', 'else:', ''], 6))
+
+    def test_import_to_add_has_no_place(self):
+        code = ['import sys', '', 'def f():', '    print(os.getcwd())']
+        self.assertIsNone(locate_region(code, ['import os'], 4))
+
+    def test_rewrite_of_the_finding_line(self):
+        code = ['import sys', '', 'x = foo( 1 )']
+        self.assertEqual(locate_region(code, ['x = foo(1)'], 3), (2, 3))
+
+    def test_block_anchored_around_the_finding(self):
+        code = ['def f(a):', '    b = 1', '    if a == None:', '        return b', '    return a']
+        fix = ['def f(a):', '    b = 1', '    if a is None:', '        return b', '    return a']
+        self.assertEqual(locate_region(code, fix, 3), (0, 5))
+
+    def test_anchors_far_from_the_finding_do_not_count(self):
+        # `setup()` lines up with the fix's first line, three lines above the finding
+        code = ['setup()', 'a = 1', 'b = 2', 'run(a, b)']
+        self.assertIsNone(locate_region(code, ['setup()', 'configure()'], 4))
+
+    def test_shorter_fix_keeps_the_lines_it_does_not_mention(self):
+        code = ['def f():', '    a = 1', '    x = 2', '    log(a)', '    return a']
+        # Dropping the finding's own line is the fix; dropping `log(a)` as well is not
+        self.assertEqual(locate_region(code, ['def f():', '    a = 1', '    log(a)', '    return a'], 3), (0, 5))
+        self.assertIsNone(locate_region(code, ['def f():', '    a = 1', '    return a'], 3))
+
+class CombinePatchTest(unittest.TestCase):
+    def test_patch_applies_every_fix(self):
+        code = 'import os\n\ndef f(a):\n    if a == None:\n        return 1\n\nx = foo( 1 )\n'
+        explanations = [{'line': 4, 'fix': 'if a is None:'}, {'line': 7, 'fix': 'x = foo(1)'}]
+        expected = patched(code, {3: ['    if a is None:'], 6: ['x = foo(1)']})
+        self.assertEqual(combine_patch('m.py', code, explanations), unified_diff('m.py', code.splitlines(), expected))
+
+    def test_first_of_overlapping_fixes_wins(self):
+        code = 'def f(a):\n    if a == None:\n        return 1\n'
+        explanations = [{'line': 2, 'fix': 'if a is None:'}, {'line': 2, 'fix': 'if not a:'},
+                        {'line': 1, 'fix': 'def f(a):\n    if a is not None:\n        return 1'}]
+        expected = patched(code, {1: ['    if a is None:']})
+        self.assertEqual(combine_patch('m.py', code, explanations), unified_diff('m.py', code.splitlines(), expected))
+
+    def test_missing_final_newline(self):
+        code = 'x = foo( 1 )'
+        patch = combine_patch('m.py', code, [{'line': 1, 'fix': 'x = foo(1)'}])
+        self.assertTrue(patch.endswith(fix_diff.NO_NEWLINE))
+
+    def test_report_diffs_and_patch_share_the_memo(self):
+        code = 'import os\n\nvalue = compute( 2 )\n'
+        explanations = [{'line': 3, 'fix': 'value = compute(2)'}, {'line': 1, 'fix': 'import os  # noqa'}]
+        annotated = add_diffs('shared.py', code, explanations)
+        self.assertTrue(all(ex['diff'].startswith('--- a/shared.py') for ex in annotated))
+        cached = len(fix_diff._cache)
+        patch = combine_patch('other/shared.py', code, explanations)
+        self.assertEqual(len(fix_diff._cache), cached)
+        self.assertTrue(patch.startswith('--- a/other/shared.py\n+++ b/other/shared.py\n'))
+        self.assertIn('+value = compute(2)', patch)
+
+if __name__ == '__main__':
+    unittest.main()
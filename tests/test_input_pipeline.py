@@ -0,0 +1,107 @@
+"""
+Ignore rules, language detection and the mixed-language scan in input_pipeline.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from input_pipeline import AUTO_DETECT, IgnoreRules, detect_language, iter_files
+
+class IgnoreRulesTest(unittest.TestCase):
+    def test_glob_matches_at_any_depth(self):
+        rules = IgnoreRules().extend(['*.min.js'])
+        self.assertTrue(rules.ignored('app.min.js', False))
+        self.assertTrue(rules.ignored('static/js/app.min.js', False))
+        self.assertFalse(rules.ignored('app.js', False))
+
+    def test_leading_slash_anchors_to_the_declaring_directory(self):
+        rules = IgnoreRules().extend(['/build'])
+        self.assertTrue(rules.ignored('build', True))
+        self.assertFalse(rules.ignored('src/build', True))
+
+    def test_trailing_slash_matches_directories_only(self):
+        rules = IgnoreRules().extend(['out/'])
+        self.assertTrue(rules.ignored('out', True))
+        self.assertFalse(rules.ignored('out', False))
+
+    def test_negation_re_includes(self):
+        rules = IgnoreRules().extend(['*.py', '!keep.py'])
+        self.assertTrue(rules.ignored('drop.py', False))
+        self.assertFalse(rules.ignored('keep.py', False))
+
+    def test_double_star(self):
+        rules = IgnoreRules().extend(['docs/**/*.py'])
+        self.assertTrue(rules.ignored('docs/conf.py', False))
+        self.assertTrue(rules.ignored('docs/a/b/gen.py', False))
+        self.assertFalse(rules.ignored('src/docs.py', False))
+
+    def test_nested_rules_apply_below_their_directory(self):
+        rules = IgnoreRules().extend(['generated.py'], base='pkg')
+        self.assertTrue(rules.ignored('pkg/generated.py', False))
+        self.assertTrue(rules.ignored('pkg/sub/generated.py', False))
+        self.assertFalse(rules.ignored('generated.py', False))
+
+    def test_comments_and_blank_lines(self):
+        rules = IgnoreRules().extend(['# *.py\n', '\n', '   \n'])
+        self.assertFalse(rules.ignored('a.py', False))
+
+class DetectLanguageTest(unittest.TestCase):
+    def test_extensions(self):
+        self.assertEqual(detect_language('a/b.py'), 'Python')
+        self.assertEqual(detect_language('b.cc'), 'C++')
+        self.assertEqual(detect_language('b.jsx'), 'JavaScript')
+        self.assertEqual(detect_language('B.java'), 'Java')
+        self.assertIsNone(detect_language('b.rb'))
+
+    def test_header_sniffs_for_objective_c(self):
+        self.assertEqual(detect_language('a.h', '#pragma once\nint f();\n'), 'C++')
+        self.assertIsNone(detect_language('a.h', '#import <Foundation/Foundation.h>\n@interface A\n@end\n'))
+
+    def test_shebangs(self):
+        self.assertEqual(detect_language('tool', '#!/usr/bin/python3.11\nprint(1)\n'), 'Python')
+        self.assertEqual(detect_language('tool', '#!/usr/bin/env python3\n'), 'Python')
+        self.assertEqual(detect_language('tool', '#!/usr/bin/env -S node --harmony\n'), 'JavaScript')
+        self.assertIsNone(detect_language('tool', '#!/bin/sh\n'))
+        self.assertIsNone(detect_language('tool', 'print(1)\n'))
+        self.assertIsNone(detect_language('tool'))
+
+class MixedScanTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+        files = {
+            'app.py': 'print(1)\n',
+            'web/main.js': 'let x = 1;\n',
+            'native/lib.h': 'int f();\n',
+            'native/lib.cpp': 'int f() { return 1; }\n',
+            'bin/tool': '#!/usr/bin/env python3\nprint(1)\n',
+            'bin/run.sh': '#!/bin/sh\n',
+            'node_modules/dep/index.js': 'module.exports = 1;\n',
+            'gen/out.py': 'x = 1\n',
+            '.gitignore': 'gen/\n',
+            'blob.py': 'x = 1\0\n'
+        }
+        for path, content in files.items():
+            full = os.path.join(self.root, path)
+            os.makedirs(os.path.dirname(full), exist_ok=True)
+            with open(full, 'w', encoding='utf-8') as f:
+                f.write(content)
+
+    def test_one_walk_classifies_every_file(self):
+        found = {os.path.relpath(f['relpath'], self.root).replace(os.sep, '/'): f['language']
+                 for f in iter_files(self.root, AUTO_DETECT)}
+        self.assertEqual(found, {'app.py': 'Python', 'web/main.js': 'JavaScript', 'native/lib.h': 'C++',
+                                 'native/lib.cpp': 'C++', 'bin/tool': 'Python'})
+
+    def test_single_language_scan(self):
+        found = sorted(os.path.basename(f['relpath']) for f in iter_files(self.root, 'C++'))
+        self.assertEqual(found, ['lib.cpp', 'lib.h'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+"""
+Offline tests for the linter backends, using linter_stub.py in place of the real tools.
+
+    python -m unittest discover tests
+"""
+import json
+import os
+import signal
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import linter_backends
+from linter_backends import ClangTidyBackend, DaemonBackend, OneShotBackend, FILE, STUB_SCRIPT, parse_eslint
+
+CODE = 'let x = 1; // TODO\n'
+EXPECTED = [{'line': 1, 'type': 'todo-comment', 'message': 'Unresolved TODO comment'}]
+
+class DaemonBackendTest(unittest.TestCase):
+    def make_backend(self, *stub_args) -> DaemonBackend:
+        fallback = OneShotBackend('eslint', [sys.executable, STUB_SCRIPT, 'eslint', FILE], parse_eslint, '.js')
+        backend = DaemonBackend('eslint', [sys.executable, STUB_SCRIPT, 'worker', *stub_args], fallback, '.js', workers=1)
+        self.addCleanup(backend.close)
+        return backend
+
+    def test_reuses_warm_worker(self):
+        backend = self.make_backend()
+        for i in range(3):
+            self.assertEqual(backend.analyze(CODE, f'{i}.js'), EXPECTED)
+        health = backend.health()
+        # Three lints plus the startup ping, all on one process
+        self.assertEqual((health['workers'], health['requests'], health['restarts']), (1, 4, 0))
+        self.assertIsNone(health['disabled'])
+
+    def test_crashed_worker_is_restarted(self):
+        backend = self.make_backend('--crash-after', '2')
+        # The third and fifth files kill their worker and are retried on a fresh one
+        for i in range(5):
+            self.assertEqual(backend.analyze(CODE, f'{i}.js'), EXPECTED)
+        health = backend.health()
+        self.assertEqual(health['restarts'], 2)
+        self.assertIsNone(health['disabled'])
+
+    def test_health_replaces_dead_idle_worker(self):
+        backend = self.make_backend()
+        backend.analyze(CODE, 'a.js')
+        worker = backend.idle[0]
+        worker.proc.kill()
+        worker.proc.wait()
+        health = backend.health()
+        self.assertEqual((health['workers'], health['idle'], health['restarts']), (0, 0, 1))
+        self.assertEqual(backend.analyze(CODE, 'b.js'), EXPECTED)
+        self.assertEqual(backend.health()['workers'], 1)
+
+    @unittest.skipUnless(hasattr(signal, 'SIGSTOP'), 'needs SIGSTOP')
+    def test_hung_worker_fails_health_check(self):
+        backend = self.make_backend()
+        backend.analyze(CODE, 'a.js')
+        hung = backend.idle[0]
+        os.kill(hung.proc.pid, signal.SIGSTOP)
+        with mock.patch.object(linter_backends, 'HEALTH_CHECK_INTERVAL', 0), \
+                mock.patch.object(linter_backends, 'PING_TIMEOUT', 0.5):
+            self.assertEqual(backend.analyze(CODE, 'b.js'), EXPECTED)
+        self.assertFalse(hung.alive())
+        self.assertEqual(backend.health()['restarts'], 1)
+
+    def test_falls_back_when_worker_never_starts(self):
+        backend = self.make_backend('--startup', '5')
+        with mock.patch.object(linter_backends, 'STARTUP_TIMEOUT', 0.5):
+            self.assertEqual(backend.analyze(CODE, 'a.js'), EXPECTED)
+        health = backend.health()
+        self.assertIn('failed to start', health['disabled'])
+        self.assertEqual(health['workers'], 0)
+        self.assertEqual(backend.signature(), backend.fallback.signature())
+
+    def test_falls_back_when_workers_keep_crashing(self):
+        backend = self.make_backend('--crash-after', '1')
+        with mock.patch.object(linter_backends, 'MAX_RESTARTS', 1):
+            for i in range(4):
+                self.assertEqual(backend.analyze(CODE, f'{i}.js'), EXPECTED)
+        self.assertIn('worker restarts', backend.health()['disabled'])
+
+class ClangTidyBackendTest(unittest.TestCase):
+    def compile_arguments(self, file):
+        """
+        The compile command written for one file, captured by a stand-in that copies the database out.
+        """
+        with tempfile.TemporaryDirectory() as out:
+            target = os.path.join(out, 'compile_commands.json')
+            script = f'import shutil, sys; shutil.copy(sys.argv[2] + "/compile_commands.json", {target!r})'
+            ClangTidyBackend([sys.executable, '-c', script]).analyze_batch([file])
+            with open(target, encoding='utf-8') as f:
+                return json.load(f)[0]['arguments']
+
+    def test_scanned_file_includes_its_directory(self):
+        with tempfile.TemporaryDirectory() as src:
+            path = os.path.join(src, 'main.cpp')
+            arguments = self.compile_arguments({'filename': 'main.cpp', 'relpath': path, 'code': '', 'on_disk': True})
+            self.assertIn(os.path.abspath(src), arguments)
+
+    def test_upload_gets_no_include_path(self):
+        arguments = self.compile_arguments({'filename': 'main.cpp', 'relpath': 'main.cpp', 'code': ''})
+        self.assertNotIn('-I', arguments)
+
+if __name__ == '__main__':
+    unittest.main()
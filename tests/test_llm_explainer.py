@@ -0,0 +1,67 @@
+"""
+Rate limit handling of the LLM explainer, against the local OpenAI stand-in in openai_stub.py.
+
+    python -m unittest discover tests
+"""
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openai
+from llm_explainer import LLMExplainer
+from openai_stub import start_stub_server
+from telemetry import RunTrace
+
+CODE = 'import os\n\ndef f(a):\n    return a\n'
+FINDINGS = [{'line': 1, 'type': 'W0611', 'message': 'Unused import os (unused-import)'},
+            {'line': 3, 'type': 'C0116', 'message': 'Missing function or method docstring (missing-function-docstring)'}]
+
+class RateLimitTest(unittest.TestCase):
+    def start_stub(self, rate_limit_every: int):
+        server, state, url = start_stub_server(latency=0.01, rate_limit_every=rate_limit_every)
+        self.addCleanup(server.shutdown)
+        return state, url
+
+    def explain(self, url: str, findings=FINDINGS, **options):
+        trace = RunTrace()
+        explainer = LLMExplainer('test-key', base_url=url, trace=trace, **options)
+
+        async def run():
+            try:
+                return await explainer.explain_findings_async(CODE, findings)
+            finally:
+                await explainer.aclose()
+        return asyncio.run(run()), explainer, trace
+
+    def test_retries_after_429(self):
+        # Every other request is refused with a 0.05s Retry-After
+        state, url = self.start_stub(2)
+        explanations, explainer, trace = self.explain(url, max_concurrency=1)
+        self.assertEqual(len(explanations), 2)
+        self.assertTrue(all(e['explanation'].startswith('Stub explanation') for e in explanations))
+        self.assertEqual(state.stats()['rate_limited'], 1)
+        self.assertEqual(explainer.calls, 2)
+        self.assertEqual(sum(span.get('retries', 0) for span in trace.spans if span['stage'] == 'explain'), 1)
+
+    def test_gives_up_after_max_retries(self):
+        state, url = self.start_stub(1)
+        with self.assertRaises(openai.RateLimitError):
+            self.explain(url, FINDINGS[:1], max_retries=2)
+        self.assertEqual(state.stats()['requests'], 3)
+
+    def test_retry_delay_honours_retry_after(self):
+        class Response:
+            headers = {'retry-after': '1.5'}
+
+        class Error:
+            response = Response()
+        self.assertEqual(LLMExplainer._retry_delay(Error(), 3), 1.5)
+        Error.response = None
+        # Exponential backoff with up to a second of jitter
+        self.assertTrue(8 <= LLMExplainer._retry_delay(Error(), 3) <= 9)
+
+if __name__ == '__main__':
+    unittest.main()